@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Load-adaptive model input resolution
+Picks one of several input-resolution variants of the model from inference latency
+and queue-depth feedback, with hysteresis so the choice does not oscillate
+"""
+
+import os
+import time
+
+
+class ResolutionController:
+    def __init__(self, resolutions=(320, 480, 640), target_latency_ms=33.0, max_queue_depth=2,
+                 low_water=0.6, down_after=3, up_after=30, cooldown_s=2.0):
+        self.resolutions = sorted(set(resolutions))
+        self.target_latency_ms = target_latency_ms  # Latency budget per inference
+        self.max_queue_depth = max_queue_depth      # Pending frames that count as a backlog
+        self.low_water = low_water                  # Step up only below this fraction of the budget
+        self.down_after = down_after                # Consecutive overloaded observations before stepping down
+        self.up_after = up_after                    # Consecutive relaxed observations before stepping up
+        self.cooldown_s = cooldown_s                # Minimum time between switches
+
+        # Start at the largest resolution (best accuracy)
+        self.index = len(self.resolutions) - 1
+        self.latency_ema = None
+        self.overloaded_count = 0
+        self.relaxed_count = 0
+        self.last_switch_time = 0.0
+
+        # Statistics
+        self.switches_down = 0
+        self.switches_up = 0
+
+    @property
+    def resolution(self):
+        """Active model input resolution"""
+        return self.resolutions[self.index]
+
+    def limit_to(self, available):
+        """Restrict choices to resolutions that actually have a model variant"""
+        resolutions = [size for size in self.resolutions if size in available]
+        if resolutions:
+            self.resolutions = resolutions
+            self.index = len(self.resolutions) - 1
+
+    def observe(self, latency_ms, queue_depth=0):
+        """Feed one inference latency and current queue depth, returns the resolution to use next"""
+        if self.latency_ema is None:
+            self.latency_ema = latency_ms
+        else:
+            self.latency_ema = 0.8 * self.latency_ema + 0.2 * latency_ms
+
+        overloaded = self.latency_ema > self.target_latency_ms or queue_depth > self.max_queue_depth
+        relaxed = self.latency_ema < self.target_latency_ms * self.low_water and queue_depth == 0
+
+        if overloaded:
+            self.overloaded_count += 1
+            self.relaxed_count = 0
+        elif relaxed:
+            self.relaxed_count += 1
+            self.overloaded_count = 0
+        else:
+            self.overloaded_count = 0
+            self.relaxed_count = 0
+
+        now = time.time()
+        if now - self.last_switch_time < self.cooldown_s:
+            return self.resolution
+
+        if self.overloaded_count >= self.down_after and self.index > 0:
+            self._switch(self.index - 1, now)
+            self.switches_down += 1
+        elif self.relaxed_count >= self.up_after and self.index < len(self.resolutions) - 1:
+            self._switch(self.index + 1, now)
+            self.switches_up += 1
+
+        return self.resolution
+
+    def _switch(self, index, now):
+        """Change active resolution and restart hysteresis counters"""
+        print(f"📐 Switching model input resolution {self.resolution} -> {self.resolutions[index]} "
+              f"(latency {self.latency_ema:.1f} ms)")
+        self.index = index
+        self.overloaded_count = 0
+        self.relaxed_count = 0
+        self.last_switch_time = now
+        # Latency at the new resolution is unknown, start averaging again
+        self.latency_ema = None
+
+    def get_stats(self):
+        """Get controller statistics"""
+        return {
+            "active_resolution": self.resolution,
+            "resolutions": list(self.resolutions),
+            "latency_ema_ms": self.latency_ema or 0.0,
+            "switches_down": self.switches_down,
+            "switches_up": self.switches_up
+        }
+
+
+def create_resolution_controller(default_resolutions):
+    """Create controller from ADAPTIVE_RESOLUTION / MODEL_RESOLUTIONS environment, None if disabled"""
+    if os.environ.get('ADAPTIVE_RESOLUTION', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    resolutions = os.environ.get('MODEL_RESOLUTIONS')
+    if resolutions:
+        resolutions = [int(size) for size in resolutions.split(',') if size.strip()]
+    else:
+        resolutions = default_resolutions
+
+    controller = ResolutionController(
+        resolutions=resolutions,
+        target_latency_ms=float(os.environ.get('TARGET_LATENCY_MS', 33.0)),
+        max_queue_depth=int(os.environ.get('MAX_QUEUE_DEPTH', 2))
+    )
+    print(f"📐 Adaptive resolution enabled: {controller.resolutions}, "
+          f"target latency {controller.target_latency_ms:.0f} ms")
+    return controller
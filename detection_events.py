@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Batched export of per-frame detection records
+The processing loop only appends records to a bounded buffer; a flusher thread serializes
+them as compact JSON lines and writes batches to a JSONL file, a Unix domain socket or an
+MQTT broker (QoS 0). When the buffer is full new records are dropped and counted.
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+from event_stream import compact_detection_list
+
+
+class JsonlFileTransport:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __str__(self):
+        return f"file:{self.path}"
+
+
+class UnixSocketTransport:
+    """Stream socket to a local listener, reconnected on the next batch after a failure"""
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = None
+
+    def write(self, data):
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(1.0)
+            try:
+                self.sock.connect(self.path)
+            except OSError:
+                self.close()
+                raise
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __str__(self):
+        return f"unix:{self.path}"
+
+
+def _mqtt_string(value):
+    data = value.encode()
+    return struct.pack('>H', len(data)) + data
+
+
+def _mqtt_packet(header, body):
+    """Fixed header with variable-length remaining length"""
+    length = len(body)
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes([header]) + bytes(encoded) + body
+
+
+class MqttTransport:
+    """Minimal MQTT 3.1.1 publisher (QoS 0, one message per batch)"""
+
+    def __init__(self, host, port=1883, topic='cm5_yolo/detections', client_id=None):
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.client_id = client_id or f"cm5_yolo_{os.getpid()}"
+        self.sock = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=2.0)
+        # Protocol "MQTT" level 4, clean session, keep-alive disabled
+        body = _mqtt_string('MQTT') + bytes([4, 0x02]) + struct.pack('>H', 0) + _mqtt_string(self.client_id)
+        self.sock.sendall(_mqtt_packet(0x10, body))
+        connack = self.sock.recv(4)
+        if len(connack) < 4 or connack[0] != 0x20 or connack[3] != 0:
+            self.close()
+            raise ConnectionError(f"MQTT connection refused: {connack!r}")
+
+    def write(self, data):
+        if self.sock is None:
+            self.connect()
+        try:
+            self.sock.sendall(_mqtt_packet(0x30, _mqtt_string(self.topic) + data))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __str__(self):
+        return f"mqtt://{self.host}:{self.port}/{self.topic}"
+
+
+class DetectionEventStream:
+    def __init__(self, transport, stream_id=None, flush_interval=0.5, batch_size=200, max_buffer=2000):
+        self.transport = transport
+        self.stream_id = stream_id
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.flush_event = threading.Event()
+
+        # Statistics
+        self.records_submitted = 0
+        self.records_exported = 0
+        self.records_dropped = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.flush_time_total = 0.0
+
+        self.running = True
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    def submit(self, frame_id, detections, timestamp=None):
+        """Queue one frame's detections; never blocks and never serializes on the caller's thread"""
+        record = (frame_id, timestamp or time.time(), detections)
+        with self.lock:
+            self.records_submitted += 1
+            if len(self.buffer) >= self.max_buffer:
+                self.records_dropped += 1
+                return False
+            self.buffer.append(record)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush_event.set()
+        return True
+
+    def serialize(self, records):
+        """Compact JSON lines, one record per frame"""
+        lines = []
+        for frame_id, timestamp, detections in records:
+            lines.append(json.dumps({
+                'stream': self.stream_id,
+                'frame_id': frame_id,
+                'timestamp': round(timestamp, 3),
+                'detections': compact_detection_list(detections)
+            }, separators=(',', ':')))
+        lines.append('')
+        return '\n'.join(lines).encode()
+
+    def flush(self):
+        """Write everything buffered so far in batches"""
+        while True:
+            with self.lock:
+                count = min(len(self.buffer), self.batch_size)
+                records = [self.buffer.popleft() for _ in range(count)]
+            if not records:
+                return
+
+            start_time = time.perf_counter()
+            try:
+                self.transport.write(self.serialize(records))
+                self.records_exported += len(records)
+                self.batches_written += 1
+            except Exception as e:
+                # Receiver unavailable: drop the batch rather than growing memory
+                self.write_errors += 1
+                self.records_dropped += len(records)
+                if self.write_errors == 1 or self.write_errors % 100 == 0:
+                    print(f"⚠️ Detection event export to {self.transport} failed: {e}")
+            self.flush_time_total += time.perf_counter() - start_time
+
+    def flush_loop(self):
+        while self.running:
+            self.flush_event.wait(self.flush_interval)
+            self.flush_event.clear()
+            self.flush()
+        self.flush()
+
+    def close(self):
+        self.running = False
+        self.flush_event.set()
+        self.flush_thread.join(timeout=5.0)
+        self.transport.close()
+
+    def get_stats(self):
+        """Get export statistics"""
+        with self.lock:
+            backlog = len(self.buffer)
+        return {
+            "sink": str(self.transport),
+            "backlog": backlog,
+            "submitted": self.records_submitted,
+            "exported": self.records_exported,
+            "dropped": self.records_dropped,
+            "batches": self.batches_written,
+            "write_errors": self.write_errors,
+            "avg_flush_ms": self.flush_time_total * 1000 / max(1, self.batches_written + self.write_errors)
+        }
+
+
+def create_transport(target):
+    """Transport from file:/path.jsonl, unix:/path.sock or mqtt://host[:port]/topic"""
+    if target.startswith('unix:'):
+        return UnixSocketTransport(target[len('unix:'):])
+    if target.startswith('mqtt://'):
+        url = urlparse(target)
+        return MqttTransport(url.hostname, url.port or 1883, url.path.lstrip('/') or 'cm5_yolo/detections')
+    if target.startswith('file:'):
+        target = target[len('file:'):]
+    return JsonlFileTransport(target)
+
+
+def create_detection_event_stream(stream_id):
+    """Create exporter from DETECTION_EVENTS=<target> environment, None if disabled"""
+    target = os.environ.get('DETECTION_EVENTS')
+    if not target:
+        return None
+
+    try:
+        exporter = DetectionEventStream(
+            create_transport(target),
+            stream_id=stream_id,
+            flush_interval=float(os.environ.get('DETECTION_EVENTS_FLUSH_MS', 500)) / 1000,
+            batch_size=int(os.environ.get('DETECTION_EVENTS_BATCH', 200)),
+            max_buffer=int(os.environ.get('DETECTION_EVENTS_BUFFER', 2000))
+        )
+        print(f"📤 Exporting detection events to {exporter.transport}")
+        return exporter
+    except Exception as e:
+        print(f"⚠️ Failed to set up detection event export: {e}")
+        return None
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Processor device-state feed over shared memory
+The processor counts received and inferred frames in its loop; a heartbeat thread turns the
+counts into ingest/inference fps once per interval and writes them, with the accelerator state,
+into a small seqlock-protected shared-memory record. Readers (the web service) derive camera
+status from the age of the last received frame instead of opening the camera themselves.
+"""
+
+import os
+import time
+import struct
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+STATE_MAGIC = b'YDST'
+STATE_VERSION = 1
+
+# Seqlock counter, magic, version, pid, accelerator state, start time, update time, last frame time,
+# ingest fps, inference fps, inference ms, frames received, frames inferred, accelerator name
+STATE_FORMAT = '<Q4sIIIdddfffQQ32s'
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+ACCELERATOR_STATES = ('unknown', 'connected', 'unavailable', 'error')
+
+# Status strings shown by the web interface
+ACCELERATOR_STATUS = {'unknown': 'Unknown', 'connected': 'Connected',
+                      'unavailable': 'Not Available', 'error': 'Error'}
+
+DEFAULT_STATE_NAME = os.environ.get('DEVICE_STATE_NAME', 'cm5_yolo_state')
+
+
+class DeviceStateWriter:
+    def __init__(self, name=DEFAULT_STATE_NAME, interval=1.0):
+        self.name = name
+        self.interval = interval
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=STATE_SIZE)
+        except FileExistsError:
+            # Stale segment from a previous run
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=STATE_SIZE)
+
+        self.sequence = 0
+        self.write_lock = threading.Lock()
+        self.start_time = time.time()
+        self.accelerator_state = 'unknown'
+        self.accelerator_name = ''
+
+        # Updated by the processing loop; plain counters so recording costs next to nothing
+        self.frames_received = 0
+        self.frames_inferred = 0
+        self.inference_ms = 0.0
+
+        self.last_frame_time = 0.0
+        self.ingest_fps = 0.0
+        self.inference_fps = 0.0
+        self.write()
+
+        self.running = True
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+
+    def record_frame(self):
+        """One frame received from the camera stream"""
+        self.frames_received += 1
+
+    def record_inference(self, inference_ms):
+        """One model run finished"""
+        self.frames_inferred += 1
+        self.inference_ms = 0.9 * self.inference_ms + 0.1 * inference_ms if self.inference_ms else inference_ms
+
+    def set_accelerator(self, state, name=''):
+        """Accelerator state: one of ACCELERATOR_STATES; written immediately"""
+        if state not in ACCELERATOR_STATES:
+            raise ValueError(f"Unknown accelerator state '{state}'")
+        self.accelerator_state = state
+        self.accelerator_name = name
+        self.write()
+
+    def heartbeat_loop(self):
+        last_time = time.time()
+        last_received = self.frames_received
+        last_inferred = self.frames_inferred
+        while self.running:
+            time.sleep(self.interval)
+            now = time.time()
+            elapsed = max(1e-6, now - last_time)
+            received, inferred = self.frames_received, self.frames_inferred
+            if received != last_received:
+                self.last_frame_time = now
+            self.ingest_fps = (received - last_received) / elapsed
+            self.inference_fps = (inferred - last_inferred) / elapsed
+            last_time, last_received, last_inferred = now, received, inferred
+            self.write()
+
+    def write(self):
+        """Publish the current state under the seqlock"""
+        buf = self.shm.buf
+        with self.write_lock:
+            self.sequence += 1
+            struct.pack_into('<Q', buf, 0, self.sequence * 2 - 1)
+            struct.pack_into(STATE_FORMAT, buf, 0, self.sequence * 2 - 1, STATE_MAGIC, STATE_VERSION, os.getpid(),
+                             ACCELERATOR_STATES.index(self.accelerator_state), self.start_time, time.time(),
+                             self.last_frame_time, self.ingest_fps, self.inference_fps, self.inference_ms,
+                             self.frames_received, self.frames_inferred, self.accelerator_name.encode()[:32])
+            struct.pack_into('<Q', buf, 0, self.sequence * 2)
+
+    def close(self):
+        self.running = False
+        self.heartbeat_thread.join(timeout=self.interval * 2)
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+class DeviceStateReader:
+    def __init__(self, name=DEFAULT_STATE_NAME):
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the segment when they exit
+        try:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+        if bytes(self.shm.buf[8:12]) != STATE_MAGIC:
+            self.shm.close()
+            raise ValueError(f"Shared memory '{name}' is not a device state record")
+
+    def read(self, retries=3):
+        """Consistent snapshot as a dict, None if the writer kept it busy"""
+        for _ in range(retries):
+            values = struct.unpack_from(STATE_FORMAT, self.shm.buf, 0)
+            if values[0] % 2 == 1 or struct.unpack_from('<Q', self.shm.buf, 0)[0] != values[0]:
+                continue
+            (_, _, _, pid, accelerator, start_time, update_time, last_frame_time, ingest_fps,
+             inference_fps, inference_ms, frames_received, frames_inferred, accelerator_name) = values
+            return {
+                'pid': pid,
+                'accelerator_state': ACCELERATOR_STATES[accelerator] if accelerator < len(ACCELERATOR_STATES) else 'unknown',
+                'accelerator_name': accelerator_name.rstrip(b'\x00').decode(errors='replace'),
+                'start_time': start_time,
+                'update_time': update_time,
+                'last_frame_time': last_frame_time,
+                'ingest_fps': ingest_fps,
+                'inference_fps': inference_fps,
+                'inference_ms': inference_ms,
+                'frames_received': frames_received,
+                'frames_inferred': frames_inferred
+            }
+        return None
+
+    def close(self):
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+
+
+def device_status(state, now=None, stale_after=3.0):
+    """Web-facing status fields from a state snapshot (None = processor not running)"""
+    now = now or time.time()
+    if state is None or now - state['update_time'] > stale_after:
+        return {'processor_status': 'Offline', 'camera_status': 'Unknown', 'hailo_status': 'Unknown',
+                'ingest_fps': 0.0, 'inference_fps': 0.0}
+    return {
+        'processor_status': 'Running',
+        'camera_status': 'Connected' if now - state['last_frame_time'] <= stale_after else 'Disconnected',
+        'hailo_status': ACCELERATOR_STATUS[state['accelerator_state']],
+        'accelerator': state['accelerator_name'],
+        'ingest_fps': round(state['ingest_fps'], 1),
+        'inference_fps': round(state['inference_fps'], 1),
+        'inference_ms': round(state['inference_ms'], 1),
+        'frames_received': state['frames_received'],
+        'uptime': now - state['start_time']
+    }
+
+
+def create_device_state():
+    """Create the writer side of the device-state feed, None if shared memory is unavailable"""
+    try:
+        return DeviceStateWriter()
+    except Exception as e:
+        print(f"⚠️ Device state feed unavailable: {e}")
+        return None
+
+
+def open_device_state():
+    """Attach to the processor's device-state feed as a reader, None if the processor is not running"""
+    try:
+        return DeviceStateReader()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Failed to open device state: {e}")
+        return None
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events push of stats and detections
+Each update is serialized once and the same bytes are offered to every subscriber.
+Clients keep only the newest pending message per event type, are sent at most
+max_rate batches per second, and silently drop messages older than max_age.
+"""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+import threading
+
+from mjpeg_stream import wakeup_event
+
+
+def format_event(event, data):
+    """Serialize one SSE message"""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+def compact_detection_list(detections):
+    """Detections as [class, confidence, x1, y1, x2, y2, track id] lists"""
+    compact = []
+    for det in detections or []:
+        x1, y1, x2, y2 = det['bbox']
+        compact.append([
+            det.get('class_name', det.get('class')),
+            round(det.get('confidence', 0.0), 2),
+            int(x1), int(y1), int(x2), int(y2),
+            det.get('track_id')
+        ])
+    return compact
+
+
+def compact_detections(metadata, frame_size=None):
+    """Compact per-frame detection message from ring metadata
+
+    frame_size is the (width, height) the boxes are in; clients watching a downscaled stream
+    tier scale the boxes by it.
+    """
+    return {
+        'frame_id': metadata.get('frame_id'),
+        'fps': round(metadata.get('fps') or 0.0, 1),
+        'overlay': metadata.get('overlay', True),
+        'frame_size': list(frame_size) if frame_size else None,
+        'detections': compact_detection_list(metadata.get('detections'))
+    }
+
+
+class EventMessage:
+    __slots__ = ('event', 'payload', 'timestamp')
+
+    def __init__(self, event, payload):
+        self.event = event
+        self.payload = payload
+        self.timestamp = time.time()
+
+
+class EventClient:
+    def __init__(self, client_id, remote_addr=None):
+        self.client_id = client_id
+        self.remote_addr = remote_addr
+        self.condition = threading.Condition()
+        self.pending = {}   # event type -> newest unsent message
+        self.closed = False
+        self.last_send_time = 0.0
+        self.wakeup = None      # Set by async consumers, called from publishing threads
+
+        # Statistics
+        self.messages_sent = 0
+        self.messages_coalesced = 0
+        self.messages_stale = 0
+        self.bytes_sent = 0
+
+    def offer(self, message):
+        """Keep only the newest message per event type"""
+        with self.condition:
+            if message.event in self.pending:
+                self.messages_coalesced += 1
+            self.pending[message.event] = message
+            self.condition.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def take(self, min_interval, max_age, timeout=15.0):
+        """Wait for pending messages respecting the client's max rate, [] on timeout"""
+        delay = self.last_send_time + min_interval - time.time()
+        if delay > 0:
+            # Updates arriving meanwhile replace each other
+            time.sleep(delay)
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending or self.closed, timeout)
+        return self.take_nowait(max_age)
+
+    def take_nowait(self, max_age):
+        """Pending messages not older than max_age, without waiting"""
+        with self.condition:
+            messages = list(self.pending.values())
+            self.pending.clear()
+
+        now = time.time()
+        fresh = [message for message in messages if now - message.timestamp <= max_age]
+        self.messages_stale += len(messages) - len(fresh)
+        return fresh
+
+    def record_sent(self, count, size):
+        self.messages_sent += count
+        self.bytes_sent += size
+        self.last_send_time = time.time()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def get_stats(self):
+        """Get per-client statistics"""
+        return {
+            "client_id": self.client_id,
+            "remote_addr": self.remote_addr,
+            "messages_sent": self.messages_sent,
+            "messages_coalesced": self.messages_coalesced,
+            "messages_stale": self.messages_stale,
+            "bytes_sent": self.bytes_sent
+        }
+
+
+class EventBroadcaster:
+    def __init__(self, max_rate=5.0, max_age=2.0, keepalive=15.0):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.max_age = max_age          # Seconds after which an unsent update is dropped
+        self.keepalive = keepalive      # Comment line interval to keep proxies from closing idle streams
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.client_ids = itertools.count(1)
+
+        # Statistics
+        self.messages_published = 0
+
+    def subscribe(self, remote_addr=None):
+        client = EventClient(next(self.client_ids), remote_addr)
+        with self.lock:
+            self.clients[client.client_id] = client
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.pop(client.client_id, None)
+        client.close()
+
+    def publish(self, event, data):
+        """Serialize once and offer to all subscribers; no work without subscribers"""
+        with self.lock:
+            clients = list(self.clients.values())
+        if not clients:
+            return
+        message = EventMessage(event, format_event(event, data))
+        self.messages_published += 1
+        for client in clients:
+            client.offer(message)
+
+    def stream(self, client):
+        """Generator of SSE bytes for one client"""
+        try:
+            yield b"retry: 2000\n\n"
+            while not client.closed:
+                messages = client.take(self.min_interval, self.max_age, self.keepalive)
+                if not messages:
+                    yield b": keepalive\n\n"
+                    continue
+                data = b''.join(message.payload for message in messages)
+                yield data
+                client.record_sent(len(messages), len(data))
+        finally:
+            self.unsubscribe(client)
+
+    async def async_stream(self, client):
+        """Async generator of SSE bytes for one client, without a thread per subscriber"""
+        ready = wakeup_event(client)
+        try:
+            yield b"retry: 2000\n\n"
+            while not client.closed:
+                delay = client.last_send_time + self.min_interval - time.time()
+                if delay > 0:
+                    # Updates arriving meanwhile replace each other
+                    await asyncio.sleep(delay)
+                ready.clear()
+                messages = client.take_nowait(self.max_age)
+                if not messages:
+                    try:
+                        await asyncio.wait_for(ready.wait(), self.keepalive)
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+                    continue
+                data = b''.join(message.payload for message in messages)
+                yield data
+                client.record_sent(len(messages), len(data))
+        finally:
+            client.wakeup = None
+            self.unsubscribe(client)
+
+    def get_stats(self):
+        """Get broadcaster statistics"""
+        with self.lock:
+            clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "messages_published": self.messages_published,
+            "per_client": [client.get_stats() for client in clients]
+        }
+
+
+def create_event_broadcaster():
+    """Create broadcaster from EVENTS_MAX_RATE / EVENTS_MAX_AGE environment settings"""
+    return EventBroadcaster(
+        max_rate=float(os.environ.get('EVENTS_MAX_RATE', 5.0)),
+        max_age=float(os.environ.get('EVENTS_MAX_AGE', 2.0))
+    )
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Encode-once fan-out publisher for processed frames
+Each processed frame is JPEG-encoded at most once per quality/size profile and the same
+buffer is handed by reference to every registered sink (file, shared memory, HTTP, UDP).
+Profiles without an active sink are not encoded at all.
+
+Overlays (boxes, labels, status text) are burned in only for profiles that ask for them;
+clean profiles carry detections as metadata instead: alongside the frame in shared memory
+and recordings, or embedded in a JPEG APP15 segment for file and network outputs.
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import threading
+from abc import ABC, abstractmethod
+import cv2
+
+from jpeg_codec import get_codec
+from metrics import histogram, SIZE_BUCKETS, LATENCY_BUCKETS
+
+# APP15 segment carrying per-frame detection metadata as JSON
+METADATA_MARKER = b'\xff\xef'
+METADATA_IDENTIFIER = b'YOLODET\x00'
+MAX_SEGMENT_PAYLOAD = 65533 - len(METADATA_IDENTIFIER)
+
+# PUBLISH_OVERLAY=0 publishes clean frames; consumers draw from the metadata
+BURN_IN_OVERLAYS = os.environ.get('PUBLISH_OVERLAY', '1').lower() not in ('0', 'false', 'no')
+
+
+def embed_metadata(jpeg_data, metadata):
+    """Return JPEG bytes with metadata JSON in an APP15 segment (after APP0 if present)"""
+    jpeg_data = memoryview(jpeg_data).cast('B')
+    payload = json.dumps(metadata, separators=(',', ':')).encode()
+    if len(payload) > MAX_SEGMENT_PAYLOAD:
+        return bytes(jpeg_data)
+
+    insert_at = 2
+    if bytes(jpeg_data[2:4]) == b'\xff\xe0':
+        insert_at = 4 + struct.unpack('>H', jpeg_data[4:6])[0]
+
+    segment = METADATA_MARKER + struct.pack('>H', len(METADATA_IDENTIFIER) + len(payload) + 2)
+    return b''.join((jpeg_data[:insert_at], segment, METADATA_IDENTIFIER, payload, jpeg_data[insert_at:]))
+
+
+def extract_metadata(jpeg_data):
+    """Read metadata embedded by embed_metadata(), None if the JPEG carries none"""
+    jpeg_data = memoryview(jpeg_data).cast('B')
+    offset = 2
+    # Walk the marker segments up to the start of the image data
+    while offset + 4 <= len(jpeg_data) and jpeg_data[offset] == 0xFF and jpeg_data[offset + 1] not in (0xD9, 0xDA):
+        length = struct.unpack('>H', jpeg_data[offset + 2:offset + 4])[0]
+        segment = jpeg_data[offset + 4:offset + 2 + length]
+        if bytes(jpeg_data[offset:offset + 2]) == METADATA_MARKER and bytes(segment[:len(METADATA_IDENTIFIER)]) == METADATA_IDENTIFIER:
+            return json.loads(bytes(segment[len(METADATA_IDENTIFIER):]))
+        offset += 2 + length
+    return None
+
+
+class EncodeProfile:
+    def __init__(self, name, quality=85, width=None, overlay=False, subsampling='420', fast_dct=False):
+        self.name = name
+        self.quality = quality          # JPEG quality 1-100
+        self.width = width              # Downscale to this width before encoding (None = full size)
+        self.overlay = overlay          # Burn detection overlays into the image
+        self.subsampling = subsampling  # Chroma subsampling: 444, 422, 420 or gray
+        self.fast_dct = fast_dct        # Faster, slightly less accurate DCT (TurboJPEG only)
+
+    @property
+    def key(self):
+        return (self.quality, self.width, self.overlay, self.subsampling, self.fast_dct)
+
+
+FULL_PROFILE = EncodeProfile(
+    'full',
+    quality=int(os.environ.get('JPEG_QUALITY', 85)),
+    overlay=BURN_IN_OVERLAYS,
+    subsampling=os.environ.get('JPEG_SUBSAMPLING', '420'),
+    fast_dct=os.environ.get('JPEG_FAST_DCT', '0').lower() in ('1', 'true', 'yes')
+)
+
+
+class EncodedFrame:
+    def __init__(self, jpeg, frame_id, metadata, profile, width, height):
+        self.jpeg = jpeg            # Encoded JPEG (bytes-like buffer, shared by all sinks)
+        self.frame_id = frame_id
+        self.metadata = metadata
+        self.profile = profile
+        self.width = width
+        self.height = height
+        self.timestamp = time.time()
+        self.source_width = width   # Width of the frame detections refer to (set by the publisher)
+        self._with_metadata = None
+
+    def with_metadata(self):
+        """JPEG with metadata in an APP15 segment, built once and shared by all sinks"""
+        if self._with_metadata is None:
+            metadata = self.metadata
+            if metadata and self.source_width != self.width:
+                # Detection boxes are in source frame coordinates
+                metadata = dict(metadata, scale=self.width / self.source_width)
+            self._with_metadata = embed_metadata(self.jpeg, metadata) if metadata else self.jpeg
+        return self._with_metadata
+
+    @property
+    def size(self):
+        return len(self.jpeg)
+
+    def tobytes(self):
+        return bytes(self.jpeg)
+
+
+class FrameSink(ABC):
+    """Base class for publisher outputs; a sink missing publish() fails at construction"""
+
+    # Raw sinks get the unencoded frame through publish_raw() instead (see RawFrameSink)
+    raw = False
+
+    def __init__(self, profile=FULL_PROFILE):
+        self.profile = profile
+        self.frames_published = 0
+        self.bytes_published = 0
+
+    @property
+    def active(self):
+        """Whether this sink currently wants frames (inactive sinks cost no encode)"""
+        return True
+
+    @abstractmethod
+    def publish(self, encoded_frame):
+        """Receive an EncodedFrame shared by reference with the other sinks of its profile"""
+
+    def close(self):
+        pass
+
+
+class RawFrameSink(FrameSink):
+    """Base class for sinks that take the unencoded frame (e.g. video encoders)"""
+
+    raw = True
+
+    def publish(self, encoded_frame):
+        raise TypeError(f"{type(self).__name__} receives frames through publish_raw()")
+
+    @abstractmethod
+    def publish_raw(self, frame, frame_id, metadata):
+        """Receive the BGR frame itself; it may be reused by the caller after returning"""
+
+
+class SharedMemorySink(FrameSink):
+    def __init__(self, frame_ring, profile=FULL_PROFILE):
+        super().__init__(profile)
+        self.frame_ring = frame_ring
+
+    def publish(self, encoded_frame):
+        # Metadata travels alongside the JPEG; tell readers whether they still need to draw it
+        metadata = dict(encoded_frame.metadata or {}, overlay=self.profile.overlay)
+        self.frame_ring.write(encoded_frame.jpeg, encoded_frame.frame_id, metadata)
+
+    def close(self):
+        self.frame_ring.close()
+
+
+class FileSink(FrameSink):
+    def __init__(self, path, profile=FULL_PROFILE, embed_metadata=None):
+        super().__init__(profile)
+        self.path = str(path)
+        # Clean frames carry their detections inside the file by default
+        self.embed_metadata = not profile.overlay if embed_metadata is None else embed_metadata
+
+    def publish(self, encoded_frame):
+        data = encoded_frame.with_metadata() if self.embed_metadata else encoded_frame.jpeg
+        # Write atomically so readers never see half-written files
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+class LatestFrameSink(FrameSink):
+    """Keeps a reference to the newest encoded frame for HTTP readers"""
+
+    def __init__(self, profile=FULL_PROFILE):
+        super().__init__(profile)
+        self.condition = threading.Condition()
+        self.latest = None
+        self.subscribers = 0
+
+    @property
+    def active(self):
+        return self.subscribers > 0
+
+    def publish(self, encoded_frame):
+        with self.condition:
+            self.latest = encoded_frame
+            self.condition.notify_all()
+
+
+class UdpSink(FrameSink):
+    """MJPEG restream over UDP, each JPEG split into datagrams"""
+
+    def __init__(self, host, port, profile=FULL_PROFILE, chunk_size=60000, embed_metadata=None):
+        super().__init__(profile)
+        self.address = (host, port)
+        self.chunk_size = chunk_size
+        self.embed_metadata = not profile.overlay if embed_metadata is None else embed_metadata
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.dropped = 0
+
+    def publish(self, encoded_frame):
+        data = encoded_frame.with_metadata() if self.embed_metadata else encoded_frame.jpeg
+        view = memoryview(data).cast('B')
+        try:
+            for offset in range(0, len(view), self.chunk_size):
+                self.socket.sendto(view[offset:offset + self.chunk_size], self.address)
+        except (BlockingIOError, OSError):
+            # Never block the pipeline on a slow network
+            self.dropped += 1
+
+    def close(self):
+        self.socket.close()
+
+
+ENCODED_BYTES = histogram('yolo_encoded_jpeg_bytes', 'Size of published JPEG frames', ('profile',), SIZE_BUCKETS)
+ENCODE_SECONDS = histogram('yolo_encode_seconds', 'JPEG encode latency', ('profile',), LATENCY_BUCKETS)
+
+
+class FramePublisher:
+    def __init__(self, overlay_renderer=None):
+        self.sinks = []
+        self.lock = threading.Lock()
+        # Callable (frame, metadata) -> new frame with overlays drawn; must not modify its input
+        self.overlay_renderer = overlay_renderer
+        self.codec = get_codec()
+
+        # Statistics
+        self.encode_count = {}
+        self.encode_time_total = 0.0
+        self.skipped_encodes = 0
+        self.overlays_rendered = 0
+        self.overlay_time_total = 0.0
+        self.profile_metrics = {}   # profile name -> (size histogram, encode time histogram)
+
+    def add_sink(self, sink):
+        with self.lock:
+            self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def wants_frames(self):
+        """Whether any sink currently wants frames; when none does the caller may skip decoding"""
+        with self.lock:
+            return any(sink.active for sink in self.sinks)
+
+    def encode(self, frame, profile):
+        """Encode frame for a profile, returns (jpeg buffer, width, height) or None"""
+        if profile.width and frame.shape[1] > profile.width:
+            height = int(frame.shape[0] * profile.width / frame.shape[1])
+            frame = cv2.resize(frame, (profile.width, height), interpolation=cv2.INTER_AREA)
+        encoded = self.codec.encode(frame, profile.quality, profile.subsampling, profile.fast_dct)
+        if encoded is None:
+            return None
+        return encoded, frame.shape[1], frame.shape[0]
+
+    def publish(self, frame, frame_id, metadata=None):
+        """Encode once per wanted profile and fan out to sinks, returns {profile name: EncodedFrame}"""
+        with self.lock:
+            sinks = list(self.sinks)
+
+        # Group sinks by profile (raw sinks only by overlay); skip profiles nobody currently wants
+        by_profile = {}
+        for sink in sinks:
+            key = ('raw', sink.profile.overlay) if sink.raw else sink.profile.key
+            by_profile.setdefault(key, (sink.profile, []))[1].append(sink)
+
+        published = {}
+        overlay_frame = None  # Rendered at most once, shared by all overlay profiles
+        for key, (profile, profile_sinks) in by_profile.items():
+            active_sinks = [sink for sink in profile_sinks if sink.active]
+            if not active_sinks:
+                self.skipped_encodes += 1
+                continue
+
+            source = frame
+            if profile.overlay and self.overlay_renderer is not None:
+                if overlay_frame is None:
+                    start_time = time.perf_counter()
+                    overlay_frame = self.overlay_renderer(frame, metadata or {})
+                    self.overlay_time_total += time.perf_counter() - start_time
+                    self.overlays_rendered += 1
+                source = overlay_frame
+
+            if key[0] == 'raw':
+                for sink in active_sinks:
+                    try:
+                        sink.publish_raw(source, frame_id, metadata)
+                        sink.frames_published += 1
+                    except Exception as e:
+                        print(f"⚠️ {type(sink).__name__} publish error: {e}")
+                continue
+
+            start_time = time.perf_counter()
+            result = self.encode(source, profile)
+            encode_time = time.perf_counter() - start_time
+            self.encode_time_total += encode_time
+            if result is None:
+                print(f"⚠️ Failed to encode frame for profile {profile.name}")
+                continue
+
+            profile_metrics = self.profile_metrics.get(profile.name)
+            if profile_metrics is None:
+                profile_metrics = (ENCODED_BYTES.labels(profile.name), ENCODE_SECONDS.labels(profile.name))
+                self.profile_metrics[profile.name] = profile_metrics
+            profile_metrics[0].observe(len(result[0]))
+            profile_metrics[1].observe(encode_time)
+
+            self.encode_count[profile.name] = self.encode_count.get(profile.name, 0) + 1
+            encoded_frame = EncodedFrame(result[0], frame_id, metadata, profile, result[1], result[2])
+            encoded_frame.source_width = frame.shape[1]
+            published[profile.name] = encoded_frame
+
+            for sink in active_sinks:
+                try:
+                    sink.publish(encoded_frame)
+                    sink.frames_published += 1
+                    sink.bytes_published += encoded_frame.size
+                except Exception as e:
+                    print(f"⚠️ {type(sink).__name__} publish error: {e}")
+
+        return published
+
+    def close(self):
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = []
+
+    def get_stats(self):
+        """Get publisher statistics"""
+        total_encodes = sum(self.encode_count.values())
+        return {
+            "encodes": dict(self.encode_count),
+            "skipped_encodes": self.skipped_encodes,
+            "avg_encode_ms": self.encode_time_total * 1000 / max(1, total_encodes),
+            "overlays_rendered": self.overlays_rendered,
+            "avg_overlay_ms": self.overlay_time_total * 1000 / max(1, self.overlays_rendered),
+            "sinks": [{"type": type(sink).__name__, "profile": sink.profile.name,
+                       "frames": sink.frames_published, "bytes": sink.bytes_published}
+                      for sink in self.sinks]
+        }
+
+
+def add_restream_sink(publisher):
+    """Add UDP MJPEG restream sink from RESTREAM_UDP=host:port, if configured"""
+    target = os.environ.get('RESTREAM_UDP')
+    if not target:
+        return None
+
+    try:
+        host, port = target.rsplit(':', 1)
+        overlay = os.environ.get('RESTREAM_OVERLAY')
+        profile = EncodeProfile(
+            'restream',
+            quality=int(os.environ.get('RESTREAM_QUALITY', 70)),
+            width=int(os.environ['RESTREAM_WIDTH']) if os.environ.get('RESTREAM_WIDTH') else None,
+            overlay=BURN_IN_OVERLAYS if overlay is None else overlay.lower() in ('1', 'true', 'yes'),
+            fast_dct=True
+        )
+        sink = publisher.add_sink(UdpSink(host, int(port), profile))
+        print(f"📡 Restreaming processed MJPEG to udp://{host}:{port} (quality {profile.quality})")
+        return sink
+    except Exception as e:
+        print(f"⚠️ Failed to set up UDP restream: {e}")
+        return None
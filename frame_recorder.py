@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Bounded asynchronous frame recorder
+Keeps an in-memory pre-roll of encoded frames and writes MJPEG clips around detection
+events on its own writer thread, with size and age retention limits. A clip that keeps
+going (a scene with constant detections) is rotated into a new clip at a duration or size
+limit, so retention can delete the older parts.
+The processing loop only appends references and never waits on storage.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+
+from frame_publisher import FrameSink, FULL_PROFILE
+
+
+class FrameRecorder(FrameSink):
+    def __init__(self, directory, preroll_frames=90, postroll_seconds=5.0, queue_size=256,
+                 max_bytes=500 * 1024 * 1024, max_age_seconds=24 * 3600, max_clip_seconds=300.0,
+                 max_clip_bytes=None, profile=FULL_PROFILE):
+        super().__init__(profile)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.postroll_seconds = postroll_seconds
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.max_clip_seconds = max_clip_seconds
+        # Well below the total limit, so retention always has closed clips to delete
+        self.max_clip_bytes = max_clip_bytes or max_bytes // 5
+
+        # Pre-roll holds references to already-encoded frames, no copies
+        self.preroll = deque(maxlen=preroll_frames)
+        # Only frames are bounded (and dropped when the writer falls behind); close markers
+        # always get in, in order behind their clip's frames
+        self.write_queue = queue.Queue()
+        self.frame_slots = threading.Semaphore(queue_size)
+
+        # Event state (processing thread only)
+        self.clip_name = None
+        self.clip_start_time = 0.0
+        self.clip_bytes = 0
+        self.last_event_time = 0.0
+
+        # Statistics
+        self.frames_dropped = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.clips_written = 0
+        self.clips_deleted = 0
+        self.clips_rotated = 0
+        self.write_time_total = 0.0
+        self.throughput_window = deque(maxlen=64)  # (timestamp, bytes)
+
+        self.running = True
+        self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def publish(self, encoded_frame):
+        """Called from the processing thread for every published frame"""
+        now = encoded_frame.timestamp
+        metadata = encoded_frame.metadata or {}
+        has_event = bool(metadata.get('detections'))
+
+        if has_event:
+            self.last_event_time = now
+            if self.clip_name is None:
+                # New event: start a clip and flush the pre-roll into it
+                self.start_clip(encoded_frame)
+                print(f"🎬 Recording event clip {self.clip_name}")
+                while self.preroll:
+                    self.add_frame(self.preroll.popleft())
+
+        if self.clip_name is not None:
+            if self.clip_bytes and (now - self.clip_start_time >= self.max_clip_seconds
+                                    or self.clip_bytes >= self.max_clip_bytes):
+                # Event still going: continue in a new clip
+                self._enqueue(('close', self.clip_name, None))
+                self.start_clip(encoded_frame)
+                self.clips_rotated += 1
+                print(f"🎬 Continuing event in clip {self.clip_name}")
+            self.add_frame(encoded_frame)
+            if now - self.last_event_time > self.postroll_seconds:
+                self._enqueue(('close', self.clip_name, None))
+                self.clip_name = None
+        else:
+            self.preroll.append(encoded_frame)
+
+    def start_clip(self, encoded_frame):
+        self.clip_name = (time.strftime("clip_%Y%m%d_%H%M%S", time.localtime(encoded_frame.timestamp))
+                          + f"_{encoded_frame.frame_id:06d}")
+        self.clip_start_time = encoded_frame.timestamp
+        self.clip_bytes = 0
+
+    def add_frame(self, encoded_frame):
+        self.clip_bytes += encoded_frame.size
+        self._enqueue(('frame', self.clip_name, encoded_frame))
+
+    def _enqueue(self, item):
+        """Queue work for the writer thread, dropping frames instead of blocking"""
+        if item[0] == 'frame' and not self.frame_slots.acquire(blocking=False):
+            self.frames_dropped += 1
+            return
+        self.write_queue.put_nowait(item)
+
+    def writer_loop(self):
+        """Writer thread: append frames to clip files and enforce retention"""
+        open_clips = {}
+        last_retention_check = 0.0
+
+        while self.running or not self.write_queue.empty():
+            try:
+                kind, clip_name, encoded_frame = self.write_queue.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+            if kind == 'frame':
+                self.frame_slots.release()
+
+            try:
+                if kind == 'frame':
+                    start_time = time.perf_counter()
+                    clip = open_clips.get(clip_name)
+                    if clip is None:
+                        clip = {
+                            'video': open(self.directory / f"{clip_name}.mjpeg", 'wb'),
+                            'meta': open(self.directory / f"{clip_name}.jsonl", 'w')
+                        }
+                        open_clips[clip_name] = clip
+                    clip['video'].write(encoded_frame.jpeg)
+                    clip['meta'].write(json.dumps({
+                        'frame_id': encoded_frame.frame_id,
+                        'timestamp': encoded_frame.timestamp,
+                        'size': encoded_frame.size,
+                        'detections': (encoded_frame.metadata or {}).get('detections', [])
+                    }, separators=(',', ':')) + "\n")
+                    self.write_time_total += time.perf_counter() - start_time
+                    self.frames_written += 1
+                    self.bytes_written += encoded_frame.size
+                    self.throughput_window.append((time.time(), encoded_frame.size))
+
+                elif kind == 'close':
+                    clip = open_clips.pop(clip_name, None)
+                    if clip is not None:
+                        clip['video'].close()
+                        clip['meta'].close()
+                        self.clips_written += 1
+                        print(f"💾 Saved event clip {clip_name}")
+                        last_retention_check = 0.0
+
+            except Exception as e:
+                print(f"⚠️ Recorder write error: {e}")
+
+            if time.time() - last_retention_check > 60:
+                self.enforce_retention(set(open_clips))
+                last_retention_check = time.time()
+
+        for clip in open_clips.values():
+            clip['video'].close()
+            clip['meta'].close()
+
+    def enforce_retention(self, open_clip_names=()):
+        """Delete oldest clips beyond the size limit and clips older than the age limit"""
+        try:
+            clips = []
+            for video_path in self.directory.glob("clip_*.mjpeg"):
+                if video_path.stem in open_clip_names:
+                    continue
+                meta_path = video_path.with_suffix('.jsonl')
+                stat = video_path.stat()
+                size = stat.st_size + (meta_path.stat().st_size if meta_path.exists() else 0)
+                clips.append((stat.st_mtime, size, video_path, meta_path))
+
+            clips.sort()
+            total_bytes = sum(clip[1] for clip in clips)
+            now = time.time()
+
+            for mtime, size, video_path, meta_path in clips:
+                if total_bytes <= self.max_bytes and now - mtime <= self.max_age_seconds:
+                    break
+                video_path.unlink()
+                if meta_path.exists():
+                    meta_path.unlink()
+                total_bytes -= size
+                self.clips_deleted += 1
+
+        except Exception as e:
+            print(f"⚠️ Recorder retention error: {e}")
+
+    def close(self):
+        """Finish the current clip and stop the writer thread"""
+        if self.clip_name is not None:
+            self._enqueue(('close', self.clip_name, None))
+            self.clip_name = None
+        self.running = False
+        self.writer_thread.join(timeout=5.0)
+
+    def get_stats(self):
+        """Get recorder statistics"""
+        window = list(self.throughput_window)
+        if len(window) > 1 and window[-1][0] > window[0][0]:
+            throughput = sum(size for _, size in window[1:]) / (window[-1][0] - window[0][0])
+        else:
+            throughput = 0.0
+        return {
+            "queue_backlog": self.write_queue.qsize(),
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "bytes_written": self.bytes_written,
+            "write_throughput_bps": throughput,
+            "avg_write_ms": self.write_time_total * 1000 / max(1, self.frames_written),
+            "clips_written": self.clips_written,
+            "clips_deleted": self.clips_deleted,
+            "clips_rotated": self.clips_rotated,
+            "recording": self.clip_name is not None
+        }
+
+
+def create_frame_recorder(default_directory):
+    """Create recorder from RECORD_* environment settings, None unless enabled with RECORDER=1"""
+    if os.environ.get('RECORDER', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    recorder = FrameRecorder(
+        directory=os.environ.get('RECORD_DIR', default_directory),
+        preroll_frames=int(os.environ.get('RECORD_PREROLL_FRAMES', 90)),
+        postroll_seconds=float(os.environ.get('RECORD_POSTROLL_SECONDS', 5.0)),
+        queue_size=int(os.environ.get('RECORD_QUEUE_SIZE', 256)),
+        max_bytes=int(os.environ.get('RECORD_MAX_MB', 500)) * 1024 * 1024,
+        max_age_seconds=float(os.environ.get('RECORD_MAX_AGE_HOURS', 24)) * 3600,
+        max_clip_seconds=float(os.environ.get('RECORD_MAX_CLIP_SECONDS', 300)),
+        max_clip_bytes=int(os.environ['RECORD_MAX_CLIP_MB']) * 1024 * 1024 if os.environ.get('RECORD_MAX_CLIP_MB') else None
+    )
+    print(f"🎬 Event recorder: {recorder.directory}, pre-roll {recorder.preroll.maxlen} frames, "
+          f"limit {recorder.max_bytes // (1024 * 1024)} MB / {recorder.max_age_seconds / 3600:.0f} h")
+    return recorder
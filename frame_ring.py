@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Shared-memory ring of encoded frames for local consumers
+The processor writes JPEG frames plus JSON metadata into a multiprocessing.shared_memory
+ring; readers map the same segment and read the newest complete frame without disk I/O.
+Each slot is protected by a sequence-number seqlock (odd = being written).
+
+A restarted processor unlinks the segment and creates a new one under the same name, which a
+reader's existing mapping never sees. Every segment carries a random generation number, and
+readers whose sequence has stalled check the name for a newer generation (see is_stale()).
+"""
+
+import os
+import json
+import time
+import struct
+from multiprocessing import shared_memory, resource_tracker
+
+RING_MAGIC = b'YFRM'
+RING_VERSION = 2
+
+# Ring header: magic, version, slot count, slot size, frames written, latest slot, generation
+HEADER_FORMAT = '<4sIIIQIQ'
+HEADER_SIZE = 64
+GENERATION_OFFSET = 28
+
+# Slot header: seqlock counter, frame id, timestamp, JPEG length, metadata length
+SLOT_HEADER_FORMAT = '<QQdII'
+SLOT_HEADER_SIZE = struct.calcsize(SLOT_HEADER_FORMAT)
+
+DEFAULT_RING_NAME = os.environ.get('FRAME_RING_NAME', 'cm5_yolo_frames')
+
+
+class SharedFrameRing:
+    def __init__(self, name=DEFAULT_RING_NAME, slots=4, slot_size=2 * 1024 * 1024, create=False,
+                 stale_after=1.0):
+        self.name = name
+        self.is_writer = create
+        self.stale_after = stale_after      # Readers: seconds without a new frame before checking for a restart
+
+        if create:
+            size = HEADER_SIZE + slots * slot_size
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Stale segment from a previous run
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.slots = slots
+            self.slot_size = slot_size
+            self.frames_written = 0
+            self.generation = struct.unpack('<Q', os.urandom(8))[0]
+            struct.pack_into(HEADER_FORMAT, self.shm.buf, 0, RING_MAGIC, RING_VERSION,
+                             slots, slot_size, 0, 0, self.generation)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Readers must not unlink the segment when they exit
+            try:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            except Exception:
+                pass
+            magic, version, self.slots, self.slot_size, _, _, self.generation = struct.unpack_from(
+                HEADER_FORMAT, self.shm.buf, 0)
+            if magic != RING_MAGIC or version != RING_VERSION:
+                self.shm.close()
+                raise ValueError(f"Shared memory '{name}' is not a frame ring")
+            self.last_sequence = None
+            self.last_progress = time.monotonic()
+
+        # Largest payload (metadata + JPEG) that fits one slot
+        self.max_payload = self.slot_size - SLOT_HEADER_SIZE
+
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    def write(self, jpeg_data, frame_id, metadata=None):
+        """Publish an encoded frame into the next slot, returns False if it does not fit"""
+        meta_bytes = json.dumps(metadata, separators=(',', ':')).encode() if metadata else b''
+        jpeg_data = memoryview(jpeg_data).cast('B')
+        if len(jpeg_data) + len(meta_bytes) > self.max_payload:
+            print(f"⚠️ Frame too large for shared memory slot: {len(jpeg_data)} bytes")
+            return False
+
+        slot = self.frames_written % self.slots
+        offset = self._slot_offset(slot)
+        buf = self.shm.buf
+
+        # Seqlock: odd while the slot is being written
+        seq = struct.unpack_from('<Q', buf, offset)[0]
+        struct.pack_into('<Q', buf, offset, seq + 1)
+
+        data_offset = offset + SLOT_HEADER_SIZE
+        buf[data_offset:data_offset + len(meta_bytes)] = meta_bytes
+        jpeg_offset = data_offset + len(meta_bytes)
+        buf[jpeg_offset:jpeg_offset + len(jpeg_data)] = jpeg_data
+
+        struct.pack_into(SLOT_HEADER_FORMAT, buf, offset, seq + 1, frame_id, time.time(),
+                         len(jpeg_data), len(meta_bytes))
+        struct.pack_into('<Q', buf, offset, seq + 2)
+
+        # Advertise the slot only after it is complete
+        self.frames_written += 1
+        struct.pack_into('<QI', buf, 16, self.frames_written, slot)
+        return True
+
+    def latest_sequence(self):
+        """Number of frames written so far (changes whenever a new frame is published)"""
+        return struct.unpack_from('<Q', self.shm.buf, 16)[0]
+
+    def is_stale(self):
+        """Reader side: whether the segment was replaced or removed by a restarted or stopped processor
+
+        Only checked once the sequence has not moved for stale_after seconds, so a live
+        stream costs one header read; the check re-opens the name and compares generations.
+        """
+        sequence = self.latest_sequence()
+        now = time.monotonic()
+        if sequence != self.last_sequence:
+            self.last_sequence = sequence
+            self.last_progress = now
+            return False
+        if now - self.last_progress < self.stale_after:
+            return False
+        self.last_progress = now    # At most one check per stale_after while stalled
+        try:
+            current = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return True
+        try:
+            resource_tracker.unregister(current._name, 'shared_memory')
+        except Exception:
+            pass
+        try:
+            return struct.unpack_from('<Q', current.buf, GENERATION_OFFSET)[0] != self.generation
+        finally:
+            current.close()
+
+    def read_latest(self, copy=True, retries=3):
+        """Read newest complete frame, returns dict or None if no frame is available
+
+        With copy=False the JPEG is a memoryview into shared memory (zero-copy);
+        call is_valid(frame) after using it to make sure it was not overwritten.
+        """
+        buf = self.shm.buf
+        for _ in range(retries):
+            frames_written, slot = struct.unpack_from('<QI', buf, 16)
+            if frames_written == 0:
+                return None
+
+            offset = self._slot_offset(slot)
+            seq, frame_id, timestamp, jpeg_len, meta_len = struct.unpack_from(SLOT_HEADER_FORMAT, buf, offset)
+            if seq % 2 == 1:
+                continue
+
+            data_offset = offset + SLOT_HEADER_SIZE
+            meta_bytes = bytes(buf[data_offset:data_offset + meta_len])
+            jpeg_offset = data_offset + meta_len
+            jpeg = buf[jpeg_offset:jpeg_offset + jpeg_len]
+            if copy:
+                jpeg = bytes(jpeg)
+
+            if struct.unpack_from('<Q', buf, offset)[0] != seq:
+                continue
+
+            return {
+                'jpeg': jpeg,
+                'frame_id': frame_id,
+                'timestamp': timestamp,
+                'sequence': frames_written,
+                'metadata': json.loads(meta_bytes) if meta_bytes else None,
+                '_slot': slot,
+                '_seq': seq
+            }
+        return None
+
+    def is_valid(self, frame):
+        """Check that a zero-copy frame has not been overwritten since it was read"""
+        offset = self._slot_offset(frame['_slot'])
+        return struct.unpack_from('<Q', self.shm.buf, offset)[0] == frame['_seq']
+
+    def close(self):
+        """Detach from shared memory, the writer also removes the segment"""
+        try:
+            self.shm.close()
+            if self.is_writer:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+def create_frame_ring():
+    """Create the writer side of the frame ring, None if shared memory is unavailable"""
+    try:
+        ring = SharedFrameRing(
+            slots=int(os.environ.get('FRAME_RING_SLOTS', 4)),
+            slot_size=int(os.environ.get('FRAME_RING_SLOT_SIZE', 2 * 1024 * 1024)),
+            create=True
+        )
+        print(f"🧠 Shared memory frame ring '{ring.name}': {ring.slots} slots x {ring.slot_size} bytes")
+        return ring
+    except Exception as e:
+        print(f"⚠️ Shared memory frame ring unavailable: {e}")
+        return None
+
+
+def open_frame_ring():
+    """Attach to an existing frame ring as a reader, None if the processor is not running"""
+    try:
+        return SharedFrameRing(create=False)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Failed to open frame ring: {e}")
+        return None
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+H.264 restream of processed frames through a persistent ffmpeg process
+Raw frames are converted to I420 and written to ffmpeg's stdin on a writer thread;
+ffmpeg encodes H.264 and sends it over RTP or MPEG-TS/UDP. A backed-up encoder
+makes the sink drop frames instead of stalling the processing loop.
+"""
+
+import os
+import time
+import queue
+import shutil
+import threading
+import subprocess
+import cv2
+
+from frame_publisher import RawFrameSink, EncodeProfile, BURN_IN_OVERLAYS
+
+
+class H264RestreamSink(RawFrameSink):
+    def __init__(self, url, bitrate='1500k', gop=30, fps=30, width=None, encoder='libx264',
+                 profile=None, queue_size=2):
+        super().__init__(profile or EncodeProfile('h264', overlay=BURN_IN_OVERLAYS))
+        self.url = url              # rtp://host:port or udp://host:port
+        self.bitrate = bitrate
+        self.gop = gop
+        self.fps = fps
+        self.width = width          # Downscale before encoding (None = full size)
+        self.encoder = encoder
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+
+        self.process = None
+        self.frame_size = None
+        self.next_start_time = 0.0
+
+        # Statistics
+        self.frames_dropped = 0
+        self.frames_written = 0     # Frames handed to ffmpeg
+        self.frames_encoded = 0     # Frames ffmpeg reports as encoded
+        self.write_time_total = 0.0
+        self.restarts = 0
+
+        self.running = True
+        self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def publish_raw(self, frame, frame_id, metadata):
+        """Queue a copy of the frame, dropping it if the encoder is behind"""
+        try:
+            self.frame_queue.put_nowait(frame.copy())
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def build_command(self, width, height):
+        """ffmpeg command line reading I420 frames from stdin"""
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+            '-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-s', f'{width}x{height}', '-r', str(self.fps),
+            '-i', 'pipe:0',
+            '-c:v', self.encoder, '-b:v', self.bitrate, '-maxrate', self.bitrate,
+            '-bufsize', self.bitrate, '-g', str(self.gop), '-bf', '0',
+        ]
+        if self.encoder == 'libx264':
+            command += ['-preset', 'ultrafast', '-tune', 'zerolatency']
+        command += ['-progress', 'pipe:1']
+
+        if self.url.startswith('rtp://'):
+            command += ['-f', 'rtp', '-sdp_file', os.environ.get('H264_SDP_FILE', '/tmp/h264_restream.sdp'), self.url]
+        else:
+            command += ['-f', 'mpegts', self.url]
+        return command
+
+    def start_encoder(self, width, height):
+        """Start ffmpeg for the given frame size, with a backoff after failures"""
+        if time.time() < self.next_start_time:
+            return False
+        self.stop_encoder()
+        try:
+            self.process = subprocess.Popen(self.build_command(width, height), stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=None)
+        except OSError as e:
+            print(f"❌ Failed to start H.264 encoder: {e}")
+            self.next_start_time = time.time() + 5.0
+            return False
+
+        self.frame_size = (width, height)
+        self.frames_encoded = 0
+        self.frames_written = 0
+        threading.Thread(target=self.progress_loop, args=(self.process,), daemon=True).start()
+        print(f"🎞️ H.264 restream {width}x{height} @ {self.fps} fps, {self.bitrate}, GOP {self.gop} -> {self.url}")
+        return True
+
+    def stop_encoder(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2.0)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def progress_loop(self, process):
+        """Read ffmpeg -progress output to learn how many frames were actually encoded"""
+        for line in process.stdout:
+            if line.startswith(b'frame='):
+                try:
+                    self.frames_encoded = int(line[6:])
+                except ValueError:
+                    pass
+
+    def writer_loop(self):
+        """Writer thread: convert frames to I420 and feed ffmpeg"""
+        while self.running:
+            try:
+                frame = self.frame_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if self.width and frame.shape[1] > self.width:
+                height = int(frame.shape[0] * self.width / frame.shape[1])
+                frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+            # I420 needs even dimensions
+            height, width = frame.shape[0] & ~1, frame.shape[1] & ~1
+            frame = frame[:height, :width]
+
+            if self.process is None or self.process.poll() is not None or self.frame_size != (width, height):
+                if self.process is not None:
+                    self.restarts += 1
+                if not self.start_encoder(width, height):
+                    continue
+
+            start_time = time.perf_counter()
+            try:
+                self.process.stdin.write(cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420).data)
+                self.frames_written += 1
+                self.bytes_published += width * height * 3 // 2
+            except (BrokenPipeError, OSError) as e:
+                print(f"⚠️ H.264 encoder pipe error: {e}")
+                self.stop_encoder()
+                self.next_start_time = time.time() + 2.0
+            self.write_time_total += time.perf_counter() - start_time
+
+        self.stop_encoder()
+
+    def close(self):
+        self.running = False
+        self.writer_thread.join(timeout=5.0)
+
+    def get_stats(self):
+        """Get encoder statistics; lag is frames written to ffmpeg but not yet encoded"""
+        lag_frames = max(0, self.frames_written - self.frames_encoded)
+        return {
+            "url": self.url,
+            "running": self.process is not None and self.process.poll() is None,
+            "queue_backlog": self.frame_queue.qsize(),
+            "frames_written": self.frames_written,
+            "frames_encoded": self.frames_encoded,
+            "frames_dropped": self.frames_dropped,
+            "encoder_lag_frames": lag_frames,
+            "encoder_lag_ms": lag_frames * 1000.0 / self.fps,
+            "avg_write_ms": self.write_time_total * 1000 / max(1, self.frames_written),
+            "restarts": self.restarts
+        }
+
+
+def add_h264_restream_sink(publisher):
+    """Add H.264 restream sink from H264_RESTREAM=rtp://host:port or udp://host:port, if configured"""
+    url = os.environ.get('H264_RESTREAM')
+    if not url:
+        return None
+    if shutil.which('ffmpeg') is None:
+        print("⚠️ H264_RESTREAM is set but ffmpeg is not installed")
+        return None
+
+    overlay = os.environ.get('H264_OVERLAY')
+    sink = H264RestreamSink(
+        url,
+        bitrate=os.environ.get('H264_BITRATE', '1500k'),
+        gop=int(os.environ.get('H264_GOP', 30)),
+        fps=int(os.environ.get('H264_FPS', 30)),
+        width=int(os.environ['H264_WIDTH']) if os.environ.get('H264_WIDTH') else None,
+        encoder=os.environ.get('H264_ENCODER', 'libx264'),
+        profile=EncodeProfile('h264', overlay=BURN_IN_OVERLAYS if overlay is None
+                              else overlay.lower() in ('1', 'true', 'yes'))
+    )
+    return publisher.add_sink(sink)
@@ -14,6 +14,13 @@ import threading
 import json
 from pathlib import Path
 
+from roi import load_roi_config
+from frame_ring import create_frame_ring
+from frame_publisher import FramePublisher, SharedMemorySink, FileSink, add_restream_sink
+from jpeg_codec import get_codec
+from h264_restream import add_h264_restream_sink
+from device_state import create_device_state
+
 # Hailo imports
 try:
     import hailo_platform
@@ -51,6 +58,13 @@ class HailoYOLOProcessor:
         self.output_dir = Path("/tmp/yolo_frames")
         self.output_dir.mkdir(exist_ok=True)
         
+        # Region of interest for this stream (None = full frame)
+        self.roi = load_roi_config(os.environ.get('UDP_PORT', '5000'))
+        
+        # Processed frames are encoded once and fanned out to all outputs
+        self.publisher = FramePublisher(overlay_renderer=self.render_overlay)
+        self.device_state = None
+        
         # Initialize Hailo
         self.init_hailo()
         
@@ -214,19 +228,22 @@ class HailoYOLOProcessor:
             return original_frame
     
     def run_hailo_inference(self, frame):
-        """Run YOLO inference using Hailo device"""
+        """Run YOLO inference using Hailo device, returns inference time in ms (None = fallback)"""
         try:
             if not self.model_loaded:
                 print("⚠️ Hailo model not loaded, using fallback")
-                return self.simulate_yolo_detection(frame)
+                return None
             
             print("🚀 Running Hailo YOLO inference...")
             
+            # Crop to ROI bounding box before scaling
+            model_frame = self.roi.crop(frame)[0] if self.roi is not None else frame
+            
             # Preprocess frame
-            input_data = self.preprocess_frame(frame)
+            input_data = self.preprocess_frame(model_frame)
             if input_data is None:
                 print("⚠️ Preprocessing failed, using fallback")
-                return self.simulate_yolo_detection(frame)
+                return None
             
             # Create bindings
             try:
@@ -263,22 +280,29 @@ class HailoYOLOProcessor:
                 inference_time = (time.time() - start_time) * 1000  # Convert to ms
                 print(f"⚡ Inference completed in {inference_time:.2f} ms")
                 
-                # Postprocess results
-                processed_frame = self.postprocess_detections(output_data, frame)
-                
-                # Add inference time to frame
-                cv2.putText(processed_frame, f"Inference: {inference_time:.1f}ms", (10, 210), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                
-                return processed_frame
+                return inference_time
                 
             except Exception as e:
                 print(f"⚠️ Hailo inference error: {e}")
-                return self.simulate_yolo_detection(frame)
+                return None
             
         except Exception as e:
             print(f"⚠️ Hailo inference error: {e}")
+            return None
+    
+    def render_overlay(self, frame, metadata):
+        """Burn status and detections into a copy of the frame (only for overlay profiles)"""
+        if metadata.get('inference_ms') is None:
             return self.simulate_yolo_detection(frame)
+        
+        # Postprocess results
+        processed_frame = self.postprocess_detections(None, frame)
+        
+        # Add inference time to frame
+        cv2.putText(processed_frame, f"Inference: {metadata['inference_ms']:.1f}ms", (10, 210), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        
+        return processed_frame
     
     def simulate_yolo_detection(self, frame):
         """Simulate YOLO detection for fallback"""
@@ -315,9 +339,8 @@ class HailoYOLOProcessor:
             # Extract JPEG data
             jpeg_data = data[start_pos:end_pos + 2]
             
-            # Decode using OpenCV
-            nparr = np.frombuffer(jpeg_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Decode (TurboJPEG when available, OpenCV otherwise)
+            frame = get_codec().decode(jpeg_data)
             
             if frame is not None:
                 return frame
@@ -362,12 +385,16 @@ class HailoYOLOProcessor:
                         
                         # Update frame counter
                         self.frame_counter += 1
+                        if self.device_state is not None:
+                            self.device_state.record_frame()
                         
                         # Run YOLO inference
-                        processed_frame = self.run_hailo_inference(frame)
+                        inference_ms = self.run_hailo_inference(frame)
+                        if inference_ms is not None and self.device_state is not None:
+                            self.device_state.record_inference(inference_ms)
                         
                         # Save processed frame
-                        if self.save_processed_frame(processed_frame):
+                        if self.save_processed_frame(frame, inference_ms):
                             # Update FPS counter
                             self.fps_counter += 1
                             current_time = time.time()
@@ -387,12 +414,15 @@ class HailoYOLOProcessor:
                 print(f"⚠️ Stream processing error: {e}")
                 continue
     
-    def save_processed_frame(self, frame):
-        """Save processed frame to shared directory"""
+    def save_processed_frame(self, frame, inference_ms=None):
+        """Publish processed frame to shared memory (or shared directory as fallback)"""
         try:
-            output_path = "/tmp/latest_yolo_frame.jpg"
-            success = cv2.imwrite(output_path, frame)
-            if success:
+            # Overlays are rendered only if some sink wants them burned in
+            published = self.publisher.publish(frame, self.frame_counter, {
+                'frame_id': self.frame_counter,
+                'inference_ms': inference_ms
+            })
+            if published:
                 return True
             else:
                 print("⚠️ Failed to save processed frame")
@@ -424,6 +454,10 @@ class HailoYOLOProcessor:
         if self.udp_socket:
             self.udp_socket.close()
         
+        self.publisher.close()
+        if self.device_state is not None:
+            self.device_state.close()
+        
         sys.exit(0)
     
     def run(self):
@@ -440,6 +474,20 @@ class HailoYOLOProcessor:
         
         self.running = True
         
+        # Only the streaming processor owns the ring (the web service imports this class too)
+        frame_ring = create_frame_ring()
+        if frame_ring is not None:
+            self.publisher.add_sink(SharedMemorySink(frame_ring))
+        else:
+            self.publisher.add_sink(FileSink("/tmp/latest_yolo_frame.jpg"))
+        add_restream_sink(self.publisher)
+        add_h264_restream_sink(self.publisher)
+        
+        # Camera and accelerator state for the web service
+        self.device_state = create_device_state()
+        if self.device_state is not None:
+            self.device_state.set_accelerator('connected' if self.model_loaded else 'unavailable', 'hailo:yolov8n')
+        
         # Start stream processing in separate thread
         stream_thread = threading.Thread(target=self.process_mjpeg_stream)
         stream_thread.daemon = True
@@ -17,6 +17,21 @@ import subprocess
 import json
 from pathlib import Path
 
+from roi import load_roi_config
+from motion_gate import create_motion_gate
+from tracker import create_tracker
+from adaptive_resolution import create_resolution_controller
+from frame_ring import create_frame_ring
+from frame_publisher import FramePublisher, SharedMemorySink, add_restream_sink
+from frame_recorder import create_frame_recorder
+from jpeg_codec import get_codec
+from mjpeg_reassembly import MjpegReassembler
+from h264_restream import add_h264_restream_sink
+from detection_events import create_detection_event_stream
+from device_state import create_device_state
+from inference_engine import create_vdevice, HAILO_MULTI_PROCESS
+from metrics import PipelineMetrics, create_metrics_server
+
 # Hailo imports
 try:
     import hailo_platform
@@ -36,7 +51,8 @@ class HailoYOLOProcessor:
         self.running = False
         self.frame_buffer = []
         self.buffer_size = 1024 * 1024  # 1MB buffer
-        self.mjpeg_buffer = b''
+        # Frames broken by lost datagrams are dropped and counted
+        self.reassembler = MjpegReassembler(on_resync=lambda: self.metrics.drop('incomplete'))
         self.frame_lock = threading.Lock()
         self.latest_processed_frame = None
         
@@ -61,12 +77,66 @@ class HailoYOLOProcessor:
         # COCO classes
         self.classes = self.load_coco_classes()
         
+        # Region of interest for this stream (None = full frame)
+        self.stream_id = os.environ.get('UDP_PORT', '5000')
+        self.roi = load_roi_config(self.stream_id)
+        
+        # Motion gate (None = run inference on every frame)
+        self.motion_gate = create_motion_gate(self.roi)
+        self.last_detections = []
+        self.inference_time_ms = 0.0
+        
+        # Tracker predicts boxes on frames between inferences
+        self.tracker = create_tracker()
+        self.inference_interval = max(1, int(os.environ.get('INFERENCE_INTERVAL', 1)))
+        
+        # Input-resolution variants of the model, switched by load
+        self.model_variants = {}
+        self.queue_depth = 0
+        self.resolution_controller = create_resolution_controller([320, 480, 640])
+        
         # Output directory
         self.output_dir = Path("/tmp/yolo_frames")
         self.output_dir.mkdir(exist_ok=True)
         
+        # Incoming frames are decoded into a reused buffer (TurboJPEG when available)
+        self.codec = get_codec()
+        self.decode_buffer = None
+        
+        # Processed frames are encoded once and fanned out to all outputs
+        self.publisher = FramePublisher(overlay_renderer=self.render_overlay)
+        frame_ring = create_frame_ring()
+        if frame_ring is not None:
+            self.publisher.add_sink(SharedMemorySink(frame_ring))
+        add_restream_sink(self.publisher)
+        self.h264_restream = add_h264_restream_sink(self.publisher)
+        
+        # Per-frame detection records exported in batches (None = stdout only)
+        self.detection_events = create_detection_event_stream(self.stream_id)
+        
+        # Event clips are written on the recorder's own thread
+        self.recorder = create_frame_recorder(str(self.output_dir / "clips"))
+        if self.recorder is not None:
+            self.publisher.add_sink(self.recorder)
+        
+        # Camera and accelerator state for local readers (web service)
+        self.device_state = create_device_state()
+        
+        # Pipeline counters and latency histograms, scraped from METRICS_PORT
+        self.metrics = PipelineMetrics(self.stream_id)
+        self.metrics_server = create_metrics_server()
+        self.metrics.watch_queue('udp_backlog', lambda: self.queue_depth)
+        if self.recorder is not None:
+            self.metrics.watch_queue('recorder', lambda: self.recorder.get_stats()['queue_backlog'])
+        if self.h264_restream is not None:
+            self.metrics.watch_queue('h264', self.h264_restream.frame_queue.qsize)
+        if self.detection_events is not None:
+            self.metrics.watch_queue('detection_events', lambda: len(self.detection_events.buffer))
+        
         # Initialize Hailo
         self.init_hailo()
+        if self.device_state is not None:
+            self.device_state.set_accelerator('connected' if self.model_loaded else 'unavailable', 'hailo:yolov8n')
         
         # Signal handlers
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -107,8 +177,8 @@ class HailoYOLOProcessor:
             # Create VDevice
             try:
                 print("🔍 Creating VDevice...")
-                self.vdevice = VDevice()
-                print("✅ VDevice created successfully")
+                self.vdevice = create_vdevice()
+                print("✅ VDevice created successfully" + (" (HailoRT multi-process service)" if HAILO_MULTI_PROCESS else ""))
             except Exception as e:
                 print(f"❌ Failed to create VDevice: {e}")
                 return
@@ -133,6 +203,11 @@ class HailoYOLOProcessor:
                     
                     # Configure model
                     self.configure_model(first_network)
+                    
+                    # Keep lower-resolution variants ready for load adaptation
+                    if self.model_loaded:
+                        self.model_variants[self.input_shape[0]] = (self.hef, self.configured_model)
+                        self.load_resolution_variants()
                 else:
                     print("❌ No network groups found in HEF")
                     
@@ -142,14 +217,15 @@ class HailoYOLOProcessor:
         except Exception as e:
             print(f"❌ Hailo initialization error: {e}")
     
-    def find_hef_file(self):
-        """Find HEF file in common locations"""
+    def find_hef_file(self, input_size=None):
+        """Find HEF file in common locations (yolov8n_<size>.hef for resolution variants)"""
+        file_name = f"yolov8n_{input_size}.hef" if input_size else "yolov8n.hef"
         possible_paths = [
-            "/workspace/yolov8n.hef",
-            "/home/cm5/yolo_models/yolov8n.hef",
-            "/usr/local/share/yolo/yolov8n.hef",
-            "/opt/yolo/yolov8n.hef",
-            "yolov8n.hef"  # Current directory
+            f"/workspace/{file_name}",
+            f"/home/cm5/yolo_models/{file_name}",
+            f"/usr/local/share/yolo/{file_name}",
+            f"/opt/yolo/{file_name}",
+            file_name  # Current directory
         ]
         
         for path in possible_paths:
@@ -158,14 +234,51 @@ class HailoYOLOProcessor:
         
         return None
     
-    def configure_model(self, network_name):
+    def load_resolution_variants(self):
+        """Load and configure HEF variants for each adaptive resolution"""
+        if self.resolution_controller is None:
+            return
+        
+        for size in self.resolution_controller.resolutions:
+            if size in self.model_variants:
+                continue
+            
+            hef_path = self.find_hef_file(size)
+            if not hef_path:
+                print(f"⚠️ No HEF variant for {size}x{size}")
+                continue
+            
+            try:
+                hef = HEF(hef_path)
+                configured_model = self.configure_model(hef.get_network_group_names()[0], hef)
+                if configured_model is not None:
+                    self.model_variants[size] = (hef, configured_model)
+                    print(f"✅ Loaded {size}x{size} model variant: {hef_path}")
+            except Exception as e:
+                print(f"❌ Failed to load {size}x{size} variant: {e}")
+        
+        self.resolution_controller.limit_to(self.model_variants)
+        self.set_input_resolution(self.resolution_controller.resolution)
+    
+    def set_input_resolution(self, size):
+        """Switch the active model variant"""
+        if size not in self.model_variants or size == self.input_shape[0]:
+            return
+        self.hef, self.configured_model = self.model_variants[size]
+        self.input_shape = (size, size)
+    
+    def configure_model(self, network_name, hef=None):
         """Configure the Hailo model for inference"""
         try:
             print(f"⚙️ Configuring model: {network_name}")
             
+            # Variants are configured without replacing the active model
+            is_variant = hef is not None
+            hef = hef or self.hef
+            
             # Configure input and output streams
-            input_infos = self.hef.get_input_vstream_infos(network_name)
-            output_infos = self.hef.get_output_vstream_infos(network_name)
+            input_infos = hef.get_input_vstream_infos(network_name)
+            output_infos = hef.get_output_vstream_infos(network_name)
             
             # Create input stream parameters
             input_params = InputVStreamParams()
@@ -178,15 +291,19 @@ class HailoYOLOProcessor:
             output_params.quantized = False
             
             # Configure model
-            self.configured_model = self.hef.create_configured_model(
+            configured_model = hef.create_configured_model(
                 [input_params], [output_params], network_name
             )
             
             print("✅ Model configured successfully")
-            self.model_loaded = True
+            if not is_variant:
+                self.configured_model = configured_model
+                self.model_loaded = True
+            return configured_model
             
         except Exception as e:
             print(f"❌ Failed to configure model: {e}")
+            return None
     
     def preprocess_frame(self, frame):
         """Preprocess frame for Hailo inference"""
@@ -274,8 +391,14 @@ class HailoYOLOProcessor:
                 print("⚠️ Model not loaded, skipping inference")
                 return []
             
+            # Crop to ROI bounding box before scaling
+            if self.roi is not None:
+                model_frame, roi_offset = self.roi.crop(frame)
+            else:
+                model_frame, roi_offset = frame, (0, 0)
+            
             # Preprocess frame
-            input_data = self.preprocess_frame(frame)
+            input_data = self.preprocess_frame(model_frame)
             if input_data is None:
                 return []
             
@@ -292,7 +415,11 @@ class HailoYOLOProcessor:
                 output_data = output_stream.read()
                 
                 # Postprocess
-                detections = self.postprocess_detections(output_data, frame.shape)
+                detections = self.postprocess_detections(output_data, model_frame.shape)
+                
+                # Map back to frame coordinates and drop detections outside ROI
+                if self.roi is not None:
+                    detections = self.roi.filter_detections(detections, roi_offset, frame.shape)
                 
                 return detections
                 
@@ -314,7 +441,10 @@ class HailoYOLOProcessor:
                 cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
                 
                 # Draw label
-                label = f"{class_name}: {confidence:.2f}"
+                if 'track_id' in detection:
+                    label = f"{class_name} #{detection['track_id']}: {confidence:.2f}"
+                else:
+                    label = f"{class_name}: {confidence:.2f}"
                 label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
                 
                 cv2.rectangle(frame, (x1, y1 - label_size[1] - 10), 
@@ -328,14 +458,52 @@ class HailoYOLOProcessor:
             print(f"❌ Drawing error: {e}")
             return frame
     
-    def process_frame(self, frame):
-        """Process a single frame with YOLO"""
+    def render_overlay(self, frame, metadata):
+        """Burn detections and status into a copy of the frame (only for overlay profiles)"""
+        detections = metadata.get('detections', [])
+        processed_frame = self.draw_detections(frame.copy(), detections)
+        if self.roi is not None:
+            self.roi.draw(processed_frame)
+        
+        # Add FPS text
+        cv2.putText(processed_frame, f"FPS: {self.current_fps:.1f}", 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        
+        # Add detection count
+        cv2.putText(processed_frame, f"Detections: {len(detections)}", 
+                   (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        
+        return processed_frame
+    
+    def should_run_model(self, jpeg_data):
+        """Run inference every Nth frame unless the scene is static; gated on the JPEG before decoding"""
+        run_model = self.frame_counter % self.inference_interval == 0
+        if run_model and self.motion_gate is not None:
+            # 1/8-scale grayscale decode, much cheaper than the full frame
+            run_model = self.motion_gate.should_infer(jpeg_data=jpeg_data)
+        return run_model
+    
+    def process_frame(self, frame, run_model=True):
+        """Process a single frame with YOLO, overlays are drawn later by the publisher"""
         try:
-            # Run inference
-            detections = self.run_inference(frame)
-            
-            # Draw detections
-            processed_frame = self.draw_detections(frame.copy(), detections)
+            if run_model:
+                inference_start = time.perf_counter()
+                detections = self.run_inference(frame)
+                inference_ms = (time.perf_counter() - inference_start) * 1000
+                self.inference_time_ms = 0.9 * self.inference_time_ms + 0.1 * inference_ms if self.inference_time_ms else inference_ms
+                if self.device_state is not None:
+                    self.device_state.record_inference(inference_ms)
+                self.metrics.record_inference(inference_ms / 1000)
+                if self.resolution_controller is not None:
+                    self.set_input_resolution(self.resolution_controller.observe(inference_ms, self.queue_depth))
+                if self.tracker is not None:
+                    detections = self.tracker.update(detections)
+                self.last_detections = detections
+            elif self.tracker is not None:
+                # Predict tracked boxes so output stays at full frame rate
+                detections = self.tracker.predict()
+            else:
+                detections = self.last_detections
             
             # Update FPS counter
             self.fps_counter += 1
@@ -343,25 +511,54 @@ class HailoYOLOProcessor:
                 self.current_fps = self.fps_counter
                 self.fps_counter = 0
                 self.fps_start_time = time.time()
+                self.metrics.update_utilization(self.fps_start_time)
+                
+                if self.motion_gate is not None:
+                    gate_stats = self.motion_gate.get_stats()
+                    print(f"🏃 Motion gate: {gate_stats['avg_gate_ms']:.2f} ms/frame vs inference "
+                          f"{self.inference_time_ms:.1f} ms, skipped {gate_stats['skip_ratio'] * 100:.0f}% of frames")
+                
+                if self.resolution_controller is not None:
+                    resolution_stats = self.resolution_controller.get_stats()
+                    print(f"📐 Input {resolution_stats['active_resolution']}px, "
+                          f"switches down {resolution_stats['switches_down']} / up {resolution_stats['switches_up']}")
+                
+                if self.recorder is not None:
+                    recorder_stats = self.recorder.get_stats()
+                    print(f"💾 Recorder: {recorder_stats['write_throughput_bps'] / 1024:.0f} KB/s, "
+                          f"backlog {recorder_stats['queue_backlog']}, dropped {recorder_stats['frames_dropped']}")
+                
+                if self.h264_restream is not None:
+                    h264_stats = self.h264_restream.get_stats()
+                    print(f"🎞️ H.264: encoder lag {h264_stats['encoder_lag_frames']} frames "
+                          f"({h264_stats['encoder_lag_ms']:.0f} ms), dropped {h264_stats['frames_dropped']}")
+                
+                if self.detection_events is not None:
+                    event_stats = self.detection_events.get_stats()
+                    print(f"📤 Events: {event_stats['exported']} exported, backlog {event_stats['backlog']}, "
+                          f"dropped {event_stats['dropped']}")
+                
+                if self.tracker is not None:
+                    tracker_stats = self.tracker.get_stats()
+                    print(f"🧭 Tracker: {tracker_stats['active_tracks']} tracks, "
+                          f"update {tracker_stats['avg_update_ms']:.2f} ms, predict {tracker_stats['avg_predict_ms']:.2f} ms, "
+                          f"ID switches {tracker_stats['id_switches']}")
             
-            # Add FPS text
-            cv2.putText(processed_frame, f"FPS: {self.current_fps:.1f}", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            # Add detection count
-            cv2.putText(processed_frame, f"Detections: {len(detections)}", 
-                       (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            return processed_frame, detections
+            return frame, detections
             
         except Exception as e:
             print(f"❌ Frame processing error: {e}")
             return frame, []
     
+    def get_latest_frame(self):
+        """Copy of the latest processed frame, None before the first one"""
+        with self.frame_lock:
+            return None if self.latest_processed_frame is None else self.latest_processed_frame.copy()
+    
     def start_udp_stream(self, port=None):
-    if port is None:
-        port = int(os.environ.get('UDP_PORT', 5000))
         """Start UDP stream listener"""
+        if port is None:
+            port = int(os.environ.get('UDP_PORT', 5000))
         try:
             print(f"🔌 Starting UDP stream listener on port {port}")
             
@@ -392,46 +589,70 @@ class HailoYOLOProcessor:
                 # Receive data
                 data, addr = self.udp_socket.recvfrom(self.buffer_size)
                 
-                # Parse MJPEG
-                self.mjpeg_buffer += data
-                
-                # Find frame boundaries
-                while True:
-                    start_marker = self.mjpeg_buffer.find(b'\xff\xd8')  # JPEG start
-                    end_marker = self.mjpeg_buffer.find(b'\xff\xd9')    # JPEG end
+                # Parse MJPEG: handle each complete frame in the buffer
+                for frame_data in self.reassembler.feed(data):
+                    if self.device_state is not None:
+                        self.device_state.record_frame()
+                    self.metrics.frames_received.inc()
+                    self.metrics.input_bytes.observe(len(frame_data))
+                    
+                    # Frames still waiting in the buffer (approximate backlog)
+                    self.queue_depth = len(self.reassembler.buffer) // len(frame_data) - 1
+                    
+                    # Static scene and nobody watching: the frame needs no full decode at all
+                    run_model = self.should_run_model(frame_data)
+                    if not run_model and not self.publisher.wants_frames():
+                        self.metrics.drop('static')
+                        self.frame_counter += 1
+                        continue
+                    
+                    # Decode frame; the buffer is reused for the next frame, so nothing may keep a
+                    # reference to it past this iteration (publishing is synchronous, the latest
+                    # frame is copied out)
+                    decode_start = time.perf_counter()
+                    frame = self.codec.decode(frame_data, dst=self.decode_buffer)
+                    self.metrics.decode_seconds.observe(time.perf_counter() - decode_start)
+                    if frame is not None and self.codec.backend == 'turbojpeg':
+                        self.decode_buffer = frame
                     
-                    if start_marker != -1 and end_marker != -1 and end_marker > start_marker:
-                        # Extract frame
-                        frame_data = self.mjpeg_buffer[start_marker:end_marker + 2]
+                    if frame is None:
+                        self.metrics.drop('decode_error')
+                    else:
+                        self.metrics.frames_decoded.inc()
                         
-                        # Decode frame
-                        frame_array = np.frombuffer(frame_data, dtype=np.uint8)
-                        frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
+                        # Process frame
+                        processed_frame, detections = self.process_frame(frame, run_model)
                         
-                        if frame is not None:
-                            # Process frame
-                            processed_frame, detections = self.process_frame(frame)
-                            
-                            # Save processed frame
-                            output_path = self.output_dir / f"frame_{self.frame_counter:06d}.jpg"
-                            cv2.imwrite(str(output_path), processed_frame)
-                            
-                            # Update latest frame
-                            with self.frame_lock:
-                                self.latest_processed_frame = processed_frame
-                            
-                            self.frame_counter += 1
-                            
-                            # Print detection info
-                            if detections:
-                                print(f"📸 Frame {self.frame_counter}: {len(detections)} detections")
-                                for det in detections[:3]:  # Show first 3
-                                    print(f"  - {det['class_name']}: {det['confidence']:.2f}")
+                        # Encode once per profile and fan out to all sinks;
+                        # overlays are rendered only if some sink wants them burned in
+                        publish_start = time.perf_counter()
+                        self.publisher.publish(processed_frame, self.frame_counter, {
+                            'frame_id': self.frame_counter,
+                            'fps': self.current_fps,
+                            'detections': detections
+                        })
+                        self.metrics.publish_seconds.observe(time.perf_counter() - publish_start)
+                        self.metrics.frames_published.inc()
                         
-                        # Remove processed data
-                        self.mjpeg_buffer = self.mjpeg_buffer[end_marker + 2:]
-                    else:
-                        break
+                        if detections and self.detection_events is not None:
+                            self.detection_events.submit(self.frame_counter, detections)
+                        
+                        # Update latest frame: a copy into its own buffer, since the decode
+                        # buffer behind processed_frame is overwritten by the next frame
+                        with self.frame_lock:
+                            if (self.latest_processed_frame is None
+                                    or self.latest_processed_frame.shape != processed_frame.shape):
+                                self.latest_processed_frame = processed_frame.copy()
+                            else:
+                                np.copyto(self.latest_processed_frame, processed_frame)
+                        
+                        self.frame_counter += 1
+                        
+                        # Print detection info
+                        if detections:
+                            print(f"📸 Frame {self.frame_counter}: {len(detections)} detections")
+                            for det in detections[:3]:  # Show first 3
+                                print(f"  - {det['class_name']}: {det['confidence']:.2f}")
                         
             except socket.timeout:
                 continue
@@ -447,6 +668,12 @@ class HailoYOLOProcessor:
         if self.udp_socket:
             self.udp_socket.close()
         
+        self.publisher.close()
+        if self.detection_events is not None:
+            self.detection_events.close()
+        if self.device_state is not None:
+            self.device_state.close()
+        
         print("✅ Processor stopped")
     
     def signal_handler(self, signum, frame):
@@ -0,0 +1,775 @@
+#!/usr/bin/env python3
+"""
+Shared batched YOLO inference engine
+Requests are queued per priority class (live > interactive > batch), each with its own queue
+limit and wait budget checked on admission. A small pool of workers coalesces whatever of the
+most urgent class arrives within a few milliseconds into one batch, letterboxes it, runs a
+single backend call and decodes each image's output with vectorized NMS. Only the backend call
+is serialized, through a gate that always admits the most urgent batch next; a less urgent
+batch still collecting or waiting for the gate is put back when more urgent work arrives, so
+preemption happens at batch boundaries. Preprocessing and decoding overlap with inference.
+
+Backends: Hailo (YOLOv8 HEF), OpenCV DNN (Darknet YOLOv3/v4) and a fake backend that
+produces YOLOv8-shaped output with a configurable latency, for tests and benchmarks.
+OpenCV, NumPy and the Hailo platform are imported on first use, so importing this module is cheap.
+"""
+
+import os
+import time
+import threading
+import importlib.util
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import counter, gauge, histogram
+from startup_profile import lazy_import
+
+cv2 = lazy_import('cv2', globals())
+np = lazy_import('numpy', globals(), 'np')
+
+# Probed without importing it; the platform is loaded when a HailoBackend is created
+HAILO_AVAILABLE = importlib.util.find_spec('hailo_platform') is not None
+
+# HAILO_MULTI_PROCESS=1 opens the accelerator through the HailoRT multi-process service (running
+# on the host), so the live processor and the web service share one device in one VDevice group
+HAILO_MULTI_PROCESS = os.environ.get('HAILO_MULTI_PROCESS', '0').lower() in ('1', 'true', 'yes')
+HAILO_VDEVICE_GROUP = os.environ.get('HAILO_VDEVICE_GROUP', 'SHARED')
+
+COCO_CLASSES = [
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+    'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
+    'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
+    'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake',
+    'chair', 'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop',
+    'mouse', 'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink',
+    'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+]
+
+MODEL_DIRECTORIES = ['/workspace', '/workspace/yolo_models', '/home/cm5/yolo_models',
+                     '/usr/local/share/yolo', '/usr/share/yolo', '/opt/yolo', '.']
+
+
+# Most urgent first: in-process live pipelines, interactive uploads, offline batch jobs
+PRIORITY_CLASSES = ('live', 'interactive', 'batch')
+
+QUEUE_SECONDS = histogram('yolo_inference_queue_seconds', 'Time requests wait before their backend call starts',
+                          ('priority',))
+SERVICE_SECONDS = histogram('yolo_inference_service_seconds', 'Backend call and decoding time per request',
+                            ('priority',))
+BATCH_SIZE = histogram('yolo_inference_batch_size', 'Requests per backend call', buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+REQUESTS_REJECTED = counter('yolo_inference_rejected_total', 'Requests refused by admission control',
+                            ('priority', 'reason'))
+QUEUE_DEPTH = gauge('yolo_inference_queue_depth', 'Requests waiting for a batch', ('priority',))
+PREEMPTIONS = counter('yolo_inference_preemptions_total',
+                      'Collected batches put back in the queue for more urgent requests', ('priority',))
+LIVE_DELAY = counter('yolo_inference_live_delay_seconds_total',
+                     'Time queued live requests spent waiting behind backend calls of each class', ('priority',))
+LIVE_LATENCY_ADDED = gauge('yolo_live_latency_added_ms',
+                           "Rise of the live pipeline's inference time while each class is running", ('priority',))
+
+LIVE_EWMA_ALPHA = 0.2
+IDLE_SHARE = 0.05       # Engine busy for less than this share of an interval counts as idle
+DOMINANT_SHARE = 0.2    # Minimum busy share for an interval to be attributed to one class
+
+
+class EngineBusy(Exception):
+    """Raised when a request is not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(EngineBusy):
+    """The request's priority class has reached its queue limit"""
+
+
+class Overloaded(EngineBusy):
+    """The estimated wait is beyond the priority class's latency budget"""
+
+
+def find_model_file(file_names):
+    """First existing file among the common model directories"""
+    for directory in MODEL_DIRECTORIES:
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def letterbox(image, size, pad_value=114):
+    """Resize keeping aspect ratio and pad to size x size; returns (image, scale, (pad_x, pad_y))"""
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    padded = cv2.copyMakeBorder(image, pad_y, size - new_height - pad_y, pad_x, size - new_width - pad_x,
+                                cv2.BORDER_CONSTANT, value=(pad_value, pad_value, pad_value))
+    return padded, scale, (pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression over xyxy boxes, returns kept indices by descending score"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        width = np.maximum(0.0, np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]))
+        height = np.maximum(0.0, np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]))
+        intersection = width * height
+        iou = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_predictions(predictions, confidence, iou_threshold, image_shape, scale, pad,
+                       classes=COCO_CLASSES, max_detections=100):
+    """Detections from one image's (candidates, 4 + classes) array of cx, cy, w, h (input pixels) + class scores"""
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+    mask = scores > confidence
+    if not mask.any():
+        return []
+    boxes, scores, class_ids = predictions[mask, :4], scores[mask], class_ids[mask]
+
+    # Center format to corners, then undo the letterbox
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:4] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:4] / 2
+    xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / scale
+    xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / scale
+    height, width = image_shape[:2]
+    xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, width - 1)
+    xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, height - 1)
+
+    # Class-aware NMS in one pass: boxes of different classes are shifted apart
+    offsets = class_ids[:, None] * float(max(width, height) + 1)
+    keep = nms(xyxy + offsets, scores, iou_threshold)[:max_detections]
+
+    detections = []
+    for index in keep:
+        class_id = int(class_ids[index])
+        detections.append({
+            'bbox': [int(v) for v in xyxy[index]],
+            'confidence': float(scores[index]),
+            'class_id': class_id,
+            'class_name': classes[class_id] if class_id < len(classes) else f'Class {class_id}'
+        })
+    return detections
+
+
+def create_vdevice():
+    """Open the Hailo VDevice, through the multi-process service when HAILO_MULTI_PROCESS is set"""
+    from hailo_platform.pyhailort import pyhailort
+    if not HAILO_MULTI_PROCESS:
+        return pyhailort.VDevice()
+    params = pyhailort.VDevice.create_params()
+    params.scheduling_algorithm = pyhailort.HailoSchedulingAlgorithm.ROUND_ROBIN
+    params.multi_process_service = True
+    params.group_id = HAILO_VDEVICE_GROUP
+    return pyhailort.VDevice(params)
+
+
+class InferenceBackend(ABC):
+    """Runs one batch of letterboxed BGR images; infer() is never called concurrently"""
+    name = 'backend'
+    model_id = 'backend'
+    input_size = 640
+    simulated = False   # True when detections do not come from a real model
+
+    @abstractmethod
+    def infer(self, images):
+        """List of (candidates, 4 + classes) prediction arrays, one per image"""
+
+    def close(self):
+        pass
+
+
+class HailoBackend(InferenceBackend):
+    name = 'hailo'
+
+    def __init__(self, hef_path, input_size=640):
+        self.hef_path = hef_path
+        self.input_size = input_size
+        self.model_id = f"hailo:{os.path.basename(hef_path)}"
+        from hailo_platform.pyhailort import pyhailort
+        self.vdevice = create_vdevice()
+        self.hef = pyhailort.HEF(hef_path)
+        network_name = self.hef.get_network_group_names()[0]
+
+        input_params = pyhailort.InputVStreamParams()
+        input_params.format = pyhailort.HAILO_FORMAT_TYPE_UINT8
+        input_params.quantized = False
+        output_params = pyhailort.OutputVStreamParams()
+        output_params.format = pyhailort.HAILO_FORMAT_TYPE_FLOAT32
+        output_params.quantized = False
+        self.configured_model = self.hef.create_configured_model([input_params], [output_params], network_name)
+
+    def infer(self, images):
+        # One write of the whole uint8 RGB NHWC batch (the HEF normalizes on device),
+        # YOLOv8 output is (batch, 84, 8400)
+        batch = np.stack([cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images])
+        with self.configured_model.create_infer_model() as infer_model:
+            input_stream = infer_model.create_input_stream()
+            output_stream = infer_model.create_output_stream()
+            input_stream.write(batch)
+            output = np.asarray(output_stream.read())
+        if output.ndim == 2:
+            output = output[None]
+        return [output[i].T for i in range(len(images))]
+
+
+class OpenCVBackend(InferenceBackend):
+    name = 'opencv'
+
+    def __init__(self, config_path, weights_path, input_size=416):
+        self.input_size = input_size
+        self.model_id = f"opencv:{os.path.basename(weights_path)}"
+        self.net = cv2.dnn.readNet(weights_path, config_path)
+        self.output_layers = self.net.getUnconnectedOutLayersNames()
+
+    def infer(self, images):
+        blob = cv2.dnn.blobFromImages(images, 1 / 255.0, (self.input_size, self.input_size), swapRB=True, crop=False)
+        self.net.setInput(blob)
+        outputs = self.net.forward(self.output_layers)
+
+        # Darknet rows: normalized cx, cy, w, h, objectness, class scores
+        per_image = [[] for _ in images]
+        for output in outputs:
+            output = output.reshape(len(images), -1, output.shape[-1])
+            for i in range(len(images)):
+                rows = output[i]
+                predictions = np.empty((len(rows), rows.shape[1] - 1), dtype=np.float32)
+                predictions[:, :4] = rows[:, :4] * self.input_size
+                predictions[:, 4:] = rows[:, 5:] * rows[:, 4:5]
+                per_image[i].append(predictions)
+        return [np.concatenate(parts) for parts in per_image]
+
+
+class FakeBackend(InferenceBackend):
+    """YOLOv8-shaped output without an accelerator
+
+    Each image gets `objects` deterministic objects (seeded by image content), each reported
+    by a cluster of overlapping candidates so NMS does real work. The call sleeps
+    batch_ms + image_ms per image to emulate an NPU.
+    """
+    name = 'fake'
+    simulated = True
+
+    def __init__(self, objects=3, batch_ms=8.0, image_ms=2.0, input_size=640, candidates=8400,
+                 model_id='fake:yolov8n'):
+        self.objects = objects
+        self.batch_ms = batch_ms
+        self.image_ms = image_ms
+        self.input_size = input_size
+        self.candidates = candidates
+        self.model_id = model_id
+
+    def infer(self, images):
+        start_time = time.perf_counter()
+        outputs = [self.fake_predictions(image) for image in images]
+        remaining = (self.batch_ms + self.image_ms * len(images)) / 1000 - (time.perf_counter() - start_time)
+        if remaining > 0:
+            time.sleep(remaining)
+        return outputs
+
+    def fake_predictions(self, image):
+        predictions = np.zeros((self.candidates, 4 + len(COCO_CLASSES)), dtype=np.float32)
+        if not self.objects:
+            return predictions
+        rng = np.random.default_rng(int(image[::16, ::16].sum()))
+        size = self.input_size
+        for obj in range(self.objects):
+            center = rng.uniform(0.2, 0.8, 2) * size
+            box_size = rng.uniform(0.1, 0.3, 2) * size
+            class_id = rng.integers(len(COCO_CLASSES))
+            rows = slice(obj * 20, obj * 20 + 20)
+            predictions[rows, :2] = center + rng.normal(0, 3, (20, 2))
+            predictions[rows, 2:4] = box_size + rng.normal(0, 3, (20, 2))
+            predictions[rows, 4 + class_id] = rng.uniform(0.55, 0.95, 20)
+        return predictions
+
+
+class InferenceRequest:
+    __slots__ = ('image', 'confidence', 'iou_threshold', 'priority', 'future', 'submit_time', 'prepared')
+
+    def __init__(self, image, confidence, iou_threshold, priority):
+        self.image = image
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self.priority = priority
+        self.future = Future()
+        self.submit_time = time.perf_counter()
+        self.prepared = None    # Letterboxed image, kept when the batch is preempted
+
+
+class PriorityGate:
+    """Exclusive backend access, granted to the most urgent waiting batch
+
+    Batches register when they are collected, so a more urgent batch still being preprocessed
+    already holds back less urgent ones. While live_active() reports a live pipeline in another
+    process sharing the accelerator, batch-class calls are spaced to batch_duty of device time.
+    """
+
+    def __init__(self, batch_duty=0.5, live_active=None):
+        self.condition = threading.Condition()
+        self.waiting = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.holder = None
+        self.batch_duty = batch_duty
+        self.live_active = live_active
+        self.batch_ready = 0.0      # perf_counter before which the next batch-class call waits
+
+    def register(self, priority):
+        with self.condition:
+            self.waiting[priority] += 1
+
+    def withdraw(self, priority):
+        """Drop a registration that will not be followed by acquire()"""
+        with self.condition:
+            self.waiting[priority] -= 1
+            self.condition.notify_all()
+
+    def acquire(self, priority, preempted=None):
+        """Wait for the backend (priority must be registered); False if preempted() turned true meanwhile"""
+        rank = PRIORITY_CLASSES.index(priority)
+        with self.condition:
+            try:
+                while True:
+                    if preempted is not None and preempted():
+                        return False
+                    if self.holder is None and not any(self.waiting[name] for name in PRIORITY_CLASSES[:rank]):
+                        delay = self.batch_ready - time.perf_counter() if priority == 'batch' else 0.0
+                        if delay <= 0:
+                            self.holder = priority
+                            return True
+                        self.condition.wait(delay)
+                    else:
+                        self.condition.wait()
+            finally:
+                self.waiting[priority] -= 1
+
+    def release(self, priority, seconds):
+        with self.condition:
+            self.holder = None
+            if (priority == 'batch' and 0 < self.batch_duty < 1 and self.live_active is not None
+                    and self.live_active()):
+                self.batch_ready = time.perf_counter() + seconds * (1 - self.batch_duty) / self.batch_duty
+            self.condition.notify_all()
+
+    def notify(self):
+        """Wake waiters to re-check preemption"""
+        with self.condition:
+            self.condition.notify_all()
+
+
+class InferenceEngine:
+    def __init__(self, backend, max_batch=4, max_wait_ms=5.0, workers=2, queue_size=32, queue_limits=None,
+                 budgets_ms=None, batch_duty=0.5, live_active=None):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        # Live frames go stale quickly, so their queue is short; None budget = no wait limit
+        self.queue_limits = dict({'live': max_batch * 2, 'interactive': queue_size, 'batch': queue_size},
+                                 **(queue_limits or {}))
+        self.budgets = {name: (ms / 1000 if ms else None) for name, ms in
+                        dict({'live': 100.0, 'interactive': 2000.0, 'batch': None}, **(budgets_ms or {})).items()}
+        self.pending = {name: deque() for name in PRIORITY_CLASSES}
+        self.condition = threading.Condition()
+        self.gate = PriorityGate(batch_duty, live_active)  # Device calls are serialized, pre/postprocessing is not
+        self.stats_lock = threading.Lock()
+        self.worker_threads = []
+        self.running = False
+
+        # Statistics
+        self.submitted = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.completed = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.rejected = {name: {'queue_full': 0, 'overloaded': 0} for name in PRIORITY_CLASSES}
+        self.preempted = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.failed = 0
+        self.batches = 0
+        self.batch_sizes = {}
+        self.queue_times = {name: deque(maxlen=1000) for name in PRIORITY_CLASSES}  # Submit to backend call, s
+        self.service_times = deque(maxlen=1000)     # Backend call to result, seconds
+        self.backend_times = deque(maxlen=200)      # Backend call per batch, seconds
+        self.batch_seconds = None                   # Moving average of the backend call, for wait estimates
+        self.warmup_ms = None
+
+        # Live latency attribution
+        self.live_delay = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+        self.busy_seconds = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+        self.observed_at = time.perf_counter()
+        self.live_baseline_ms = None
+        self.live_ms_by_class = dict.fromkeys(PRIORITY_CLASSES)
+        for name in PRIORITY_CLASSES:
+            QUEUE_DEPTH.labels(name).set_function(self.pending[name].__len__)
+            LIVE_LATENCY_ADDED.labels(name).set_function(lambda name=name: self.live_latency_added(name) or 0.0)
+
+    @property
+    def model_id(self):
+        return self.backend.model_id
+
+    def start(self, warmup=True):
+        """Warm up the backend with a full batch and start the worker pool"""
+        if self.running:
+            return self
+        if warmup:
+            start_time = time.perf_counter()
+            size = self.backend.input_size
+            self.backend.infer([np.full((size, size, 3), 114, np.uint8)] * self.max_batch)
+            self.warmup_ms = (time.perf_counter() - start_time) * 1000
+        self.running = True
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.worker_loop, name=f"inference-{index}", daemon=True)
+            thread.start()
+            self.worker_threads.append(thread)
+        return self
+
+    def estimate_wait(self, priority):
+        """Seconds until a new request of this class would reach the backend (condition held)"""
+        if not self.batch_seconds:
+            return 0.0
+        rank = PRIORITY_CLASSES.index(priority)
+        ahead = sum(len(self.pending[name]) for name in PRIORITY_CLASSES[:rank + 1])
+        # Whole batches ahead, plus the call that may be running
+        return (ahead // self.max_batch + 1) * self.batch_seconds
+
+    def submit(self, image, confidence=0.5, iou_threshold=0.4, priority='interactive'):
+        """Queue a BGR image in a priority class, returns a Future resolving to its detections
+
+        Raises QueueFull when the class's queue is at its limit and Overloaded when the estimated
+        wait exceeds the class's budget; both are EngineBusy with a retry_after hint.
+        """
+        request = InferenceRequest(image, confidence, iou_threshold, priority)
+        with self.condition:
+            pending = self.pending[priority]
+            wait = self.estimate_wait(priority)
+            retry_after = max(1, int(wait * 2 + 0.999))
+            budget = self.budgets[priority]
+            if len(pending) >= self.queue_limits[priority]:
+                reason = 'queue_full'
+                error = QueueFull(f"{priority} queue full ({len(pending)} pending)", retry_after)
+            elif budget is not None and wait > budget:
+                reason = 'overloaded'
+                error = Overloaded(f"estimated wait {wait * 1000:.0f} ms exceeds the {priority} budget "
+                                   f"of {budget * 1000:.0f} ms", retry_after)
+            else:
+                pending.append(request)
+                self.condition.notify_all()
+                error = None
+        if error is not None:
+            with self.stats_lock:
+                self.rejected[priority][reason] += 1
+            REQUESTS_REJECTED.labels(priority, reason).inc()
+            raise error
+        if priority != PRIORITY_CLASSES[-1]:
+            self.gate.notify()
+        with self.stats_lock:
+            self.submitted[priority] += 1
+        return request.future
+
+    def infer(self, image, confidence=0.5, iou_threshold=0.4, timeout=10.0, priority='interactive'):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(image, confidence, iou_threshold, priority).result(timeout)
+
+    def most_urgent(self):
+        """Highest-priority class with queued requests, None when all are empty"""
+        for name in PRIORITY_CLASSES:
+            if self.pending[name]:
+                return name
+        return None
+
+    def outranked(self, priority):
+        """Whether requests more urgent than priority are queued"""
+        return any(self.pending[name] for name in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority)])
+
+    def preempt(self, priority, batch):
+        """Put a collected batch back at the front of its queue (condition held)"""
+        self.pending[priority].extendleft(reversed(batch))
+        with self.stats_lock:
+            self.preempted[priority] += 1
+        PREEMPTIONS.labels(priority).inc()
+
+    def collect_batch(self):
+        """Requests of the most urgent waiting class plus what else of it arrives within max_wait
+
+        A more urgent request arriving meanwhile preempts the batch being collected, which goes
+        back to the front of its queue. Returns (priority, batch), batch empty when idle.
+        """
+        with self.condition:
+            priority = self.most_urgent()
+            if priority is None:
+                self.condition.wait(1.0)
+                priority = self.most_urgent()
+                if priority is None:
+                    return None, []
+            batch = [self.pending[priority].popleft()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                if self.outranked(priority):
+                    self.preempt(priority, batch)
+                    priority = self.most_urgent()
+                    batch = [self.pending[priority].popleft()]
+                    deadline = time.perf_counter() + self.max_wait
+                elif self.pending[priority]:
+                    batch.append(self.pending[priority].popleft())
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            self.gate.register(priority)
+            return priority, batch
+
+    def worker_loop(self):
+        while self.running:
+            priority, batch = self.collect_batch()
+            if batch:
+                self.run_batch(priority, batch)
+
+    def run_batch(self, priority, batch):
+        try:
+            for request in batch:
+                if request.prepared is None:
+                    request.prepared = letterbox(request.image, self.backend.input_size)
+        except Exception as e:
+            self.gate.withdraw(priority)
+            self.fail_batch(batch, e)
+            return
+
+        # Preemption at the batch boundary: more urgent requests queued while this batch waited go first
+        if not self.gate.acquire(priority, lambda: self.outranked(priority)):
+            with self.condition:
+                self.preempt(priority, batch)
+                self.condition.notify_all()
+            return
+        backend_start = time.perf_counter()
+        try:
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                return
+            outputs = self.backend.infer([request.prepared[0] for request in batch])
+        except Exception as e:
+            self.fail_batch(batch, e)
+            return
+        finally:
+            backend_time = time.perf_counter() - backend_start
+            self.gate.release(priority, backend_time)
+        self.record_live_delay(priority, backend_start, backend_time)
+
+        for request, predictions in zip(batch, outputs):
+            _, scale, pad = request.prepared
+            try:
+                request.future.set_result(decode_predictions(predictions, request.confidence, request.iou_threshold,
+                                                             request.image.shape, scale, pad))
+            except Exception as e:
+                request.future.set_exception(e)
+
+        end_time = time.perf_counter()
+        queue_seconds = QUEUE_SECONDS.labels(priority)
+        service_seconds = SERVICE_SECONDS.labels(priority)
+        with self.stats_lock:
+            self.batches += 1
+            self.completed[priority] += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            self.backend_times.append(backend_time)
+            self.busy_seconds[priority] += backend_time
+            self.batch_seconds = (backend_time if self.batch_seconds is None
+                                  else 0.9 * self.batch_seconds + 0.1 * backend_time)
+            for request in batch:
+                self.queue_times[priority].append(backend_start - request.submit_time)
+                self.service_times.append(end_time - backend_start)
+        BATCH_SIZE.observe(len(batch))
+        for request in batch:
+            queue_seconds.observe(backend_start - request.submit_time)
+            service_seconds.observe(end_time - backend_start)
+
+    def fail_batch(self, batch, error):
+        with self.stats_lock:
+            self.failed += len(batch)
+        for request in batch:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def record_live_delay(self, priority, backend_start, backend_time):
+        """Charge the part of a backend call that queued live requests waited through to its class"""
+        if priority == 'live':
+            return
+        live = self.pending['live']
+        try:
+            waiting_since = live[0].submit_time if live else None
+        except IndexError:
+            waiting_since = None
+        if waiting_since is None and self.gate.waiting['live']:
+            waiting_since = backend_start
+        if waiting_since is None:
+            return
+        delay = min(backend_time, backend_start + backend_time - waiting_since)
+        with self.stats_lock:
+            self.live_delay[priority] += delay
+        LIVE_DELAY.labels(priority).inc(delay)
+
+    def observe_live_latency(self, live_ms):
+        """Attribute changes of an out-of-process live pipeline's inference time to the classes running
+
+        Called about once a second with the live pipeline's current inference time: intervals in
+        which the engine was idle update the baseline, intervals dominated by one class update that
+        class's average, and the difference is the live latency the class adds.
+        """
+        now = time.perf_counter()
+        with self.stats_lock:
+            interval = now - self.observed_at
+            shares = {name: seconds / interval for name, seconds in self.busy_seconds.items()} if interval > 0 else {}
+            self.observed_at = now
+            self.busy_seconds = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+            if not shares or not live_ms:
+                return
+
+            def blend(previous):
+                return live_ms if previous is None else previous + LIVE_EWMA_ALPHA * (live_ms - previous)
+
+            if sum(shares.values()) < IDLE_SHARE:
+                self.live_baseline_ms = blend(self.live_baseline_ms)
+            else:
+                dominant = max(shares, key=shares.get)
+                if shares[dominant] >= DOMINANT_SHARE:
+                    self.live_ms_by_class[dominant] = blend(self.live_ms_by_class[dominant])
+
+    def live_latency_added(self, priority):
+        """Milliseconds the class adds to live inference, None until both sides were observed"""
+        class_ms = self.live_ms_by_class[priority]
+        if class_ms is None or self.live_baseline_ms is None:
+            return None
+        return max(0.0, class_ms - self.live_baseline_ms)
+
+    def stop(self):
+        self.running = False
+        for thread in self.worker_threads:
+            thread.join(timeout=2.0)
+        self.worker_threads = []
+        self.backend.close()
+
+    def get_stats(self):
+        """Get engine statistics; times in milliseconds"""
+        def summary(values):
+            if not values:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+            values = np.asarray(values) * 1000
+            return {"avg": float(values.mean()), "p50": float(np.percentile(values, 50)),
+                    "p95": float(np.percentile(values, 95))}
+
+        with self.stats_lock:
+            completed = sum(self.completed.values())
+            classes = {
+                name: {
+                    "queue_depth": len(self.pending[name]),
+                    "queue_limit": self.queue_limits[name],
+                    "budget_ms": self.budgets[name] * 1000 if self.budgets[name] else None,
+                    "submitted": self.submitted[name],
+                    "completed": self.completed[name],
+                    "rejected": dict(self.rejected[name]),
+                    "preempted": self.preempted[name],
+                    "queue_ms": summary(self.queue_times[name]),
+                    "live_delay_ms": round(self.live_delay[name] * 1000, 1),
+                    "live_latency_added_ms": self.live_latency_added(name)
+                }
+                for name in PRIORITY_CLASSES
+            }
+            return {
+                "backend": self.backend.name,
+                "model": self.backend.model_id,
+                "workers": self.workers,
+                "max_batch": self.max_batch,
+                "queue_depth": sum(len(pending) for pending in self.pending.values()),
+                "queue_capacity": sum(self.queue_limits.values()),
+                "submitted": sum(self.submitted.values()),
+                "completed": completed,
+                "rejected": sum(sum(reasons.values()) for reasons in self.rejected.values()),
+                "failed": self.failed,
+                "batches": self.batches,
+                "avg_batch_size": completed / max(1, self.batches),
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "queue_ms": summary([value for times in self.queue_times.values() for value in times]),
+                "service_ms": summary(self.service_times),
+                "backend_ms": summary(self.backend_times),
+                "batch_duty": self.gate.batch_duty,
+                "live_baseline_ms": self.live_baseline_ms,
+                "classes": classes,
+                "warmup_ms": self.warmup_ms
+            }
+
+
+def create_backend(kind='auto'):
+    """Backend from INFERENCE_BACKEND=auto|hailo|opencv|fake; auto falls back to a detection-free simulation"""
+    if kind in ('auto', 'hailo') and HAILO_AVAILABLE:
+        hef_path = os.environ.get('INFERENCE_MODEL') or find_model_file(['yolov8n.hef'])
+        if hef_path:
+            try:
+                return HailoBackend(hef_path)
+            except Exception as e:
+                print(f"❌ Failed to load Hailo model {hef_path}: {e}")
+                if not HAILO_MULTI_PROCESS:
+                    print("   The device may be held by the live processor; run the HailoRT service "
+                          "and set HAILO_MULTI_PROCESS=1 in both containers")
+
+    if kind in ('auto', 'opencv'):
+        for name in ('yolov4', 'yolov3'):
+            config_path = find_model_file([f'{name}.cfg'])
+            weights_path = config_path and config_path.replace('.cfg', '.weights')
+            if weights_path and os.path.exists(weights_path):
+                try:
+                    return OpenCVBackend(config_path, weights_path)
+                except Exception as e:
+                    print(f"❌ Failed to load OpenCV model {weights_path}: {e}")
+
+    if kind == 'fake':
+        return FakeBackend(objects=int(os.environ.get('FAKE_INFERENCE_OBJECTS', 3)),
+                           batch_ms=float(os.environ.get('FAKE_INFERENCE_BATCH_MS', 8.0)),
+                           image_ms=float(os.environ.get('FAKE_INFERENCE_IMAGE_MS', 2.0)))
+    if kind == 'auto':
+        print("⚠️ No Hailo or OpenCV model found, inference is SIMULATED and returns no detections "
+              "(mount the models and set INFERENCE_BACKEND)")
+    else:
+        print(f"⚠️ Inference backend '{kind}' unavailable, inference is SIMULATED and returns no detections")
+    return FakeBackend(objects=0, batch_ms=0.0, image_ms=0.0, model_id='simulation')
+
+
+def create_inference_engine(live_active=None):
+    """Create and warm up the shared engine from INFERENCE_* environment settings
+
+    live_active() tells whether a live pipeline in another process is running; it throttles batch
+    work only when that pipeline shares the accelerator (INFERENCE_LIVE_SHARED=auto: Hailo backend).
+    """
+    backend = create_backend(os.environ.get('INFERENCE_BACKEND', 'auto').lower())
+    shared = os.environ.get('INFERENCE_LIVE_SHARED', 'auto').lower()
+    if shared in ('0', 'false', 'no') or (shared == 'auto' and backend.name != 'hailo'):
+        live_active = None
+    queue_size = int(os.environ.get('INFERENCE_QUEUE', 32))
+    engine = InferenceEngine(
+        backend,
+        max_batch=int(os.environ.get('INFERENCE_BATCH', 4)),
+        max_wait_ms=float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 5.0)),
+        workers=int(os.environ.get('INFERENCE_WORKERS', 2)),
+        queue_size=queue_size,
+        queue_limits={name: int(os.environ[f'INFERENCE_QUEUE_{name.upper()}']) for name in PRIORITY_CLASSES
+                      if os.environ.get(f'INFERENCE_QUEUE_{name.upper()}')},
+        budgets_ms={name: float(os.environ[f'INFERENCE_BUDGET_{name.upper()}_MS']) for name in PRIORITY_CLASSES
+                    if os.environ.get(f'INFERENCE_BUDGET_{name.upper()}_MS')},
+        batch_duty=float(os.environ.get('INFERENCE_BATCH_DUTY', 0.5)),
+        live_active=live_active
+    ).start()
+    print(f"🧠 Inference engine: {backend.model_id}, batch {engine.max_batch}, {engine.workers} workers, "
+          f"warm-up {engine.warmup_ms:.0f} ms" + (", batch work yields to the live pipeline" if live_active else ""))
+    return engine
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+JPEG codec layer with libjpeg-turbo acceleration
+Uses TurboJPEG directly when PyTurboJPEG and libturbojpeg are available and falls back to
+OpenCV otherwise. Supports decoding into a preallocated buffer, scaled (DCT-domain) decode,
+grayscale and YUV-plane output, and encoding with quality, chroma subsampling and fast DCT.
+
+Benchmark against plain cv2.imdecode/cv2.imencode:
+    python3 jpeg_codec.py [image.jpg] [iterations]
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import (TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_444, TJSAMP_422, TJSAMP_420,
+                           TJSAMP_GRAY, TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE)
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+SUBSAMPLING_MODES = ('444', '422', '420', 'gray')
+SCALE_FACTORS = (1, 2, 4, 8)
+
+# OpenCV equivalents for scaled decode
+OPENCV_REDUCED_COLOR = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                        4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+OPENCV_REDUCED_GRAY = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                       4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+class JpegCodec:
+    def __init__(self, backend='auto'):
+        self.turbo = None
+        if backend in ('auto', 'turbojpeg') and TURBOJPEG_AVAILABLE:
+            try:
+                self.turbo = TurboJPEG()
+            except Exception as e:
+                # PyTurboJPEG installed but libturbojpeg missing
+                if backend == 'turbojpeg':
+                    print(f"⚠️ TurboJPEG unavailable, using OpenCV: {e}")
+        elif backend == 'turbojpeg':
+            print("⚠️ PyTurboJPEG not installed, using OpenCV")
+        self.backend = 'turbojpeg' if self.turbo is not None else 'opencv'
+
+        if self.turbo is not None:
+            self.turbo_subsampling = {'444': TJSAMP_444, '422': TJSAMP_422,
+                                      '420': TJSAMP_420, 'gray': TJSAMP_GRAY}
+        self.opencv_subsampling = {}
+        if hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR'):
+            self.opencv_subsampling = {'444': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+                                       '422': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+                                       '420': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420}
+
+    def decode(self, jpeg_data, scale=1, grayscale=False, dst=None, fast=False):
+        """Decode to BGR (or grayscale), optionally downscaled by 1/scale during decode
+
+        dst: preallocated array to decode into (avoids a per-frame allocation); a new array is
+        returned instead when its shape does not match the image, so keep the result as the next dst.
+        fast: allow faster, slightly less accurate IDCT and upsampling.
+        Returns the image array, or None if the data is not a valid JPEG.
+        """
+        if scale not in SCALE_FACTORS:
+            raise ValueError(f"Unsupported decode scale 1/{scale}")
+
+        if self.turbo is not None:
+            try:
+                flags = TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE if fast else 0
+                # TurboJPEG decodes grayscale as (h, w, 1); return (h, w) like OpenCV
+                turbo_dst = dst[:, :, np.newaxis] if grayscale and dst is not None and dst.ndim == 2 else dst
+                image = self.turbo.decode(jpeg_data, pixel_format=TJPF_GRAY if grayscale else TJPF_BGR,
+                                          scaling_factor=(1, scale) if scale > 1 else None,
+                                          flags=flags, dst=turbo_dst)
+                return image[:, :, 0] if grayscale and image.ndim == 3 else image
+            except ValueError:
+                if dst is not None:
+                    return self.decode(jpeg_data, scale, grayscale, None, fast)
+                return None
+            except OSError:
+                return None
+
+        jpeg_array = np.frombuffer(jpeg_data, dtype=np.uint8)
+        mode = (OPENCV_REDUCED_GRAY if grayscale else OPENCV_REDUCED_COLOR)[scale]
+        image = cv2.imdecode(jpeg_array, mode)
+        if image is None or dst is None or dst.shape != image.shape:
+            return image
+        np.copyto(dst, image)
+        return dst
+
+    def decode_yuv(self, jpeg_data, scale=1):
+        """Decode to separate Y, U, V planes without color conversion where possible
+
+        The Y plane alone is enough for luma-only consumers (motion detection);
+        chroma plane sizes follow the source subsampling with TurboJPEG and are 4:2:0 with OpenCV.
+        """
+        if scale not in SCALE_FACTORS:
+            raise ValueError(f"Unsupported decode scale 1/{scale}")
+
+        if self.turbo is not None:
+            try:
+                return self.turbo.decode_to_yuv_planes(jpeg_data, scaling_factor=(1, scale) if scale > 1 else None)
+            except (OSError, ValueError):
+                return None
+
+        image = self.decode(jpeg_data, scale=scale)
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        # I420 needs even dimensions
+        image = image[:height - height % 2, :width - width % 2]
+        height, width = image.shape[:2]
+        i420 = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420)
+        y = i420[:height]
+        chroma = i420[height:].reshape(2, height // 2, width // 2)
+        return [y, chroma[0], chroma[1]]
+
+    def encode(self, frame, quality=85, subsampling='420', fast_dct=False):
+        """Encode a BGR (or grayscale) frame, returns a buffer usable as bytes or None on failure"""
+        if subsampling not in SUBSAMPLING_MODES:
+            raise ValueError(f"Unsupported chroma subsampling '{subsampling}'")
+
+        if self.turbo is not None:
+            pixel_format = TJPF_GRAY if frame.ndim == 2 else TJPF_BGR
+            try:
+                return self.turbo.encode(frame, quality=quality, pixel_format=pixel_format,
+                                         jpeg_subsample=self.turbo_subsampling['gray' if frame.ndim == 2 else subsampling],
+                                         flags=TJFLAG_FASTDCT if fast_dct else 0)
+            except (OSError, ValueError):
+                return None
+
+        # OpenCV has no fast DCT switch; grayscale is handled by encoding a single channel
+        if subsampling == 'gray' and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if subsampling in self.opencv_subsampling:
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self.opencv_subsampling[subsampling]]
+        success, encoded = cv2.imencode('.jpg', frame, params)
+        return encoded if success else None
+
+
+_codec = None
+
+
+def get_codec():
+    """Process-wide codec selected by JPEG_CODEC=auto|turbojpeg|opencv"""
+    global _codec
+    if _codec is None:
+        _codec = JpegCodec(os.environ.get('JPEG_CODEC', 'auto').lower())
+        print(f"🖼️ JPEG codec: {_codec.backend}")
+    return _codec
+
+
+def benchmark(image_path='test_image.jpg', iterations=200):
+    """Compare the codec against the plain OpenCV calls used by the processors"""
+    with open(image_path, 'rb') as f:
+        jpeg_data = f.read()
+
+    codec = get_codec()
+    frame = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        print(f"❌ Failed to decode {image_path}")
+        return None
+    dst = np.empty_like(frame)
+
+    cases = [
+        ("cv2.imdecode (baseline)", lambda: cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_COLOR)),
+        ("decode", lambda: codec.decode(jpeg_data)),
+        ("decode into buffer", lambda: codec.decode(jpeg_data, dst=dst)),
+        ("decode fast", lambda: codec.decode(jpeg_data, fast=True)),
+        ("decode 1/2", lambda: codec.decode(jpeg_data, scale=2)),
+        ("decode 1/4", lambda: codec.decode(jpeg_data, scale=4)),
+        ("decode gray 1/8", lambda: codec.decode(jpeg_data, scale=8, grayscale=True)),
+        ("decode YUV planes", lambda: codec.decode_yuv(jpeg_data)),
+        ("cv2.imencode q85 (baseline)", lambda: cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1]),
+        ("encode q85 4:2:0", lambda: codec.encode(frame, 85, '420')),
+        ("encode q85 4:2:0 fast DCT", lambda: codec.encode(frame, 85, '420', fast_dct=True)),
+        ("encode q70 4:2:0 fast DCT", lambda: codec.encode(frame, 70, '420', fast_dct=True)),
+        ("encode q85 4:4:4", lambda: codec.encode(frame, 85, '444')),
+    ]
+
+    print(f"🖼️ {image_path}: {frame.shape[1]}x{frame.shape[0]}, {len(jpeg_data)} bytes, "
+          f"backend {codec.backend}, {iterations} iterations")
+    results = {}
+    for name, function in cases:
+        output = function()  # Warm-up
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        elapsed_ms = (time.perf_counter() - start_time) * 1000 / iterations
+        size = f"{len(output)} bytes" if isinstance(output, (bytes, np.ndarray)) and getattr(output, 'ndim', 1) == 1 else ""
+        results[name] = elapsed_ms
+        print(f"  {name:<30} {elapsed_ms:7.2f} ms  {size}")
+
+    print(f"📊 Decode speedup vs baseline: {results['cv2.imdecode (baseline)'] / results['decode']:.2f}x, "
+          f"encode: {results['cv2.imencode q85 (baseline)'] / results['encode q85 4:2:0']:.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'test_image.jpg',
+              int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -17,6 +17,18 @@ import subprocess
 import json
 from pathlib import Path
 
+from roi import load_roi_config
+from motion_gate import create_motion_gate
+from tracker import create_tracker
+from adaptive_resolution import create_resolution_controller
+from frame_ring import create_frame_ring
+from frame_publisher import FramePublisher, SharedMemorySink, FileSink, add_restream_sink
+from jpeg_codec import get_codec
+from h264_restream import add_h264_restream_sink
+from detection_events import create_detection_event_stream
+from device_state import create_device_state
+from metrics import PipelineMetrics, create_metrics_server
+
 class HailoYOLOProcessor:
     def __init__(self):
         self.udp_socket = None
@@ -46,8 +58,56 @@ class HailoYOLOProcessor:
         self.output_dir = Path("/tmp/yolo_frames")
         self.output_dir.mkdir(exist_ok=True)
         
+        # Region of interest for this stream (None = full frame)
+        self.roi = load_roi_config(os.environ.get('UDP_PORT', '5000'))
+        
+        # Motion gate (None = run inference on every frame)
+        self.motion_gate = create_motion_gate(self.roi)
+        self.last_detections = None
+        self.inference_time_ms = 0.0
+        
+        # Tracker predicts boxes on frames between inferences
+        self.tracker = create_tracker()
+        self.inference_interval = max(1, int(os.environ.get('INFERENCE_INTERVAL', 1)))
+        
+        # Darknet models accept any multiple of 32, so every resolution is available
+        self.input_size = 416
+        self.resolution_controller = create_resolution_controller([256, 320, 416])
+        if self.resolution_controller is not None:
+            self.input_size = self.resolution_controller.resolution
+        self.queue_depth = 0  # Complete frames received behind the one being processed
+        
+        # Processed frames are encoded once and fanned out to all outputs;
+        # shared memory by default, JPEG files opt-in (or when shared memory is unavailable)
+        self.publisher = FramePublisher(overlay_renderer=self.render_overlay)
+        frame_ring = create_frame_ring()
+        if frame_ring is not None:
+            self.publisher.add_sink(SharedMemorySink(frame_ring))
+        if frame_ring is None or os.environ.get('FRAME_FILE_OUTPUT', '0').lower() in ('1', 'true', 'yes'):
+            self.publisher.add_sink(FileSink(self.output_dir / "latest_frame.jpg"))
+            self.publisher.add_sink(FileSink("/tmp/latest_yolo_frame.jpg"))
+        add_restream_sink(self.publisher)
+        self.h264_restream = add_h264_restream_sink(self.publisher)
+        
+        # Per-frame detection records exported in batches (None = disabled)
+        self.detection_events = create_detection_event_stream(os.environ.get('UDP_PORT', '5000'))
+        
+        # Camera and accelerator state for local readers (web service)
+        self.device_state = create_device_state()
+        
+        # Pipeline counters and latency histograms, scraped from METRICS_PORT
+        self.metrics = PipelineMetrics(os.environ.get('UDP_PORT', '5000'))
+        self.metrics_server = create_metrics_server()
+        self.metrics.watch_queue('udp_backlog', lambda: self.queue_depth)
+        if self.h264_restream is not None:
+            self.metrics.watch_queue('h264', self.h264_restream.frame_queue.qsize)
+        if self.detection_events is not None:
+            self.metrics.watch_queue('detection_events', lambda: len(self.detection_events.buffer))
+        
         # Initialize OpenCV YOLO
         self.init_opencv_yolo()
+        if self.device_state is not None:
+            self.device_state.set_accelerator('connected' if self.model_loaded else 'unavailable', 'opencv:cpu')
         
     def init_opencv_yolo(self):
         """Initialize OpenCV YOLO for real inference"""
@@ -178,8 +238,8 @@ class HailoYOLOProcessor:
             print(f"❌ Error setting up UDP receiver: {e}")
             return False
     
-    def decode_mjpeg_frame(self, mjpeg_data):
-        """Decode MJPEG frame from UDP data"""
+    def extract_mjpeg_frame(self, mjpeg_data):
+        """First complete JPEG frame in the UDP data, None if there is none yet"""
         try:
             # MJPEG frames start with JPEG start marker
             jpeg_start = b'\xff\xd8'
@@ -203,9 +263,16 @@ class HailoYOLOProcessor:
                 print(f"⚠️ JPEG frame too small: {len(jpeg_frame)} bytes")
                 return None
             
-            # Decode JPEG using OpenCV
-            jpeg_array = np.frombuffer(jpeg_frame, dtype=np.uint8)
-            frame = cv2.imdecode(jpeg_array, cv2.IMREAD_COLOR)
+            return jpeg_frame
+                
+        except Exception as e:
+            print(f"⚠️ MJPEG extract error: {e}")
+            return None
+    
+    def decode_mjpeg_frame(self, jpeg_frame):
+        """Decode a JPEG frame (TurboJPEG when available, OpenCV otherwise)"""
+        try:
+            frame = get_codec().decode(jpeg_frame)
             
             if frame is not None and frame.size > 0:
                 print(f"✅ Successfully decoded MJPEG frame: {frame.shape}")
@@ -218,29 +285,58 @@ class HailoYOLOProcessor:
             print(f"⚠️ MJPEG decode error: {e}")
             return None
     
-    def run_yolo_inference(self, frame):
-        """Run YOLO inference using loaded OpenCV model"""
+    def should_run_model(self, jpeg_frame):
+        """Run inference every Nth frame unless the scene is static; gated on the JPEG before decoding"""
+        run_model = self.frame_count % self.inference_interval == 0
+        if run_model and self.motion_gate is not None and self.model_loaded:
+            # 1/8-scale grayscale decode, much cheaper than the full frame
+            run_model = self.motion_gate.should_infer(jpeg_data=jpeg_frame)
+        return run_model
+    
+    def run_yolo_inference(self, frame, run_model=True):
+        """Run YOLO inference using loaded OpenCV model, returns detections (None when simulated)"""
         try:
             if not self.model_loaded:
                 print("⚠️ No YOLO model loaded, using simulation")
-                return self.simulate_yolo_detection(frame)
+                return None
+            
+            if not run_model and self.last_detections is not None:
+                # Predict tracked boxes, or reuse last detections without a tracker
+                if self.tracker is not None:
+                    return self.tracker.predict()
+                return self.last_detections
             
             # Run YOLO inference using OpenCV DNN
             print("🚀 Running OpenCV YOLO inference...")
-            return self.run_opencv_inference(frame)
+            inference_start = time.perf_counter()
+            detections = self.run_opencv_inference(frame)
+            inference_ms = (time.perf_counter() - inference_start) * 1000
+            self.inference_time_ms = 0.9 * self.inference_time_ms + 0.1 * inference_ms if self.inference_time_ms else inference_ms
+            if self.device_state is not None:
+                self.device_state.record_inference(inference_ms)
+            self.metrics.record_inference(inference_ms / 1000)
+            if self.resolution_controller is not None:
+                self.input_size = self.resolution_controller.observe(inference_ms, self.queue_depth)
+            return detections
             
         except Exception as e:
             print(f"⚠️ YOLO inference error: {e}")
-            return self.simulate_yolo_detection(frame)
+            return None
     
     def run_opencv_inference(self, frame):
-        """Run YOLO inference using OpenCV DNN"""
+        """Run YOLO inference using OpenCV DNN, returns detections (None on failure)"""
         try:
+            # Crop to ROI bounding box before scaling
+            if self.roi is not None:
+                model_frame, roi_offset = self.roi.crop(frame)
+            else:
+                model_frame, roi_offset = frame, (0, 0)
+            
             # Prepare frame for YOLO
-            height, width = frame.shape[:2]
+            height, width = model_frame.shape[:2]
             
             # Create blob from image
-            blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
+            blob = cv2.dnn.blobFromImage(model_frame, 1/255.0, (self.input_size, self.input_size), swapRB=True, crop=False)
             
             # Set input blob
             self.yolo_net.setInput(blob)
@@ -251,14 +347,18 @@ class HailoYOLOProcessor:
             # Process detections
             detections = self.process_opencv_outputs(outputs, width, height)
             
-            # Draw detections on frame
-            processed_frame = self.draw_opencv_detections(frame, detections)
+            # Map back to frame coordinates and drop detections outside ROI
+            if self.roi is not None:
+                detections = self.roi.filter_detections(detections, roi_offset, frame.shape)
+            if self.tracker is not None:
+                detections = self.tracker.update(detections)
+            self.last_detections = detections
             
-            return processed_frame
+            return detections
             
         except Exception as e:
             print(f"⚠️ OpenCV inference error: {e}")
-            return self.simulate_yolo_detection(frame)
+            return None
     
     def process_opencv_outputs(self, outputs, width, height):
         """Process OpenCV YOLO network outputs"""
@@ -342,6 +442,10 @@ class HailoYOLOProcessor:
         cv2.putText(processed_frame, f"Detections: {len(detections)}", (10, 150), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
         
+        # Draw ROI outline
+        if self.roi is not None:
+            self.roi.draw(processed_frame)
+        
         # Draw detections
         for detection in detections:
             bbox = detection['bbox']
@@ -354,7 +458,10 @@ class HailoYOLOProcessor:
             cv2.rectangle(processed_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             
             # Draw label
-            label = f"{class_name}: {confidence:.2f}"
+            if 'track_id' in detection:
+                label = f"{class_name} #{detection['track_id']}: {confidence:.2f}"
+            else:
+                label = f"{class_name}: {confidence:.2f}"
             cv2.putText(processed_frame, label, (x1, y1-10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         
@@ -385,20 +492,29 @@ class HailoYOLOProcessor:
         
         return processed_frame
     
-    def save_processed_frame(self, frame):
-        """Save processed frame for web service to access"""
+    def render_overlay(self, frame, metadata):
+        """Burn detections and status into a copy of the frame (only for overlay profiles)"""
+        if metadata.get('simulated'):
+            return self.simulate_yolo_detection(frame)
+        return self.draw_opencv_detections(frame, metadata.get('detections', []))
+    
+    def save_processed_frame(self, frame, detections):
+        """Publish processed frame for web service to access"""
         try:
-            # Save as JPEG for web service
-            frame_path = self.output_dir / "latest_frame.jpg"
-            cv2.imwrite(str(frame_path), frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            
-            # Also save a copy for the web service to read
-            web_frame_path = Path("/tmp/latest_yolo_frame.jpg")
-            cv2.imwrite(str(web_frame_path), frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            # Encode once per profile and fan out to all sinks;
+            # overlays are rendered only if some sink wants them burned in
+            self.publisher.publish(frame, self.frame_count, {
+                'frame_id': self.frame_count,
+                'fps': self.current_fps,
+                'detections': detections or [],
+                'simulated': detections is None
+            })
+            if detections and self.detection_events is not None:
+                self.detection_events.submit(self.frame_count, detections)
             
             # Update latest frame reference
             with self.frame_lock:
-                self.latest_processed_frame = frame.copy()
+                self.latest_processed_frame = frame
             
             return True
             
@@ -426,20 +542,46 @@ class HailoYOLOProcessor:
                         print(f"📦 Received {len(data)} bytes, total buffer: {len(self.mjpeg_buffer)} bytes")
                         print(f"🔧 Attempting to decode MJPEG frame...")
                         
+                        jpeg_frame = self.extract_mjpeg_frame(self.mjpeg_buffer)
+                        if jpeg_frame is not None:
+                            # Frames received behind this one (approximate backlog, as in the Hailo
+                            # processor); they are discarded with the buffer when inference falls behind
+                            self.queue_depth = max(0, len(self.mjpeg_buffer) // len(jpeg_frame) - 1)
+                        run_model = jpeg_frame is not None and self.should_run_model(jpeg_frame)
+                        if jpeg_frame is not None and not run_model and not self.publisher.wants_frames():
+                            # Static scene and nobody watching: the frame needs no full decode at all
+                            self.metrics.frames_received.inc()
+                            self.metrics.drop('static')
+                            self.frame_count += 1
+                            if self.device_state is not None:
+                                self.device_state.record_frame()
+                            self.mjpeg_buffer = b''
+                            continue
+                        
                         # Try to decode MJPEG frame
-                        frame = self.decode_mjpeg_frame(self.mjpeg_buffer)
+                        decode_start = time.perf_counter()
+                        frame = self.decode_mjpeg_frame(jpeg_frame) if jpeg_frame is not None else None
+                        self.metrics.decode_seconds.observe(time.perf_counter() - decode_start)
                         
                         if frame is not None:
+                            self.metrics.frames_received.inc()
+                            self.metrics.frames_decoded.inc()
                             print(f"🎯 SUCCESS! Decoded real camera frame: {frame.shape}")
                             
                             # Update frame counter
                             self.frame_count += 1
+                            if self.device_state is not None:
+                                self.device_state.record_frame()
                             
                             # Run YOLO inference
-                            processed_frame = self.run_yolo_inference(frame)
+                            detections = self.run_yolo_inference(frame, run_model)
                             
                             # Save processed frame
-                            if self.save_processed_frame(processed_frame):
+                            publish_start = time.perf_counter()
+                            published = self.save_processed_frame(frame, detections)
+                            self.metrics.publish_seconds.observe(time.perf_counter() - publish_start)
+                            if published:
+                                self.metrics.frames_published.inc()
                                 # Update FPS counter
                                 self.fps_counter += 1
                                 current_time = time.time()
@@ -448,9 +590,36 @@ class HailoYOLOProcessor:
                                     self.current_fps = self.fps_counter
                                     self.fps_counter = 0
                                     self.fps_start_time = current_time
+                                    self.metrics.update_utilization(current_time)
                                     
                                     # Show which YOLO engine is being used
                                     print(f"🔄 OpenCV YOLO Processing FPS: {self.current_fps}")
+                                    
+                                    if self.motion_gate is not None:
+                                        gate_stats = self.motion_gate.get_stats()
+                                        print(f"🏃 Motion gate: {gate_stats['avg_gate_ms']:.2f} ms/frame vs inference "
+                                              f"{self.inference_time_ms:.1f} ms, skipped {gate_stats['skip_ratio'] * 100:.0f}% of frames")
+                                    
+                                    if self.resolution_controller is not None:
+                                        resolution_stats = self.resolution_controller.get_stats()
+                                        print(f"📐 Input {resolution_stats['active_resolution']}px, "
+                                              f"switches down {resolution_stats['switches_down']} / up {resolution_stats['switches_up']}")
+                                    
+                                    if self.h264_restream is not None:
+                                        h264_stats = self.h264_restream.get_stats()
+                                        print(f"🎞️ H.264: encoder lag {h264_stats['encoder_lag_frames']} frames "
+                                              f"({h264_stats['encoder_lag_ms']:.0f} ms), dropped {h264_stats['frames_dropped']}")
+                                    
+                                    if self.detection_events is not None:
+                                        event_stats = self.detection_events.get_stats()
+                                        print(f"📤 Events: {event_stats['exported']} exported, backlog {event_stats['backlog']}, "
+                                              f"dropped {event_stats['dropped']}")
+                                    
+                                    if self.tracker is not None:
+                                        tracker_stats = self.tracker.get_stats()
+                                        print(f"🧭 Tracker: {tracker_stats['active_tracks']} tracks, "
+                                              f"update {tracker_stats['avg_update_ms']:.2f} ms, predict {tracker_stats['avg_predict_ms']:.2f} ms, "
+                                              f"ID switches {tracker_stats['id_switches']}")
                             
                             # Clear buffer after successful decode
                             self.mjpeg_buffer = b''
@@ -513,6 +682,12 @@ class HailoYOLOProcessor:
         if self.udp_socket:
             self.udp_socket.close()
         
+        self.publisher.close()
+        if self.detection_events is not None:
+            self.detection_events.close()
+        if self.device_state is not None:
+            self.device_state.close()
+        
         # Clean up temporary files
         try:
             for file_path in self.output_dir.glob("*.jpg"):
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Thread-safe metrics registry with Prometheus text exposition
+Counters, gauges and histograms with labels. Resolve a labeled child once with labels(...) and
+keep it. Recording never takes a lock: counter increments and histogram observations are
+appended to a deque (atomic in CPython) and folded into totals and buckets at scrape time, or
+when enough have piled up. Gauges can also be backed by a function evaluated only at scrape
+time, so queue depths and client counts cost nothing on the hot path.
+
+The web service serves the registry on /metrics; processors start a small HTTP server on
+METRICS_PORT (default 9101, 0 disables).
+"""
+
+import os
+import threading
+from collections import deque
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from sub-millisecond decode to slow CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Bytes, typical JPEG frames from thumbnails to full HD
+SIZE_BUCKETS = (8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152)
+
+# Pending recordings folded in by the recording thread itself past this many
+FOLD_THRESHOLD = 4096
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class CounterChild:
+    __slots__ = ('lock', 'pending', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.value = 0
+
+    def inc(self, amount=1):
+        pending = self.pending
+        pending.append(amount)
+        if len(pending) > FOLD_THRESHOLD:
+            self.fold()
+
+    def fold(self):
+        """Move pending increments into the total; safe against concurrent inc()"""
+        with self.lock:
+            total = 0
+            pop = self.pending.popleft
+            try:
+                while True:
+                    total += pop()
+            except IndexError:
+                pass
+            self.value += total
+            return self.value
+
+
+class GaugeChild:
+    __slots__ = ('lock', 'value', 'function')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """Evaluate function() at scrape time instead of storing a value"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class HistogramChild:
+    __slots__ = ('lock', 'pending', 'bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # Last bucket is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) > FOLD_THRESHOLD:
+            self.fold()
+
+    def fold(self):
+        """Bucket pending observations; safe against concurrent observe()"""
+        with self.lock:
+            bounds, counts = self.bounds, self.counts
+            pop = self.pending.popleft
+            try:
+                while True:
+                    value = pop()
+                    counts[bisect_left(bounds, value)] += 1
+                    self.sum += value
+            except IndexError:
+                pass
+
+    def snapshot(self):
+        self.fold()
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Metric:
+    kind = 'untyped'
+    child_class = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children = {}
+        self.lock = threading.Lock()
+        self.default = self.labels() if not self.label_names else None
+
+    def new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        """Child for the given label values (created on first use); keep it for hot paths"""
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in values), None)
+
+    def samples(self):
+        """(suffix, label values, extra label, value) tuples for exposition"""
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            yield '', values, None, self.child_value(child)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+    child_class = CounterChild
+
+    def inc(self, amount=1):
+        self.default.inc(amount)
+
+    def child_value(self, child):
+        return child.fold()
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    child_class = GaugeChild
+
+    def set(self, value):
+        self.default.set(value)
+
+    def inc(self, amount=1):
+        self.default.inc(amount)
+
+    def dec(self, amount=1):
+        self.default.dec(amount)
+
+    def set_function(self, function):
+        self.default.set_function(function)
+
+    def child_value(self, child):
+        return child.get()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.default.observe(value)
+
+    def samples(self):
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', values, f'le="{_format_value(float(bound))}"', cumulative
+            yield '_sum', values, None, total
+            yield '_count', values, None, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name, documentation, label_names=(), **kwargs):
+        """Get or create a metric; the same name must always be registered with the same type"""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, label_names, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metric_class) or metric.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self.register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class PipelineMetrics:
+    """Per-stream processor metrics with children resolved up front for the frame loop"""
+
+    def __init__(self, stream_id, registry=REGISTRY):
+        self.stream_id = str(stream_id)
+        labels = (self.stream_id,)
+        self.frames_received = registry.counter(
+            'yolo_frames_received_total', 'Frames extracted from the camera stream', ('stream',)).labels(*labels)
+        self.frames_decoded = registry.counter(
+            'yolo_frames_decoded_total', 'Frames decoded', ('stream',)).labels(*labels)
+        self.frames_inferred = registry.counter(
+            'yolo_frames_inferred_total', 'Frames the model ran on', ('stream',)).labels(*labels)
+        self.frames_published = registry.counter(
+            'yolo_frames_published_total', 'Processed frames handed to the outputs', ('stream',)).labels(*labels)
+        self.dropped = registry.counter(
+            'yolo_frames_dropped_total', 'Frames dropped before publishing', ('stream', 'reason'))
+
+        stage = registry.histogram('yolo_stage_seconds', 'Per-frame pipeline stage latency', ('stream', 'stage'))
+        self.decode_seconds = stage.labels(self.stream_id, 'decode')
+        self.inference_seconds = stage.labels(self.stream_id, 'inference')
+        self.publish_seconds = stage.labels(self.stream_id, 'publish')
+        self.input_bytes = registry.histogram(
+            'yolo_input_jpeg_bytes', 'Size of received JPEG frames', ('stream',), SIZE_BUCKETS).labels(*labels)
+
+        self.accelerator_busy = registry.counter(
+            'yolo_accelerator_busy_seconds_total', 'Time spent in model inference', ('stream',)).labels(*labels)
+        self.accelerator_utilization = registry.gauge(
+            'yolo_accelerator_utilization', 'Fraction of wall time spent in inference over the last second',
+            ('stream',)).labels(*labels)
+        self.queue_depth = registry.gauge('yolo_queue_depth', 'Items waiting in pipeline queues', ('stream', 'queue'))
+        self.busy_seconds = 0.0
+        self.busy_window_start = None
+
+    def drop(self, reason):
+        self.dropped.labels(self.stream_id, reason).inc()
+
+    def record_inference(self, seconds):
+        self.frames_inferred.inc()
+        self.inference_seconds.observe(seconds)
+        self.accelerator_busy.inc(seconds)
+        self.busy_seconds += seconds
+
+    def watch_queue(self, name, function):
+        """Report a queue depth by calling function() at scrape time"""
+        self.queue_depth.labels(self.stream_id, name).set_function(function)
+
+    def update_utilization(self, now):
+        """Called about once per second from the processing loop"""
+        if self.busy_window_start is not None and now > self.busy_window_start:
+            self.accelerator_utilization.set(min(1.0, self.busy_seconds / (now - self.busy_window_start)))
+        self.busy_window_start = now
+        self.busy_seconds = 0.0
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """Serve /metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def create_metrics_server():
+    """Start the processor metrics endpoint from METRICS_PORT (default 9101), None if disabled"""
+    port = int(os.environ.get('METRICS_PORT', 9101))
+    if not port:
+        return None
+    try:
+        server = start_metrics_server(port)
+        print(f"📈 Metrics on http://0.0.0.0:{port}/metrics")
+        return server
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint unavailable on port {port}: {e}")
+        return None
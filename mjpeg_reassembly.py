@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+MJPEG frame reassembly for the UDP camera stream
+Datagrams are appended to a byte buffer and complete JPEG frames are cut out between the
+SOI (FFD8) and EOI (FFD9) markers. Kept separate from the processor so the stage benchmark
+times exactly the code the live pipeline runs.
+
+UDP loses datagrams, so the buffer is kept aligned on an SOI: bytes in front of it (the tail
+of a frame whose head was lost) are dropped, a frame that runs into the next frame's SOI
+(its EOI was lost) is dropped, and so is one that grows past max_frame_bytes. A lost
+datagram therefore costs at most the frames it belonged to.
+"""
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+
+
+class MjpegReassembler:
+    def __init__(self, max_frame_bytes=MAX_FRAME_BYTES, on_resync=None):
+        self.buffer = b''
+        self.max_frame_bytes = max_frame_bytes
+        self.on_resync = on_resync  # Called whenever a broken frame is thrown away
+        self.scanned = 0            # Buffer prefix already searched for EOI (buffer starts at an SOI)
+        self.synced = False         # Last frame was complete; startup bytes do not count as a resync
+
+        # Statistics
+        self.frames = 0
+        self.resyncs = 0
+        self.bytes_discarded = 0
+
+    def discard(self, count):
+        """Drop count bytes from the front of the buffer"""
+        if not count:
+            return
+        self.buffer = self.buffer[count:]
+        self.bytes_discarded += count
+        self.scanned = 0
+        if self.synced:
+            self.synced = False
+            self.resyncs += 1
+            if self.on_resync is not None:
+                self.on_resync()
+
+    def feed(self, data):
+        """Append received bytes and yield each complete frame found in the buffer
+
+        The frame stays in the buffer while the caller handles it, so the remaining length
+        still counts it (the processor derives its backlog from that); it is dropped when the
+        caller asks for the next frame.
+        """
+        self.buffer += data
+        while True:
+            start_marker = self.buffer.find(SOI)
+            if start_marker == -1:
+                # Keep a trailing FF, it may be the first half of the next SOI
+                self.discard(len(self.buffer) - self.buffer.endswith(b'\xff'))
+                return
+            self.discard(start_marker)
+
+            # Only the bytes received since the last call are new to the search
+            search_from = max(2, self.scanned)
+            end_marker = self.buffer.find(EOI, search_from)
+            next_start = self.buffer.find(SOI, search_from, end_marker if end_marker != -1 else len(self.buffer))
+            if next_start != -1:
+                self.discard(next_start)
+                continue
+            if end_marker == -1:
+                if len(self.buffer) > self.max_frame_bytes:
+                    self.discard(len(self.buffer))
+                else:
+                    self.scanned = len(self.buffer) - 1
+                return
+
+            self.frames += 1
+            self.synced = True
+            yield self.buffer[:end_marker + 2]
+            self.buffer = self.buffer[end_marker + 2:]
+            self.scanned = 0
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'resyncs': self.resyncs,
+            'bytes_discarded': self.bytes_discarded,
+            'buffered_bytes': len(self.buffer)
+        }
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Multipart MJPEG fan-out for HTTP viewers
+A single poller reads each new processed frame from the shared-memory ring once, builds the
+multipart part once and offers the same bytes to every client. Each client has its own
+latest-frame slot, so a slow client skips frames instead of buffering or delaying others.
+
+Clients are served one of a few quality tiers. The full tier is the processor's JPEG as is;
+lower tiers are produced by a DCT-scaled decode and one re-encode per tier, and only for tiers
+that currently have viewers. Each client's tier follows the share of offered frames it was
+actually sent, measured over one-second windows, with hysteresis; failed step-ups back off.
+The JPEG codec (and with it OpenCV) is only loaded once a lower tier is first needed.
+"""
+
+import os
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+from metrics import counter, histogram, SIZE_BUCKETS
+
+BOUNDARY = 'frame'
+
+FRAMES_SKIPPED = counter('yolo_stream_frames_skipped_total', 'MJPEG frames replaced before a slow client took them')
+BYTES_SENT = counter('yolo_stream_bytes_sent_total', 'MJPEG bytes written to clients')
+PART_BYTES = histogram('yolo_stream_part_bytes', 'MJPEG part size per quality tier', ('tier',), SIZE_BUCKETS)
+
+
+class StreamTier:
+    def __init__(self, name, scale=1, quality=None):
+        self.name = name
+        self.scale = scale      # Decode downscale factor (1, 2, 4 or 8)
+        self.quality = quality  # Re-encode quality (None = pass the source JPEG through)
+
+
+DEFAULT_TIERS = [StreamTier('full'), StreamTier('half', 2, 70), StreamTier('quarter', 4, 60)]
+
+
+class TierController:
+    """Per-client tier choice from the delivered-frame ratio, with hysteresis
+
+    A link that keeps up with the current tier says nothing about whether it could carry the
+    next one, so stepping up is a probe: if the client has to step down again within
+    probe_window_s, the wait before the next probe doubles (up to max_up_after evaluations),
+    and it goes back to up_after once a step up has held.
+    """
+
+    def __init__(self, tier_count, down_ratio=0.7, up_ratio=0.95, down_after=2, up_after=5, cooldown_s=3.0,
+                 probe_window_s=10.0, max_up_after=60):
+        self.tier_count = tier_count
+        self.down_ratio = down_ratio    # Step down when fewer frames than this are delivered
+        self.up_ratio = up_ratio        # Step up only when nearly every frame is delivered
+        self.down_after = down_after    # Consecutive one-second evaluations before stepping down
+        self.up_after = up_after        # Consecutive one-second evaluations before stepping up
+        self.cooldown_s = cooldown_s
+        self.probe_window_s = probe_window_s
+        self.max_up_after = max_up_after
+        self.up_wait = up_after         # Current evaluations before stepping up (backed off)
+        self.tier = 0
+        self.down_count = 0
+        self.up_count = 0
+        self.last_switch_time = 0.0
+        self.last_up_time = None        # Time of a step up that has not held for probe_window_s yet
+        self.switches = 0
+        self.failed_probes = 0
+
+    def evaluate(self, delivered_ratio):
+        """One evaluation per second, returns the tier to use"""
+        if delivered_ratio < self.down_ratio:
+            self.down_count += 1
+            self.up_count = 0
+        elif delivered_ratio >= self.up_ratio:
+            self.up_count += 1
+            self.down_count = 0
+        else:
+            self.down_count = 0
+            self.up_count = 0
+
+        now = time.time()
+        if self.last_up_time is not None and now - self.last_up_time >= self.probe_window_s:
+            # The last step up held
+            self.last_up_time = None
+            self.up_wait = self.up_after
+        if now - self.last_switch_time < self.cooldown_s:
+            return self.tier
+
+        if self.down_count >= self.down_after and self.tier < self.tier_count - 1:
+            if self.last_up_time is not None:
+                self.failed_probes += 1
+                self.up_wait = min(self.up_wait * 2, self.max_up_after)
+                self.last_up_time = None
+            self._switch(self.tier + 1, now)
+        elif self.up_count >= self.up_wait and self.tier > 0:
+            self.last_up_time = now
+            self._switch(self.tier - 1, now)
+        return self.tier
+
+    def _switch(self, tier, now):
+        self.tier = tier
+        self.down_count = 0
+        self.up_count = 0
+        self.last_switch_time = now
+        self.switches += 1
+
+
+def build_part(jpeg_data):
+    """Multipart part (headers + JPEG) shared by all clients"""
+    header = (f"--{BOUNDARY}\r\n"
+              f"Content-Type: image/jpeg\r\n"
+              f"Content-Length: {len(jpeg_data)}\r\n\r\n").encode()
+    return b''.join((header, jpeg_data, b'\r\n'))
+
+
+class StreamClient:
+    def __init__(self, client_id, remote_addr=None, tier_controller=None, tier=0):
+        self.client_id = client_id
+        self.remote_addr = remote_addr
+        self.condition = threading.Condition()
+        self.pending = None     # Newest part not yet sent (one-frame slot)
+        self.closed = False
+        self.tier_controller = tier_controller  # None = fixed tier
+        self.tier = tier_controller.tier if tier_controller is not None else tier
+        self.wakeup = None      # Set by async consumers, called from the poller thread
+
+        # Statistics
+        self.connected_at = time.time()
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.send_times = deque(maxlen=32)
+        self.delivery_rate = None           # Bytes/s over the last one-second window
+        self.window_start = time.time()
+        self.window_sent = 0
+        self.window_skipped = 0
+        self.window_bytes = 0
+
+    def offer(self, part):
+        """Replace the pending frame, counting the replaced one as skipped"""
+        with self.condition:
+            if self.pending is not None:
+                self.frames_skipped += 1
+                self.window_skipped += 1
+                FRAMES_SKIPPED.inc()
+            self.pending = part
+            self.condition.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def take(self, timeout=5.0):
+        """Wait for the next frame, None on timeout or when the client is closed"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending is not None or self.closed, timeout)
+            part, self.pending = self.pending, None
+            return part
+
+    def take_nowait(self):
+        """Pending frame or None, without waiting"""
+        with self.condition:
+            part, self.pending = self.pending, None
+            return part
+
+    def record_sent(self, size):
+        self.frames_sent += 1
+        self.window_sent += 1
+        self.window_bytes += size
+        self.bytes_sent += size
+        BYTES_SENT.inc(size)
+        self.send_times.append(time.time())
+
+    def update_window(self):
+        """Close the one-second window: delivery rate, and the tier when adaptive
+
+        Only wall-clock windows are measured: a send returns once the part is in the socket
+        buffer, so timing individual sends says little about what reached the client.
+        """
+        now = time.time()
+        elapsed = now - self.window_start
+        if elapsed < 1.0:
+            return
+        self.delivery_rate = self.window_bytes / elapsed
+        offered = self.window_sent + self.window_skipped
+        if self.tier_controller is not None and offered:
+            self.tier = self.tier_controller.evaluate(self.window_sent / offered)
+        self.window_start = now
+        self.window_sent = 0
+        self.window_skipped = 0
+        self.window_bytes = 0
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def get_stats(self):
+        """Get per-client statistics"""
+        times = list(self.send_times)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        duration = max(1e-6, time.time() - self.connected_at)
+        return {
+            "client_id": self.client_id,
+            "remote_addr": self.remote_addr,
+            "tier": self.tier,
+            "adaptive": self.tier_controller is not None,
+            "tier_switches": self.tier_controller.switches if self.tier_controller is not None else 0,
+            "failed_step_ups": self.tier_controller.failed_probes if self.tier_controller is not None else 0,
+            "delivery_rate_bps": (self.delivery_rate or 0.0) * 8,
+            "connected_seconds": duration,
+            "fps": fps,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "bytes_sent": self.bytes_sent,
+            "bitrate_bps": self.bytes_sent * 8 / duration
+        }
+
+
+class MjpegBroadcaster:
+    def __init__(self, get_ring, poll_interval=0.005, tiers=None, adaptive=True):
+        self.get_ring = get_ring            # Callable returning the frame ring or None
+        self.poll_interval = poll_interval
+        self.tiers = tiers or DEFAULT_TIERS
+        self.adaptive = adaptive
+        self.codec = None     # Loaded when a lower tier is first encoded
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.client_ids = itertools.count(1)
+        self.poll_thread = None
+
+        # Statistics
+        self.frames_read = 0
+        self.tier_encodes = [0] * len(self.tiers)
+        self.tier_part_size = [0] * len(self.tiers)
+        self.source_fps = 0.0
+        self.last_frame_time = None
+
+    def tier_index(self, name):
+        """Tier index by name, None if unknown"""
+        for index, tier in enumerate(self.tiers):
+            if tier.name == name:
+                return index
+        return None
+
+    def subscribe(self, remote_addr=None, tier=None):
+        """Register a new viewer (fixed tier by name, or adaptive), starting the poller on first use"""
+        tier_index = self.tier_index(tier) if tier else None
+        if tier_index is None and self.adaptive and len(self.tiers) > 1:
+            client = StreamClient(next(self.client_ids), remote_addr, TierController(len(self.tiers)))
+        else:
+            client = StreamClient(next(self.client_ids), remote_addr, tier=tier_index or 0)
+        with self.lock:
+            self.clients[client.client_id] = client
+            if self.poll_thread is None or not self.poll_thread.is_alive():
+                self.poll_thread = threading.Thread(target=self.poll_loop, daemon=True)
+                self.poll_thread.start()
+        print(f"📺 MJPEG client {client.client_id} connected from {remote_addr}")
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.pop(client.client_id, None)
+        client.close()
+        stats = client.get_stats()
+        print(f"📺 MJPEG client {client.client_id} disconnected: {stats['frames_sent']} frames sent, "
+              f"{stats['frames_skipped']} skipped")
+
+    def poll_loop(self):
+        """Read each new frame from shared memory once and offer it to all clients"""
+        last_sequence = None
+        while True:
+            with self.lock:
+                clients = list(self.clients.values())
+            if not clients:
+                # Nobody watching: stop polling until the next subscriber
+                with self.lock:
+                    if not self.clients:
+                        self.poll_thread = None
+                        return
+                continue
+
+            ring = self.get_ring()
+            if ring is None:
+                time.sleep(0.5)
+                continue
+
+            if ring.latest_sequence() == last_sequence:
+                time.sleep(self.poll_interval)
+                continue
+
+            frame = ring.read_latest()
+            if frame is None:
+                time.sleep(self.poll_interval)
+                continue
+            last_sequence = frame['sequence']
+            self.frames_read += 1
+            now = time.time()
+            if self.last_frame_time is not None and now > self.last_frame_time:
+                self.source_fps = 0.9 * self.source_fps + 0.1 / (now - self.last_frame_time)
+            self.last_frame_time = now
+
+            # Build each tier at most once per frame, and only tiers somebody is watching
+            parts = {}
+            for client in clients:
+                tier = client.tier
+                if tier not in parts:
+                    parts[tier] = self.build_tier_part(frame['jpeg'], tier)
+                if parts[tier] is not None:
+                    client.offer(parts[tier])
+
+    def build_tier_part(self, jpeg_data, tier_index):
+        """Multipart part for a tier: source JPEG as is, or scaled decode + re-encode"""
+        tier = self.tiers[tier_index]
+        if tier.quality is None and tier.scale == 1:
+            part = build_part(jpeg_data)
+        else:
+            if self.codec is None:
+                from jpeg_codec import get_codec
+                self.codec = get_codec()
+            image = self.codec.decode(jpeg_data, scale=tier.scale, fast=True)
+            if image is None:
+                return None
+            encoded = self.codec.encode(image, tier.quality, fast_dct=True)
+            if encoded is None:
+                return None
+            part = build_part(bytes(encoded))
+        self.tier_encodes[tier_index] += 1
+        self.tier_part_size[tier_index] = len(part)
+        PART_BYTES.labels(tier.name).observe(len(part))
+        return part
+
+    def stream(self, client):
+        """Generator of multipart parts for one client"""
+        try:
+            while not client.closed:
+                part = client.take()
+                if part is None:
+                    continue
+                yield part
+                client.record_sent(len(part))
+                client.update_window()
+        finally:
+            self.unsubscribe(client)
+
+    async def async_stream(self, client):
+        """Async generator of multipart parts for one client; the poller wakes the event loop instead of a thread"""
+        ready = wakeup_event(client)
+        try:
+            while not client.closed:
+                part = client.take_nowait()
+                if part is None:
+                    ready.clear()
+                    # Re-check after clearing so a frame offered in between is not missed
+                    part = client.take_nowait()
+                if part is None:
+                    try:
+                        await asyncio.wait_for(ready.wait(), 5.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                yield part
+                client.record_sent(len(part))
+                client.update_window()
+        finally:
+            client.wakeup = None
+            self.unsubscribe(client)
+
+    def get_stats(self):
+        """Get per-client statistics"""
+        with self.lock:
+            clients = list(self.clients.values())
+        subscribed = {client.tier for client in clients}
+        return {
+            "clients": len(clients),
+            "frames_read": self.frames_read,
+            "source_fps": self.source_fps,
+            "tiers": [{"name": tier.name, "scale": tier.scale, "quality": tier.quality,
+                       "subscribers": sum(1 for client in clients if client.tier == index),
+                       "encoded": index in subscribed, "frames_built": self.tier_encodes[index],
+                       "part_bytes": self.tier_part_size[index]}
+                      for index, tier in enumerate(self.tiers)],
+            "per_client": [client.get_stats() for client in clients]
+        }
+
+
+def wakeup_event(client):
+    """asyncio.Event set from any thread whenever the client gets something to send"""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+
+    def wakeup():
+        try:
+            loop.call_soon_threadsafe(ready.set)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    client.wakeup = wakeup
+    return ready
+
+
+def create_mjpeg_broadcaster(get_ring):
+    """Create broadcaster; STREAM_ADAPTIVE=0 serves every client the full tier"""
+    return MjpegBroadcaster(
+        get_ring,
+        adaptive=os.environ.get('STREAM_ADAPTIVE', '1').lower() not in ('0', 'false', 'no')
+    )
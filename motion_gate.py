@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Motion-gated inference for static scenes
+Runs a cheap frame-differencing detector on a heavily downscaled grayscale image
+and decides whether a frame is worth sending to the YOLO model
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+
+from jpeg_codec import get_codec
+
+
+class MotionGate:
+    def __init__(self, width=160, pixel_threshold=25, min_area=0.002,
+                 refresh_frames=30, background_alpha=0.05, roi=None):
+        self.width = width                      # Width of the downscaled grayscale image
+        self.pixel_threshold = pixel_threshold  # Per-pixel difference that counts as change
+        self.min_area = min_area                # Fraction of (masked) pixels that must change
+        self.refresh_frames = refresh_frames    # Force inference after this many skipped frames
+        self.background_alpha = background_alpha
+        self.roi = roi
+
+        self.background = None
+        self.mask = None
+        self.mask_pixels = 0
+        self.full_shape = None
+        self.frames_since_inference = None
+
+        # Statistics
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.forced_refreshes = 0
+        self.gate_time_total = 0.0
+        self.last_motion_ratio = 0.0
+
+    def _small_gray_from_frame(self, frame):
+        """Downscale a decoded BGR frame to small grayscale"""
+        height, width = frame.shape[:2]
+        small_height = max(1, int(height * self.width / width))
+        small = cv2.resize(frame, (self.width, small_height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), frame.shape
+
+    def _small_gray_from_jpeg(self, jpeg_data):
+        """Decode JPEG directly at 1/8 scale in grayscale (DCT scaling, no full decode)"""
+        gray = get_codec().decode(jpeg_data, scale=8, grayscale=True)
+        if gray is None:
+            return None, None
+        full_shape = (gray.shape[0] * 8, gray.shape[1] * 8)
+        if gray.shape[1] > self.width:
+            small_height = max(1, int(gray.shape[0] * self.width / gray.shape[1]))
+            gray = cv2.resize(gray, (self.width, small_height), interpolation=cv2.INTER_AREA)
+        return gray, full_shape
+
+    def _build_mask(self, small_shape, full_shape):
+        """Rasterize ROI polygons at the downscaled resolution"""
+        self.full_shape = full_shape[:2]
+        if self.roi is None:
+            self.mask = None
+            self.mask_pixels = small_shape[0] * small_shape[1]
+            return
+
+        scale_x = small_shape[1] / full_shape[1]
+        scale_y = small_shape[0] / full_shape[0]
+        mask = np.zeros(small_shape[:2], dtype=np.uint8)
+        for polygon in self.roi.polygons(full_shape):
+            points = polygon * np.array([scale_x, scale_y], dtype=np.float32)
+            cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 255)
+        self.mask = mask
+        self.mask_pixels = max(1, int(np.count_nonzero(mask)))
+
+    def should_infer(self, frame=None, jpeg_data=None):
+        """Return True if the model should run on this frame, False to reuse last detections"""
+        start_time = time.perf_counter()
+        try:
+            if jpeg_data is not None:
+                gray, full_shape = self._small_gray_from_jpeg(jpeg_data)
+            else:
+                gray, full_shape = self._small_gray_from_frame(frame)
+
+            if gray is None:
+                return True
+
+            gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+            if self.background is None or self.background.shape != gray.shape:
+                self.background = gray.astype(np.float32)
+                self._build_mask(gray.shape, full_shape)
+                self.frames_since_inference = 0
+                return True
+
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            changed = diff > self.pixel_threshold
+            if self.mask is not None:
+                changed &= self.mask > 0
+            self.last_motion_ratio = float(np.count_nonzero(changed)) / self.mask_pixels
+
+            cv2.accumulateWeighted(gray, self.background, self.background_alpha)
+
+            if self.last_motion_ratio >= self.min_area:
+                self.frames_since_inference = 0
+                return True
+
+            if self.frames_since_inference is None or self.frames_since_inference >= self.refresh_frames:
+                self.forced_refreshes += 1
+                self.frames_since_inference = 0
+                return True
+
+            self.frames_since_inference += 1
+            self.frames_skipped += 1
+            return False
+
+        except Exception as e:
+            print(f"⚠️ Motion gate error: {e}")
+            return True
+
+        finally:
+            self.frames_checked += 1
+            self.gate_time_total += time.perf_counter() - start_time
+
+    def get_stats(self):
+        """Get motion gate statistics"""
+        checked = max(1, self.frames_checked)
+        return {
+            "frames_checked": self.frames_checked,
+            "frames_skipped": self.frames_skipped,
+            "skip_ratio": self.frames_skipped / checked,
+            "forced_refreshes": self.forced_refreshes,
+            "avg_gate_ms": self.gate_time_total * 1000 / checked,
+            "last_motion_ratio": self.last_motion_ratio
+        }
+
+
+def create_motion_gate(roi=None):
+    """Create motion gate from MOTION_* environment settings, None if disabled"""
+    if os.environ.get('MOTION_GATE', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    gate = MotionGate(
+        width=int(os.environ.get('MOTION_WIDTH', 160)),
+        pixel_threshold=int(os.environ.get('MOTION_THRESHOLD', 25)),
+        min_area=float(os.environ.get('MOTION_MIN_AREA', 0.002)),
+        refresh_frames=int(os.environ.get('MOTION_REFRESH_FRAMES', 30)),
+        roi=roi
+    )
+    print(f"🏃 Motion gate enabled: threshold={gate.pixel_threshold}, "
+          f"min_area={gate.min_area}, refresh every {gate.refresh_frames} frames")
+    return gate
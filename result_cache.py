@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Content-hash result cache for duplicate frames and repeated uploads
+Bounded LRU keyed by a fast hash of the raw JPEG bytes plus model identity and thresholds
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Fixed per-entry overhead (key tuple, dict slot) added to the payload size
+ENTRY_OVERHEAD_BYTES = 128
+
+
+def content_hash(data):
+    """Fast 128-bit hash of raw bytes"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, data, model_id, thresholds=()):
+        """Cache key for raw image bytes processed by a model with given thresholds"""
+        return (content_hash(data), model_id, tuple(thresholds))
+
+    def get(self, key):
+        """Return cached value and mark it most recently used, None on miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a JSON-serializable value, evicting least recently used entries over the caps"""
+        size = len(json.dumps(value, separators=(',', ':'))) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return False
+
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry[1]
+
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+
+            while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+            return True
+
+    def clear(self):
+        """Drop all entries"""
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        """Get cache statistics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+def create_result_cache():
+    """Create result cache from RESULT_CACHE_* environment settings"""
+    return ResultCache(
+        max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 256)),
+        max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+    )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Static region-of-interest (ROI) masks for YOLO processing
+Crops frames to the ROI bounding box before inference and drops detections outside the ROI polygons
+"""
+
+import os
+import json
+import cv2
+import numpy as np
+
+# ROI configuration is a JSON object keyed by stream id (the UDP port), e.g.
+# {
+#     "5000": [{"rect": [0, 200, 640, 480]},
+#              {"polygon": [[0.1, 0.5], [0.9, 0.5], [0.9, 1.0], [0.1, 1.0]], "normalized": true}],
+#     "default": [{"rect": [0, 0.3, 1.0, 1.0], "normalized": true}]
+# }
+# It is read from the file in ROI_CONFIG or from inline JSON in ROI.
+
+
+class RegionOfInterest:
+    def __init__(self, regions):
+        """Create ROI from a list of {"rect": [x1, y1, x2, y2]} / {"polygon": [[x, y], ...]} regions"""
+        self.regions = []
+        for region in regions:
+            if 'rect' in region:
+                x1, y1, x2, y2 = region['rect']
+                points = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+                is_rect = True
+            elif 'polygon' in region:
+                points = region['polygon']
+                is_rect = False
+            else:
+                raise ValueError(f"ROI region needs 'rect' or 'polygon': {region}")
+
+            points = np.asarray(points, dtype=np.float32)
+            if points.ndim != 2 or points.shape[0] < 3 or points.shape[1] != 2:
+                raise ValueError(f"Invalid ROI polygon: {region}")
+
+            self.regions.append({
+                'points': points,
+                'normalized': bool(region.get('normalized', False)),
+                'is_rect': is_rect
+            })
+
+        if not self.regions:
+            raise ValueError("ROI must contain at least one region")
+
+        # Pixel geometry is resolved once per frame size
+        self._resolved_shape = None
+        self._polygons = None
+        self._bbox = None
+        self._rects_only = all(region['is_rect'] for region in self.regions)
+
+    def _resolve(self, frame_shape):
+        """Convert regions to pixel polygons and bounding box for a frame size"""
+        height, width = frame_shape[:2]
+        if self._resolved_shape == (height, width):
+            return
+
+        polygons = []
+        for region in self.regions:
+            points = region['points'].copy()
+            if region['normalized']:
+                points[:, 0] *= width
+                points[:, 1] *= height
+            points[:, 0] = np.clip(points[:, 0], 0, width)
+            points[:, 1] = np.clip(points[:, 1], 0, height)
+            polygons.append(points)
+
+        all_points = np.concatenate(polygons)
+        x1, y1 = np.floor(all_points.min(axis=0)).astype(int)
+        x2, y2 = np.ceil(all_points.max(axis=0)).astype(int)
+
+        self._polygons = polygons
+        self._bbox = (int(x1), int(y1), max(int(x2), int(x1) + 1), max(int(y2), int(y1) + 1))
+        self._resolved_shape = (height, width)
+
+    def bbox(self, frame_shape):
+        """Bounding box (x1, y1, x2, y2) of all ROI regions in pixels"""
+        self._resolve(frame_shape)
+        return self._bbox
+
+    def polygons(self, frame_shape):
+        """ROI polygons as (N, 2) float pixel arrays for a frame size"""
+        self._resolve(frame_shape)
+        return self._polygons
+
+    def crop(self, frame):
+        """Crop frame to the ROI bounding box, returns (view, (offset_x, offset_y))"""
+        x1, y1, x2, y2 = self.bbox(frame.shape)
+        # Slicing returns a view, so no pixels are copied before resize
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def contains(self, points):
+        """Vectorized test of which (N, 2) pixel points fall inside any ROI region"""
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        inside = np.zeros(len(points), dtype=bool)
+        if len(points) == 0:
+            return inside
+
+        px = points[:, 0:1]
+        py = points[:, 1:2]
+        for polygon in self._polygons:
+            if self._rects_only:
+                x_min, y_min = polygon.min(axis=0)
+                x_max, y_max = polygon.max(axis=0)
+                inside |= ((px >= x_min) & (px <= x_max) & (py >= y_min) & (py <= y_max))[:, 0]
+                continue
+
+            # Even-odd ray casting against all polygon edges at once
+            xi, yi = polygon[:, 0], polygon[:, 1]
+            xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+            crosses = (yi > py) != (yj > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = (xj - xi) * (py - yi) / (yj - yi) + xi
+            inside |= (np.count_nonzero(crosses & (px < x_cross), axis=1) % 2) == 1
+
+        return inside
+
+    def filter_detections(self, detections, offset, frame_shape):
+        """Shift crop-space detections back to frame space and drop those outside the ROI"""
+        if not detections:
+            return []
+
+        self._resolve(frame_shape)
+        offset_x, offset_y = offset
+
+        boxes = np.array([det['bbox'] for det in detections], dtype=np.float32)
+        boxes[:, [0, 2]] += offset_x
+        boxes[:, [1, 3]] += offset_y
+        centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        keep = self.contains(centers)
+
+        filtered = []
+        for det, box, inside in zip(detections, boxes.astype(int), keep):
+            if inside:
+                det['bbox'] = [int(v) for v in box]
+                filtered.append(det)
+        return filtered
+
+    def draw(self, frame):
+        """Draw ROI outlines on frame"""
+        self._resolve(frame.shape)
+        polygons = [polygon.astype(np.int32) for polygon in self._polygons]
+        cv2.polylines(frame, polygons, True, (255, 128, 0), 1)
+        return frame
+
+
+def load_roi_config(stream_id=None):
+    """Load ROI for a stream from ROI_CONFIG file or inline ROI env, None if not configured"""
+    try:
+        config_path = os.environ.get('ROI_CONFIG')
+        inline_config = os.environ.get('ROI')
+
+        if config_path and os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        elif inline_config:
+            config = json.loads(inline_config)
+        else:
+            return None
+
+        # A plain list applies to every stream
+        if isinstance(config, list):
+            regions = config
+        else:
+            regions = config.get(str(stream_id)) or config.get('default')
+
+        if not regions:
+            return None
+
+        roi = RegionOfInterest(regions)
+        print(f"🎯 ROI configured for stream {stream_id}: {len(roi.regions)} region(s)")
+        return roi
+
+    except Exception as e:
+        print(f"⚠️ Failed to load ROI config: {e}")
+        return None
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Concurrent-viewer capacity of the web service serving modes
+Starts each server (Flask threaded, async ASGI) in a subprocess against a synthetic frame
+source written to a private shared-memory ring, then ramps up concurrent MJPEG viewers while
+polling /api/stats. For every level it reports the median and worst per-viewer fps, stats
+latency and the server's threads and memory. Capacity is the largest level at which every
+viewer connected, the median viewer kept at least 90% of the source fps and stats p95 stayed
+under 250 ms.
+
+Usage: python3 serve_benchmark.py [levels, default 10,25,50,100,200] [seconds per level, default 5]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import subprocess
+import urllib.request
+
+import cv2
+import numpy as np
+
+from frame_ring import SharedFrameRing
+
+MODES = {
+    'flask': 'web_stream_service_simple.py',
+    'asgi': 'web_stream_asgi.py',
+}
+SOURCE_FPS = 15
+FRAME_SIZE = (640, 480)
+STATS_P95_LIMIT_MS = 250
+MARKER = b'--frame\r\nContent-Type: image/jpeg\r\n'
+
+
+def source_loop(ring, stop, fps=SOURCE_FPS):
+    """Synthetic processed frames: a moving bar over the test image"""
+    base = cv2.imread('test_image.jpg')
+    base = cv2.resize(base, FRAME_SIZE) if base is not None else np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 90, np.uint8)
+    frame_id = 0
+    next_time = time.perf_counter()
+    while not stop.is_set():
+        frame = base.copy()
+        x = (frame_id * 8) % FRAME_SIZE[0]
+        cv2.rectangle(frame, (x, 0), (x + 40, FRAME_SIZE[1]), (0, 255, 0), -1)
+        jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1]
+        ring.write(jpeg, frame_id, {'detections': []})
+        frame_id += 1
+        next_time += 1.0 / fps
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+
+def process_usage(pid):
+    """(threads, RSS MB) of a process from /proc"""
+    threads, rss = 0, 0.0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return threads, rss
+
+
+class Viewer:
+    """One MJPEG client counting received parts"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.status = None
+        self.tail = b''
+
+    async def run(self, port, stop):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            self.status = 'refused'
+            return
+        writer.write(f'GET /stream.mjpg HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n'.encode())
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            self.status = head.split(b' ', 2)[1].decode()
+            while not stop.is_set() and self.status == '200':
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                data = self.tail + chunk
+                # Keep a tail so a part header split across reads is still counted
+                self.frames += data.count(MARKER)
+                self.tail = data[-(len(MARKER) - 1):]
+                self.bytes += len(chunk)
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def poll_stats(port, stop, latencies):
+    loop = asyncio.get_running_loop()
+    url = f'http://127.0.0.1:{port}/api/stats'
+    while not stop.is_set():
+        start_time = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, lambda: urllib.request.urlopen(url, timeout=5).read())
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        except OSError:
+            latencies.append(5000.0)
+        await asyncio.sleep(0.2)
+
+
+async def run_level(port, pid, viewers_count, seconds):
+    stop = asyncio.Event()
+    viewers = [Viewer() for _ in range(viewers_count)]
+    latencies = []
+    tasks = [asyncio.ensure_future(viewer.run(port, stop)) for viewer in viewers]
+    tasks.append(asyncio.ensure_future(poll_stats(port, stop, latencies)))
+
+    await asyncio.sleep(1.0)  # Let every viewer connect and receive its first frame
+    start_frames = [viewer.frames for viewer in viewers]
+    start_time = time.perf_counter()
+    threads, rss = 0, 0.0
+    while time.perf_counter() - start_time < seconds:
+        await asyncio.sleep(0.5)
+        usage = process_usage(pid)
+        threads, rss = max(threads, usage[0]), max(rss, usage[1])
+    elapsed = time.perf_counter() - start_time
+    rates = sorted((viewer.frames - start) / elapsed for viewer, start in zip(viewers, start_frames))
+
+    stop.set()
+    await asyncio.wait(tasks, timeout=5)
+    latencies.sort()
+    return {
+        'viewers': viewers_count,
+        'connected': sum(1 for viewer in viewers if viewer.status == '200'),
+        'median_fps': rates[len(rates) // 2],
+        'min_fps': rates[0],
+        'stats_p50_ms': latencies[len(latencies) // 2] if latencies else None,
+        'stats_p95_ms': latencies[int(len(latencies) * 0.95)] if latencies else None,
+        'threads': threads,
+        'rss_mb': rss
+    }
+
+
+def wait_ready(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/stats', timeout=1).read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def benchmark_mode(mode, levels, seconds, port):
+    env = dict(os.environ, WEB_PORT=str(port), INFERENCE_BACKEND='fake', FRAME_RING_NAME=os.environ['FRAME_RING_NAME'],
+               DEVICE_STATE_NAME=f'bench_state_{os.getpid()}', STREAM_MAX_CLIENTS=str(max(levels) + 10))
+    server = subprocess.Popen([sys.executable, MODES[mode]], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        if not wait_ready(port):
+            print(f"❌ {mode}: server did not start")
+            return results
+        print(f"\n🌐 {mode} ({MODES[mode]})")
+        print(f"  {'viewers':>7} {'connected':>9} {'median fps':>10} {'min fps':>8} "
+              f"{'stats p50':>9} {'stats p95':>9} {'threads':>7} {'RSS MB':>7}")
+        for level in levels:
+            result = asyncio.run(run_level(port, server.pid, level, seconds))
+            results.append(result)
+            print(f"  {result['viewers']:>7} {result['connected']:>9} {result['median_fps']:>10.1f} "
+                  f"{result['min_fps']:>8.1f} {result['stats_p50_ms'] or 0:>9.1f} {result['stats_p95_ms'] or 0:>9.1f} "
+                  f"{result['threads']:>7} {result['rss_mb']:>7.1f}")
+            time.sleep(1.0)  # Let the server notice closed viewers
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return results
+
+
+def capacity(results):
+    """Largest level meeting the fps and stats-latency targets"""
+    best = 0
+    for result in results:
+        if (result['connected'] == result['viewers'] and result['median_fps'] >= 0.9 * SOURCE_FPS
+                and result['stats_p95_ms'] is not None and result['stats_p95_ms'] < STATS_P95_LIMIT_MS):
+            best = result['viewers']
+    return best
+
+
+def benchmark(levels=(10, 25, 50, 100, 200), seconds=5.0, modes=tuple(MODES)):
+    os.environ.setdefault('FRAME_RING_NAME', f'bench_frames_{os.getpid()}')
+    ring = SharedFrameRing(name=os.environ['FRAME_RING_NAME'], slots=4, slot_size=1024 * 1024, create=True)
+    stop = threading.Event()
+    source = threading.Thread(target=source_loop, args=(ring, stop), daemon=True)
+    source.start()
+    print(f"🎞️ Synthetic source {FRAME_SIZE[0]}x{FRAME_SIZE[1]} at {SOURCE_FPS} fps, {seconds:.0f} s per level")
+
+    summary = {}
+    try:
+        for index, mode in enumerate(modes):
+            results = benchmark_mode(mode, levels, seconds, 18080 + index)
+            summary[mode] = {'capacity': capacity(results), 'levels': results}
+    finally:
+        stop.set()
+        source.join(timeout=2)
+        ring.close()
+
+    print("\n📊 Capacity (viewers at ≥90% source fps, stats p95 < "
+          f"{STATS_P95_LIMIT_MS} ms): " + ', '.join(f"{mode} {data['capacity']}" for mode, data in summary.items()))
+    return summary
+
+
+if __name__ == "__main__":
+    benchmark(tuple(int(level) for level in sys.argv[1].split(',')) if len(sys.argv) > 1 else (10, 25, 50, 100, 200),
+              float(sys.argv[2]) if len(sys.argv) > 2 else 5.0)
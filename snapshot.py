@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Latest processed frame for snapshot requests
+The newest JPEG is copied out of the shared-memory ring at most once per frame and kept in
+memory with its ETag, so repeated fetches cost no copy or disk read and a client that already
+has the frame gets 304. Long-poll requests ("the next frame after sequence N") are woken by a
+single watcher thread that runs only while somebody is waiting. Thumbnails come in a few
+configured widths, built on first request (DCT-scaled decode, resize, re-encode) and cached
+with the frame they belong to.
+"""
+
+import os
+import time
+import asyncio
+import threading
+
+from metrics import counter
+from startup_profile import lazy_import
+
+cv2 = lazy_import('cv2', globals())
+
+SNAPSHOT_REQUESTS = counter('yolo_snapshot_requests_total', 'Snapshot requests by outcome', ('outcome',))
+SNAPSHOT_FRAME = SNAPSHOT_REQUESTS.labels('frame')
+SNAPSHOT_THUMBNAIL = SNAPSHOT_REQUESTS.labels('thumbnail')
+SNAPSHOT_NOT_MODIFIED = SNAPSHOT_REQUESTS.labels('not_modified')
+SNAPSHOT_TIMEOUT = SNAPSHOT_REQUESTS.labels('timeout')
+SNAPSHOT_UNAVAILABLE = SNAPSHOT_REQUESTS.labels('unavailable')
+THUMBNAILS_BUILT = counter('yolo_snapshot_thumbnails_total', 'Thumbnails encoded (once per frame and width)')
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(jpeg_data):
+    """(width, height) from the JPEG frame header without decoding, None if not found"""
+    data = memoryview(jpeg_data)
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker in SOF_MARKERS:
+            height = (data[offset + 5] << 8) | data[offset + 6]
+            width = (data[offset + 7] << 8) | data[offset + 8]
+            return width, height
+        offset += 2 + ((data[offset + 2] << 8) | data[offset + 3])
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value names etag (weak comparison, '*' matches anything)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class Snapshot:
+    """One processed frame and the thumbnails built from it"""
+
+    def __init__(self, jpeg, sequence, frame_id, timestamp, metadata=None):
+        self.jpeg = jpeg
+        self.sequence = sequence
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.metadata = metadata
+        self.size = jpeg_size(jpeg)
+        self.thumbnails = {}            # width -> JPEG bytes
+        self.lock = threading.Lock()    # Concurrent requests for a new width wait for one encode
+
+    def etag(self, width=None):
+        # The timestamp tells frames apart across processor restarts, which reset the sequence
+        tag = f"{self.sequence}.{int(self.timestamp * 1000)}"
+        return f'"{tag}"' if width is None else f'"{tag}.w{width}"'
+
+    def headers(self, width=None):
+        return {
+            'ETag': self.etag(width),
+            'Cache-Control': 'no-cache',
+            'X-Frame-Sequence': str(self.sequence),
+            'X-Frame-Id': str(self.frame_id),
+            'X-Frame-Timestamp': f"{self.timestamp:.3f}"
+        }
+
+
+class SnapshotStore:
+    def __init__(self, get_ring, sizes=(160, 320, 640), quality=75, watch_interval=0.005):
+        self.get_ring = get_ring            # Callable returning the frame ring or None
+        self.sizes = tuple(sorted(sizes))   # Thumbnail widths clients may ask for
+        self.quality = quality
+        self.watch_interval = watch_interval
+        self.codec = None                   # Loaded when the first thumbnail is built
+        self.current = None
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.waiters = 0
+        self.listeners = set()              # Async waiters' wake-up callbacks
+        self.watch_thread = None
+
+        # Statistics
+        self.frames_read = 0
+        self.thumbnails_built = 0
+        self.thumbnail_ms = 0.0
+
+    def latest(self):
+        """Newest frame as a Snapshot, read from the ring only when it changed; None if unavailable"""
+        ring = self.get_ring()
+        if ring is None:
+            return None
+        sequence = ring.latest_sequence()
+        current = self.current
+        if current is not None and current.sequence == sequence:
+            return current
+        with self.lock:
+            current = self.current
+            if current is None or current.sequence != sequence:
+                frame = ring.read_latest()
+                if frame is None:
+                    return current
+                current = Snapshot(frame['jpeg'], frame['sequence'], frame['frame_id'], frame['timestamp'],
+                                   frame['metadata'])
+                self.current = current
+                self.frames_read += 1
+        return current
+
+    def newer(self, after):
+        """Latest snapshot if its sequence differs from after (a restarted processor counts from 0 again)"""
+        snapshot = self.latest()
+        return snapshot if snapshot is not None and snapshot.sequence != after else None
+
+    def ensure_watcher(self):
+        """Start the watcher thread (condition held)"""
+        if self.watch_thread is None:
+            self.watch_thread = threading.Thread(target=self.watch_loop, name='snapshot-watch', daemon=True)
+            self.watch_thread.start()
+
+    def watch_loop(self):
+        """Wake waiters whenever the ring's sequence changes; exits when nobody waits"""
+        last_sequence = None
+        while True:
+            with self.condition:
+                if not self.waiters and not self.listeners:
+                    self.watch_thread = None
+                    return
+            ring = self.get_ring()
+            if ring is None:
+                time.sleep(0.5)
+                continue
+            sequence = ring.latest_sequence()
+            if sequence != last_sequence:
+                last_sequence = sequence
+                with self.condition:
+                    self.condition.notify_all()
+                    listeners = list(self.listeners)
+                for listener in listeners:
+                    listener()
+            time.sleep(self.watch_interval)
+
+    def wait_for_frame(self, after, timeout):
+        """Snapshot of the first frame after sequence `after`, waiting up to timeout seconds; None on timeout"""
+        snapshot = self.newer(after)
+        if snapshot is not None:
+            return snapshot
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.waiters += 1
+            self.ensure_watcher()
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.condition.wait(remaining)
+                    snapshot = self.newer(after)
+                    if snapshot is not None:
+                        return snapshot
+            finally:
+                self.waiters -= 1
+
+    async def async_wait_for_frame(self, after, timeout):
+        """wait_for_frame() for the event loop: the watcher wakes the loop instead of a thread"""
+        snapshot = self.newer(after)
+        if snapshot is not None:
+            return snapshot
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def listener():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+        with self.condition:
+            self.listeners.add(listener)
+            self.ensure_watcher()
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                ready.clear()
+                # Re-check after clearing so a frame published in between is not missed
+                snapshot = self.newer(after)
+                remaining = deadline - loop.time()
+                if snapshot is not None or remaining <= 0:
+                    return snapshot
+                try:
+                    await asyncio.wait_for(ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.condition:
+                self.listeners.discard(listener)
+
+    def thumbnail(self, snapshot, width):
+        """JPEG of the snapshot scaled to width, built once per frame and width"""
+        with snapshot.lock:
+            jpeg = snapshot.thumbnails.get(width)
+            if jpeg is None:
+                jpeg = snapshot.thumbnails[width] = self.build_thumbnail(snapshot, width)
+        return jpeg
+
+    def build_thumbnail(self, snapshot, width):
+        if snapshot.size is None or width >= snapshot.size[0]:
+            return snapshot.jpeg  # Never upscale
+        start_time = time.perf_counter()
+        if self.codec is None:
+            from jpeg_codec import get_codec
+            self.codec = get_codec()
+        # Let the decoder do most of the downscaling, then resize the rest
+        scale = next(scale for scale in (8, 4, 2, 1) if snapshot.size[0] // scale >= width)
+        image = self.codec.decode(snapshot.jpeg, scale=scale, fast=True)
+        if image is None:
+            return snapshot.jpeg
+        if image.shape[1] != width:
+            height = max(1, round(image.shape[0] * width / image.shape[1]))
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        encoded = self.codec.encode(image, self.quality, fast_dct=True)
+        if encoded is None:
+            return snapshot.jpeg
+        self.thumbnails_built += 1
+        self.thumbnail_ms += (time.perf_counter() - start_time) * 1000
+        THUMBNAILS_BUILT.inc()
+        return bytes(encoded)
+
+    def response(self, snapshot, width=None, if_none_match=None):
+        """(status, body, headers) for a snapshot: 304 when the client's ETag is current"""
+        headers = snapshot.headers(width)
+        if etag_matches(if_none_match, headers['ETag']):
+            SNAPSHOT_NOT_MODIFIED.inc()
+            return 304, b'', headers
+        if width is None:
+            SNAPSHOT_FRAME.inc()
+            return 200, snapshot.jpeg, headers
+        SNAPSHOT_THUMBNAIL.inc()
+        return 200, self.thumbnail(snapshot, width), headers
+
+    def empty_response(self, waited):
+        """(status, message, headers) when no frame is returned: 204 after a long-poll timeout, else 503"""
+        current = self.current
+        if waited and current is not None:
+            SNAPSHOT_TIMEOUT.inc()
+            return 204, None, {'X-Frame-Sequence': str(current.sequence), 'Cache-Control': 'no-cache'}
+        SNAPSHOT_UNAVAILABLE.inc()
+        return 503, 'No frame available', {'Retry-After': '1'}
+
+    def get_stats(self):
+        current = self.current
+        return {
+            'sequence': current.sequence if current is not None else None,
+            'frame_size': current.size if current is not None else None,
+            'cached_thumbnails': sorted(current.thumbnails) if current is not None else [],
+            'sizes': list(self.sizes),
+            'frames_read': self.frames_read,
+            'thumbnails_built': self.thumbnails_built,
+            'avg_thumbnail_ms': self.thumbnail_ms / self.thumbnails_built if self.thumbnails_built else 0.0,
+            'waiters': self.waiters + len(self.listeners)
+        }
+
+
+def create_snapshot_store(get_ring):
+    """Snapshot store from SNAPSHOT_SIZES (comma-separated thumbnail widths) and SNAPSHOT_QUALITY"""
+    sizes = os.environ.get('SNAPSHOT_SIZES', '160,320,640')
+    return SnapshotStore(
+        get_ring,
+        sizes=tuple(int(size) for size in sizes.split(',') if size.strip()),
+        quality=int(os.environ.get('SNAPSHOT_QUALITY', 75))
+    )
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Per-stage microbenchmarks of the frame pipeline with regression tracking
+Times each hot-path stage in isolation on fixed fixtures built from test_image.jpg: MJPEG
+reassembly of the datagram stream, JPEG decode, letterbox preprocessing, inference on the fake
+backend (alone and through the inference engine), YOLO decode with NMS, overlay drawing and
+JPEG encoding. Every stage is warmed up and then timed call by call, in several rounds that
+take turns across stages so a burst of background load hits every stage a little instead of
+one stage entirely. Results (median, p95, mean and min in milliseconds, the median of the
+fastest round, and the environment and fixture they were measured on) are written as JSON.
+
+Given a baseline (an earlier results file), each stage's fastest-round median is compared with
+the baseline's: it is a regression when it is slower by more than the tolerance and by more
+than --min-delta-ms, which keeps microsecond-scale stages from tripping on timer noise. The script
+exits with status 1 on any regression, so it can gate a deployment. A reference baseline
+is kept in benchmarks/; its environment section says where it was captured.
+
+Usage: python3 stage_benchmark.py [image, default test_image.jpg] [--iterations 200] [--json results.json]
+       [--baseline baseline.json] [--tolerance 0.25] [--update-baseline]; --help lists every option
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+import cv2
+import numpy as np
+
+from jpeg_codec import get_codec
+from mjpeg_reassembly import MjpegReassembler
+from frame_publisher import FramePublisher, EncodeProfile
+from inference_engine import FakeBackend, InferenceEngine, letterbox, decode_predictions
+from udp_load_generator import parse_size, encode_frame, animate
+
+STAGES = ('reassembly', 'jpeg_decode', 'preprocess', 'inference', 'engine_roundtrip', 'postprocess',
+          'overlay', 'encode')
+RESULTS_VERSION = 1
+
+
+class Fixtures:
+    """Deterministic inputs for every stage, built once from a still image"""
+
+    def __init__(self, image_path='test_image.jpg', size=(640, 480), quality=80, frames=30, fragment=1400,
+                 input_size=640, confidence=0.5, iou_threshold=0.4):
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Cannot read {image_path}")
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+        # The UDP stream as the processor receives it: distinct frames cut into datagrams
+        self.jpegs = [encode_frame(frame, None, quality) for frame in animate(image, frames)]
+        stream = b''.join(self.jpegs)
+        self.datagrams = [stream[offset:offset + fragment] for offset in range(0, len(stream), fragment)]
+
+        self.jpeg = self.jpegs[0]
+        self.frame = get_codec().decode(self.jpeg)
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self.backend = FakeBackend(objects=3, batch_ms=0.0, image_ms=0.0, input_size=input_size)
+        self.prepared = letterbox(self.frame, input_size)
+        self.predictions = self.backend.infer([self.prepared[0]])[0]
+        _, scale, pad = self.prepared
+        self.detections = decode_predictions(self.predictions, confidence, iou_threshold, self.frame.shape,
+                                             scale, pad)
+
+    def describe(self):
+        return {
+            'frame_size': [self.frame.shape[1], self.frame.shape[0]],
+            'frames': len(self.jpegs),
+            'frame_bytes': len(self.jpeg),
+            'datagrams': len(self.datagrams),
+            'input_size': self.backend.input_size,
+            'detections': len(self.detections)
+        }
+
+
+def overlay_renderer():
+    """The processor's overlay drawing; its __init__ (sockets, sinks, model) is skipped"""
+    from hailo_yolo_main import HailoYOLOProcessor
+    processor = object.__new__(HailoYOLOProcessor)
+    processor.roi = None
+    processor.current_fps = 30.0
+    return processor.render_overlay
+
+
+def stage_cases(fixtures, selected):
+    """(name, callable, units per call) for the selected stages; setup runs only for those"""
+    cases = []
+    if 'reassembly' in selected:
+        def reassemble():
+            reassembler = MjpegReassembler()
+            for datagram in fixtures.datagrams:
+                for _ in reassembler.feed(datagram):
+                    pass
+        cases.append(('reassembly', reassemble, len(fixtures.jpegs)))
+    if 'jpeg_decode' in selected:
+        codec = get_codec()
+        # Same call as the processor: decode into a reused buffer
+        dst = np.empty_like(fixtures.frame)
+        cases.append(('jpeg_decode', lambda: codec.decode(fixtures.jpeg, dst=dst), 1))
+    if 'preprocess' in selected:
+        cases.append(('preprocess', lambda: letterbox(fixtures.frame, fixtures.backend.input_size), 1))
+    if 'inference' in selected:
+        cases.append(('inference', lambda: fixtures.backend.infer([fixtures.prepared[0]]), 1))
+    if 'engine_roundtrip' in selected:
+        # Submit to result through the scheduler: queueing, letterbox, gate, backend and decode
+        engine = InferenceEngine(FakeBackend(objects=3, batch_ms=0.0, image_ms=0.0,
+                                             input_size=fixtures.backend.input_size),
+                                 max_batch=1, max_wait_ms=0.0, workers=1).start(warmup=False)
+        cases.append(('engine_roundtrip', lambda: engine.infer(fixtures.frame, fixtures.confidence,
+                                                               fixtures.iou_threshold), 1))
+    if 'postprocess' in selected:
+        _, scale, pad = fixtures.prepared
+        cases.append(('postprocess', lambda: decode_predictions(fixtures.predictions, fixtures.confidence,
+                                                                fixtures.iou_threshold, fixtures.frame.shape,
+                                                                scale, pad), 1))
+    if 'overlay' in selected:
+        render = overlay_renderer()
+        metadata = {'detections': fixtures.detections}
+        cases.append(('overlay', lambda: render(fixtures.frame, metadata), 1))
+    if 'encode' in selected:
+        publisher = FramePublisher()
+        profile = EncodeProfile('benchmark', quality=85)
+        cases.append(('encode', lambda: publisher.encode(fixtures.frame, profile), 1))
+    return cases
+
+
+def time_calls(function, count):
+    """Seconds of each of count calls"""
+    samples = np.empty(count)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for index in range(count):
+            start_time = time.perf_counter()
+            function()
+            samples[index] = time.perf_counter() - start_time
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return samples
+
+
+def time_stages(cases, iterations, warmup, rounds):
+    """{stage: summary} in per-unit milliseconds; rounds take turns across stages"""
+    for _, function, _ in cases:
+        time_calls(function, warmup)
+    per_round = max(1, iterations // rounds)
+    samples = {name: [] for name, _, _ in cases}
+    for _ in range(rounds):
+        for name, function, units in cases:
+            samples[name].append(time_calls(function, per_round) * 1000 / units)
+
+    summaries = {}
+    for name, _, units in cases:
+        all_samples = np.concatenate(samples[name])
+        summaries[name] = {
+            'median_ms': round(float(np.median(all_samples)), 4),
+            'best_round_ms': round(float(min(np.median(round_samples) for round_samples in samples[name])), 4),
+            'p95_ms': round(float(np.percentile(all_samples, 95)), 4),
+            'mean_ms': round(float(all_samples.mean()), 4),
+            'min_ms': round(float(all_samples.min()), 4),
+            'iterations': len(all_samples),
+            'rounds': rounds,
+            'units': units
+        }
+    return summaries
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'codec': get_codec().backend,
+        'machine': platform.machine(),
+        'processor': platform.processor() or None,
+        'cpus': os.cpu_count(),
+        'threads': cv2.getNumThreads()
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Per-stage comparison of fastest-round medians against the baseline; returns (comparison, regressed stage names)"""
+    comparison = {}
+    regressions = []
+    baseline_stages = baseline.get('stages', {})
+    for name, stats in results['stages'].items():
+        reference = baseline_stages.get(name)
+        if reference is None:
+            comparison[name] = {'status': 'new'}
+            continue
+        current_ms, baseline_ms = stats['best_round_ms'], reference.get('best_round_ms', reference['median_ms'])
+        change = (current_ms - baseline_ms) / baseline_ms if baseline_ms > 0 else 0.0
+        if change > tolerance and current_ms - baseline_ms > min_delta_ms:
+            status = 'regression'
+            regressions.append(name)
+        elif change < -tolerance and baseline_ms - current_ms > min_delta_ms:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison[name] = {'status': status, 'baseline_ms': baseline_ms, 'change': round(change, 4)}
+    return comparison, regressions
+
+
+def comparability_warnings(results, baseline):
+    """Differences in environment or fixtures that make a comparison questionable"""
+    warnings = []
+    for section in ('environment', 'fixtures'):
+        current, reference = results.get(section, {}), baseline.get(section, {})
+        for key in sorted(set(current) | set(reference)):
+            if current.get(key) != reference.get(key):
+                warnings.append(f"{section} {key}: baseline {reference.get(key)}, now {current.get(key)}")
+    return warnings
+
+
+def write_json(path, data):
+    """Write results, creating the directory first"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def run(args):
+    selected = STAGES if not args.stages else tuple(stage.strip() for stage in args.stages.split(','))
+    fixtures = Fixtures(args.image, args.size, args.quality, args.frames, args.fragment, args.input_size)
+    cases = stage_cases(fixtures, selected)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'timestamp': time.time(),
+        'environment': environment(),
+        'note': args.note,
+        'fixtures': fixtures.describe(),
+        'stages': {}
+    }
+    print(f"🧪 {args.image} at {args.size[0]}x{args.size[1]}, {results['fixtures']['frame_bytes']} bytes per frame, "
+          f"codec {results['environment']['codec']}, {args.iterations} iterations in {args.rounds} rounds "
+          f"after {args.warmup} warm-up")
+    results['stages'] = time_stages(cases, args.iterations, args.warmup, args.rounds)
+    for name, stats in results['stages'].items():
+        units = stats['units']
+        print(f"  {name:<18} median {stats['median_ms']:8.3f} ms  best round {stats['best_round_ms']:8.3f} ms  "
+              f"p95 {stats['p95_ms']:8.3f} ms" + (f"  (per frame of {units})" if units > 1 else ""))
+
+    regressions = []
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison, regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        results['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance,
+                                 'min_delta_ms': args.min_delta_ms, 'stages': comparison}
+        for warning in comparability_warnings(results, baseline):
+            print(f"⚠️ Not like for like, {warning}")
+        print(f"📏 Against {args.baseline} (tolerance {args.tolerance:.0%}, at least {args.min_delta_ms} ms):")
+        for name, entry in comparison.items():
+            if entry['status'] == 'new':
+                print(f"  {name:<18} new stage, no baseline")
+                continue
+            icon = {'regression': '❌', 'improvement': '🚀'}.get(entry['status'], '✅')
+            print(f"  {icon} {name:<18} {entry['baseline_ms']:8.3f} -> {results['stages'][name]['best_round_ms']:8.3f} ms "
+                  f"({entry['change']:+.1%})")
+    elif args.baseline:
+        print(f"⚠️ No baseline at {args.baseline} yet")
+
+    if args.json:
+        write_json(args.json, results)
+    if args.update_baseline and args.baseline:
+        if regressions:
+            print(f"⚠️ Baseline {args.baseline} kept because of regressions")
+        else:
+            if baseline is not None:
+                # Stages not run this time keep their old numbers
+                results['stages'] = dict(baseline.get('stages', {}), **results['stages'])
+            results.pop('comparison', None)
+            if results['note'] is None and baseline is not None:
+                results['note'] = baseline.get('note')
+            write_json(args.baseline, results)
+            print(f"💾 Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"❌ Regressions in {', '.join(regressions)}")
+    return results, regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Time each pipeline stage on fixed fixtures and compare '
+                                                 'with a baseline')
+    parser.add_argument('image', nargs='?', default='test_image.jpg', help='still image the fixtures are built from')
+    parser.add_argument('--size', type=parse_size, default=(640, 480), help='camera frame size, WIDTHxHEIGHT')
+    parser.add_argument('--quality', type=int, default=80, help='JPEG quality of the camera frames')
+    parser.add_argument('--frames', type=int, default=30, help='distinct frames in the reassembly stream')
+    parser.add_argument('--fragment', type=int, default=1400, help='datagram payload size in bytes')
+    parser.add_argument('--input-size', type=int, default=640, help='model input size')
+    parser.add_argument('--stages', default=None, help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per stage')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed calls per stage first')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds the timed calls are split into')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--baseline', default=None, help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=float(os.environ.get('BENCHMARK_TOLERANCE', 0.25)),
+                        help='allowed slowdown of a stage median as a fraction (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='slowdowns smaller than this many milliseconds are never regressions')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write these results to --baseline when nothing regressed')
+    parser.add_argument('--note', default=None, help='free-text description of the device, stored with the results')
+    args = parser.parse_args(argv)
+    unknown = set(args.stages.split(',') if args.stages else ()) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if args.iterations < 1 or args.rounds < 1:
+        parser.error('--iterations and --rounds must be at least 1')
+    if args.tolerance < 0:
+        parser.error('--tolerance must not be negative')
+    if args.update_baseline and not args.baseline:
+        parser.error('--update-baseline needs --baseline')
+    return args
+
+
+if __name__ == "__main__":
+    try:
+        _, regressions = run(parse_args(sys.argv[1:]))
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    sys.exit(1 if regressions else 0)
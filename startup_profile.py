@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiling and lazy imports
+lazy_import() returns a placeholder that imports the real module on first attribute access and
+then replaces itself in the importing module's globals, so later uses cost nothing extra. The
+time each deferred import took, and which thread paid for it, is recorded in STARTUP together
+with named startup phases; STARTUP.report() is what /api/startup serves.
+
+Run as a script to check a module's cold import against a budget in a fresh interpreter:
+python3 startup_profile.py [module, default web_stream_service_simple] [budget ms, default IMPORT_BUDGET_MS]
+It fails if the import is over budget or loads any of HEAVY_MODULES eagerly.
+"""
+
+import os
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+# Must only be imported on first use by the web service
+HEAVY_MODULES = ('cv2', 'numpy', 'hailo_platform', 'turbojpeg')
+
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 400))
+
+
+def process_age():
+    """Seconds since the process was started (includes interpreter start-up), None if unknown"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # Interpreter start-up before this module was imported
+        self.preamble = process_age()
+        self.lock = threading.Lock()
+        self.phases = []
+        self.imports = {}
+        self.marks = {}
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named start-up step"""
+        start_ms = self.elapsed_ms()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append({'name': name, 'start_ms': round(start_ms, 1),
+                                    'ms': round(self.elapsed_ms() - start_ms, 1)})
+
+    def mark(self, name):
+        """Record when a milestone was first reached"""
+        with self.lock:
+            self.marks.setdefault(name, round(self.elapsed_ms(), 1))
+
+    def record_import(self, name, ms):
+        with self.lock:
+            self.imports[name] = {'ms': round(ms, 1), 'at_ms': round(self.elapsed_ms() - ms, 1),
+                                  'thread': threading.current_thread().name}
+
+    def report(self):
+        with self.lock:
+            return {
+                'interpreter_ms': round(self.preamble * 1000, 1) if self.preamble is not None else None,
+                'uptime_ms': round(self.elapsed_ms(), 1),
+                'marks': dict(self.marks),
+                'phases': list(self.phases),
+                'lazy_imports': dict(self.imports),
+                'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in sys.modules],
+                'modules_loaded': len(sys.modules)
+            }
+
+    def print_report(self):
+        report = self.report()
+        print(f"⏱️ Startup: interpreter {report['interpreter_ms']} ms, "
+              + ', '.join(f"{name} at {ms} ms" for name, ms in report['marks'].items()))
+        for phase in report['phases']:
+            print(f"  {phase['name']:<24} {phase['ms']:8.1f} ms")
+        for name, entry in report['lazy_imports'].items():
+            print(f"  import {name:<17} {entry['ms']:8.1f} ms  (deferred, {entry['thread']})")
+
+
+STARTUP = StartupProfile()
+
+
+class LazyModule:
+    """Stands in for a module until its first attribute access"""
+
+    def __init__(self, name, namespace=None, alias=None):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_namespace', namespace)
+        object.__setattr__(self, '_alias', alias or name.rsplit('.', 1)[-1])
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            start_time = time.perf_counter()
+            module = importlib.import_module(self._name)
+            if self._name not in STARTUP.imports:
+                STARTUP.record_import(self._name, (time.perf_counter() - start_time) * 1000)
+            object.__setattr__(self, '_module', module)
+            namespace = self._namespace
+            if namespace is not None and namespace.get(self._alias) is self:
+                namespace[self._alias] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name, namespace=None, alias=None):
+    """Module placeholder imported on first use; pass globals() so it replaces itself there"""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name, namespace, alias)
+
+
+def measure_import(module, runs=3):
+    """Cold import of module in fresh interpreters: best total ms, slowest top-level imports, heavy modules loaded"""
+    import subprocess
+    script = (f"import sys, time; start = time.perf_counter(); import {module}; "
+              f"print((time.perf_counter() - start) * 1000); "
+              f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+                                    os.getcwd(), os.environ.get('PYTHONPATH')]))))
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+        total_line, heavy_line = result.stdout.splitlines()[-2:]
+        total_ms = float(total_line)
+        if best is None or total_ms < best['total_ms']:
+            # -X importtime lines: "import time: self [us] | cumulative | name", nesting by indent
+            top_level = []
+            for line in result.stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) != 3 or not parts[1].strip().isdigit():
+                    continue
+                name = parts[2]
+                depth = (len(name) - len(name.lstrip())) // 2
+                if depth <= 1:
+                    top_level.append((int(parts[1]) / 1000, name.strip()))
+            best = {
+                'total_ms': total_ms,
+                'slowest': sorted(top_level, reverse=True)[:8],
+                'heavy_modules': [name for name in heavy_line.split(',') if name]
+            }
+    return best
+
+
+def check_budget(module='web_stream_service_simple', budget_ms=IMPORT_BUDGET_MS):
+    """Print the cold-import breakdown of module; True if within budget and no heavy module is loaded"""
+    result = measure_import(module)
+    within = result['total_ms'] <= budget_ms and not result['heavy_modules']
+    print(f"{'✅' if within else '❌'} import {module}: {result['total_ms']:.1f} ms (budget {budget_ms:.0f} ms)")
+    for ms, name in result['slowest']:
+        print(f"  {ms:8.1f} ms  {name}")
+    if result['heavy_modules']:
+        print(f"⚠️ Loaded eagerly: {', '.join(result['heavy_modules'])}")
+    return within
+
+
+if __name__ == "__main__":
+    ok = check_budget(sys.argv[1] if len(sys.argv) > 1 else 'web_stream_service_simple',
+                      float(sys.argv[2]) if len(sys.argv) > 2 else IMPORT_BUDGET_MS)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Shared-memory frame ring seqlock reads and reader re-attach
+Writer and reader run in one process on a uniquely named segment: python3 -m pytest test_frame_ring.py
+"""
+
+import struct
+import threading
+import uuid
+from multiprocessing import shared_memory
+
+import pytest
+
+from frame_ring import SharedFrameRing, SLOT_HEADER_SIZE, HEADER_SIZE
+
+
+@pytest.fixture
+def ring_name():
+    return f'test_ring_{uuid.uuid4().hex[:12]}'
+
+
+@pytest.fixture
+def writer(ring_name):
+    ring = SharedFrameRing(name=ring_name, slots=3, slot_size=4096, create=True)
+    yield ring
+    ring.close()
+
+
+def reader_for(writer, stale_after=1.0):
+    return SharedFrameRing(name=writer.name, create=False, stale_after=stale_after)
+
+
+def test_empty_ring_has_no_frame(writer):
+    assert reader_for(writer).read_latest() is None
+
+
+def test_reader_sees_newest_frame_across_wraparound(writer):
+    reader = reader_for(writer)
+    for frame_id in range(5):
+        assert writer.write(b'jpeg-%d' % frame_id, frame_id, {'detections': frame_id})
+
+    frame = reader.read_latest()
+    assert frame['jpeg'] == b'jpeg-4'
+    assert frame['frame_id'] == 4
+    assert frame['metadata'] == {'detections': 4}
+    assert frame['sequence'] == 5
+    assert frame['_slot'] == 4 % writer.slots
+
+
+def test_frame_larger_than_slot_is_refused(writer):
+    assert not writer.write(b'x' * (writer.max_payload + 1), 1)
+    assert writer.write(b'x' * writer.max_payload, 2)
+
+
+def test_slot_being_written_is_not_returned(writer):
+    reader = reader_for(writer)
+    writer.write(b'jpeg', 1)
+    offset = HEADER_SIZE    # Slot 0
+    seq = struct.unpack_from('<Q', writer.shm.buf, offset)[0]
+
+    # Writer stopped halfway: odd sequence
+    struct.pack_into('<Q', writer.shm.buf, offset, seq + 1)
+    assert reader.read_latest() is None
+
+    struct.pack_into('<Q', writer.shm.buf, offset, seq + 2)
+    assert reader.read_latest()['jpeg'] == b'jpeg'
+
+
+def test_zero_copy_frame_is_invalidated_by_overwrite(writer):
+    reader = reader_for(writer)
+    writer.write(b'first', 1)
+    frame = reader.read_latest(copy=False)
+    assert bytes(frame['jpeg']) == b'first'
+    assert reader.is_valid(frame)
+
+    for frame_id in range(2, 2 + writer.slots):
+        writer.write(b'later', frame_id)
+    assert not reader.is_valid(frame)
+    frame['jpeg'].release()
+
+
+def test_reader_rejects_segment_that_is_not_a_ring(ring_name):
+    other = shared_memory.SharedMemory(name=ring_name, create=True, size=HEADER_SIZE + SLOT_HEADER_SIZE)
+    try:
+        with pytest.raises(ValueError):
+            SharedFrameRing(name=ring_name, create=False)
+    finally:
+        other.close()
+        other.unlink()
+
+
+def test_live_writer_is_not_stale(writer):
+    reader = reader_for(writer, stale_after=0.0)
+    writer.write(b'jpeg', 1)
+    assert not reader.is_stale()    # First look records the sequence
+    assert not reader.is_stale()    # Stalled, but the segment is still the same generation
+    writer.write(b'jpeg', 2)
+    assert not reader.is_stale()
+
+
+def test_restarted_writer_is_detected(writer):
+    reader = reader_for(writer, stale_after=0.0)
+    writer.write(b'old', 1)
+    assert not reader.is_stale()
+
+    writer.close()
+    restarted = SharedFrameRing(name=writer.name, slots=3, slot_size=4096, create=True)
+    try:
+        assert restarted.generation != reader.generation
+        assert reader.is_stale()
+
+        # Re-attaching maps the new segment
+        reader.close()
+        reader = reader_for(restarted)
+        restarted.write(b'new', 1)
+        assert reader.read_latest()['jpeg'] == b'new'
+    finally:
+        reader.close()
+        restarted.close()
+
+
+def test_stopped_writer_is_detected(writer):
+    reader = reader_for(writer, stale_after=0.0)
+    assert not reader.is_stale()
+    writer.close()
+    assert reader.is_stale()
+    reader.close()
+
+
+def test_stale_check_waits_for_stale_after(writer):
+    reader = reader_for(writer, stale_after=60.0)
+    assert not reader.is_stale()
+    writer.close()
+    # The name is only re-checked once the sequence has been stalled for stale_after
+    assert not reader.is_stale()
+    reader.close()
+
+
+def test_web_service_attaches_once_and_reattaches_after_restart(writer, monkeypatch):
+    service = pytest.importorskip('web_stream_service_simple')
+    opened = []
+
+    def open_ring():
+        ring = SharedFrameRing(name=writer.name, create=False, stale_after=0.0)
+        opened.append(ring)
+        return ring
+
+    monkeypatch.setattr(service, 'open_frame_ring', open_ring)
+    monkeypatch.setattr(service, 'frame_ring', None)
+
+    threads = [threading.Thread(target=service.get_frame_ring) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(opened) == 1
+
+    writer.close()
+    restarted = SharedFrameRing(name=writer.name, slots=3, slot_size=4096, create=True)
+    try:
+        service.get_frame_ring()    # Stalled sequence: checks the name and re-attaches
+        ring = service.get_frame_ring()
+        assert len(opened) == 2
+        assert ring.generation == restarted.generation
+    finally:
+        for ring in opened:
+            ring.close()
+        restarted.close()
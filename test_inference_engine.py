@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Inference engine priority gate, preemption and admission control
+Runs on the fake backend, no accelerator needed: python3 -m pytest test_inference_engine.py
+"""
+
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from inference_engine import (InferenceEngine, FakeBackend, PriorityGate, QueueFull, Overloaded, EngineBusy)
+
+
+def image(value=0):
+    return np.full((48, 64, 3), value, np.uint8)
+
+
+def make_engine(**kwargs):
+    backend = FakeBackend(objects=1, batch_ms=0.0, image_ms=0.0, input_size=64, candidates=64)
+    return InferenceEngine(backend, **kwargs)
+
+
+def test_gate_grants_the_most_urgent_waiter_first():
+    gate = PriorityGate()
+    gate.register('live')
+    assert gate.acquire('live')
+
+    order = []
+
+    def waiter(priority):
+        gate.acquire(priority)
+        order.append(priority)
+        gate.release(priority, 0.0)
+
+    gate.register('batch')
+    gate.register('interactive')
+    threads = [threading.Thread(target=waiter, args=(priority,)) for priority in ('batch', 'interactive')]
+    for thread in threads:
+        thread.start()
+    gate.release('live', 0.0)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['interactive', 'batch']
+
+
+def test_gate_gives_up_when_preempted():
+    gate = PriorityGate()
+    gate.register('live')
+    assert gate.acquire('live')
+    gate.register('batch')
+    assert not gate.acquire('batch', preempted=lambda: True)
+    assert gate.waiting['batch'] == 0
+
+
+def test_batch_duty_spaces_batch_calls_while_live_is_active():
+    gate = PriorityGate(batch_duty=0.5, live_active=lambda: True)
+    gate.register('batch')
+    assert gate.acquire('batch')
+    gate.release('batch', 10.0)
+    assert gate.batch_ready - time.perf_counter() > 9.0
+
+    # The next batch call waits as long as the last one ran; more urgent classes do not
+    gate.register('batch')
+    give_up = time.perf_counter() + 0.2
+    threading.Timer(0.25, gate.notify).start()
+    assert not gate.acquire('batch', preempted=lambda: time.perf_counter() > give_up)
+    gate.register('interactive')
+    assert gate.acquire('interactive')
+
+
+def test_queue_limit_rejects_with_queue_full():
+    engine = make_engine(queue_limits={'interactive': 2})
+    engine.submit(image(), priority='interactive')
+    engine.submit(image(), priority='interactive')
+    with pytest.raises(QueueFull) as excinfo:
+        engine.submit(image(), priority='interactive')
+    assert excinfo.value.retry_after >= 1
+    # Other classes have their own queues
+    engine.submit(image(), priority='batch')
+    assert engine.get_stats()['classes']['interactive']['rejected'] == {'queue_full': 1, 'overloaded': 0}
+
+
+def test_wait_beyond_budget_rejects_with_overloaded():
+    engine = make_engine(max_batch=2, budgets_ms={'interactive': 1500.0})
+    engine.batch_seconds = 1.0      # As measured from earlier backend calls
+    engine.submit(image(), priority='interactive')
+    engine.submit(image(), priority='interactive')
+    with pytest.raises(Overloaded) as excinfo:
+        engine.submit(image(), priority='interactive')
+    assert isinstance(excinfo.value, EngineBusy)
+    assert excinfo.value.retry_after == 4
+
+    # Live requests wait only for live work, batch has no budget
+    with pytest.raises(Overloaded):
+        engine.submit(image(), priority='live')     # 1 s against a 100 ms budget
+    engine.submit(image(), priority='batch')
+
+
+def test_collected_batch_is_put_back_for_more_urgent_requests():
+    engine = make_engine(max_batch=4, max_wait_ms=1000.0)
+    batch_futures = [engine.submit(image(), priority='batch') for _ in range(2)]
+
+    collected = []
+    collector = threading.Thread(target=lambda: collected.append(engine.collect_batch()))
+    collector.start()
+    while engine.pending['batch']:      # Collector holds the batch and waits for more
+        time.sleep(0.001)
+    live_future = engine.submit(image(), priority='live')
+    collector.join(5)
+
+    priority, batch = collected[0]
+    assert priority == 'live'
+    assert [request.future for request in batch] == [live_future]
+    assert [request.future for request in engine.pending['batch']] == batch_futures
+    assert engine.get_stats()['classes']['batch']['preempted'] == 1
+    engine.gate.withdraw(priority)
+
+
+def test_requests_complete_through_the_workers():
+    engine = make_engine(max_batch=4).start(warmup=False)
+    try:
+        futures = [engine.submit(image(value), priority=priority)
+                   for value, priority in enumerate(['batch', 'interactive', 'live', 'interactive'])]
+        results = [future.result(5) for future in futures]
+        assert all(isinstance(detections, list) for detections in results)
+        stats = engine.get_stats()
+        assert stats['completed'] == 4 and stats['failed'] == 0
+    finally:
+        engine.stop()
+
+
+def test_busy_responses_map_queue_full_to_429_and_overload_to_503():
+    service = pytest.importorskip('web_stream_service_simple')
+    body, status, headers = service.busy_response(QueueFull('interactive queue full', 3))
+    assert status == 429 and headers == {'Retry-After': '3'} and body['retry_after'] == 3
+    assert service.busy_response(Overloaded('too slow', 2))[1] == 503
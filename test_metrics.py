@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Metrics registry and Prometheus text exposition
+Each test renders its own registry: python3 -m pytest test_metrics.py
+"""
+
+import threading
+from urllib.request import urlopen
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, PipelineMetrics, MetricsHandler, start_metrics_server
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if not line.startswith('#')]
+
+
+def test_counter_with_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter('http_requests_total', 'HTTP requests', ('route', 'status'))
+    ok = requests.labels('/api/stats', 200)
+    ok.inc()
+    ok.inc(2)
+    requests.labels('/api/stats', 503).inc()
+
+    assert registry.render() == (
+        '# HELP http_requests_total HTTP requests\n'
+        '# TYPE http_requests_total counter\n'
+        'http_requests_total{route="/api/stats",status="200"} 3\n'
+        'http_requests_total{route="/api/stats",status="503"} 1\n'
+    )
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('errors_total', 'Errors', ('message',)).labels('bad "quote"\\ and\nnewline').inc()
+    assert sample_lines(registry.render()) == ['errors_total{message="bad \\"quote\\"\\\\ and\\nnewline"} 1']
+
+
+def test_gauge_value_and_scrape_time_function():
+    registry = MetricsRegistry()
+    temperature = registry.gauge('temperature_celsius', 'Temperature')
+    temperature.set(41.5)
+    temperature.inc(1)
+    depth = registry.gauge('queue_depth', 'Queue depth', ('queue',))
+    items = [1, 2]
+    depth.labels('frames').set_function(lambda: len(items))
+    depth.labels('broken').set_function(lambda: 1 / 0)
+
+    items.append(3)
+    assert sample_lines(registry.render()) == [
+        'queue_depth{queue="frames"} 3',
+        'queue_depth{queue="broken"} nan',
+        'temperature_celsius 42.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative_and_upper_inclusive():
+    registry = MetricsRegistry()
+    latency = registry.histogram('stage_seconds', 'Stage latency', ('stage',), buckets=(0.1, 0.5, 1))
+    decode = latency.labels('decode')
+    for value in (0.05, 0.1, 0.3, 2.0):
+        decode.observe(value)
+
+    assert registry.render() == (
+        '# HELP stage_seconds Stage latency\n'
+        '# TYPE stage_seconds histogram\n'
+        'stage_seconds_bucket{stage="decode",le="0.1"} 2\n'
+        'stage_seconds_bucket{stage="decode",le="0.5"} 3\n'
+        'stage_seconds_bucket{stage="decode",le="1"} 3\n'
+        'stage_seconds_bucket{stage="decode",le="+Inf"} 4\n'
+        'stage_seconds_sum{stage="decode"} 2.45\n'
+        'stage_seconds_count{stage="decode"} 4\n'
+    )
+
+
+def test_recordings_past_the_fold_threshold_are_not_lost(monkeypatch):
+    monkeypatch.setattr(metrics, 'FOLD_THRESHOLD', 10)
+    registry = MetricsRegistry()
+    frames = registry.counter('frames_total', 'Frames')
+    sizes = registry.histogram('sizes', 'Sizes', buckets=(10,))
+
+    def record():
+        for _ in range(1000):
+            frames.inc()
+            sizes.observe(5)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = sample_lines(registry.render())
+    assert 'frames_total 4000' in lines
+    assert 'sizes_bucket{le="10"} 4000' in lines
+
+
+def test_registration_is_idempotent_but_type_checked():
+    registry = MetricsRegistry()
+    assert registry.counter('a_total', 'A', ('x',)) is registry.counter('a_total', 'A', ('x',))
+    with pytest.raises(ValueError):
+        registry.gauge('a_total', 'A', ('x',))
+    with pytest.raises(ValueError):
+        registry.counter('a_total', 'A', ('y',))
+    with pytest.raises(ValueError):
+        registry.counter('a_total', 'A', ('x',)).labels('1', '2')
+
+
+def test_pipeline_metrics_share_names_across_streams():
+    registry = MetricsRegistry()
+    for stream_id in (5000, 5001):
+        pipeline = PipelineMetrics(stream_id, registry)
+        pipeline.frames_received.inc()
+        pipeline.drop('static')
+        pipeline.watch_queue('udp_backlog', lambda: 2)
+
+    lines = sample_lines(registry.render())
+    assert 'yolo_frames_received_total{stream="5000"} 1' in lines
+    assert 'yolo_frames_received_total{stream="5001"} 1' in lines
+    assert 'yolo_frames_dropped_total{stream="5001",reason="static"} 1' in lines
+    assert 'yolo_queue_depth{stream="5000",queue="udp_backlog"} 2' in lines
+
+
+def test_metrics_endpoint_serves_the_registry(monkeypatch):
+    registry = MetricsRegistry()
+    registry.counter('served_total', 'Served').inc()
+    monkeypatch.setattr(MetricsHandler, 'registry', registry)
+    server = start_metrics_server(0, host='127.0.0.1')
+    try:
+        with urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert 'served_total 1' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
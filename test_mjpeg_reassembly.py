@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+MJPEG reassembly and resync after lost datagrams
+Synthetic SOI/EOI-delimited frames: python3 -m pytest test_mjpeg_reassembly.py
+"""
+
+from mjpeg_reassembly import MjpegReassembler, SOI, EOI
+
+
+def frame(index, size=300):
+    """Fake JPEG whose body never contains an FF byte"""
+    body = bytes((index + i) % 255 for i in range(size))
+    return SOI + body + EOI
+
+
+def feed_all(reassembler, chunks):
+    frames = []
+    for chunk in chunks:
+        frames.extend(reassembler.feed(chunk))
+    return frames
+
+
+def test_frames_are_cut_at_markers():
+    reassembler = MjpegReassembler()
+    stream = frame(1) + frame(2) + frame(3)
+    assert feed_all(reassembler, [stream]) == [frame(1), frame(2), frame(3)]
+    assert reassembler.get_stats() == {'frames': 3, 'resyncs': 0, 'bytes_discarded': 0, 'buffered_bytes': 0}
+
+
+def test_one_byte_datagrams_give_the_same_frames():
+    reassembler = MjpegReassembler()
+    stream = b'startup noise' + frame(1) + frame(2)
+    frames = feed_all(reassembler, [stream[i:i + 1] for i in range(len(stream))])
+    assert frames == [frame(1), frame(2)]
+    # Joining the stream mid-frame is not a resync
+    assert reassembler.resyncs == 0
+    assert reassembler.bytes_discarded == len(b'startup noise')
+
+
+def test_frame_stays_buffered_while_the_caller_handles_it():
+    reassembler = MjpegReassembler()
+    frames = reassembler.feed(frame(1) + frame(2)[:50])
+    assert next(frames) == frame(1)
+    assert len(reassembler.buffer) == len(frame(1)) + 50
+    assert list(frames) == []
+    assert len(reassembler.buffer) == 50
+
+
+def test_lost_soi_drops_only_the_headless_tail():
+    resyncs = []
+    reassembler = MjpegReassembler(on_resync=lambda: resyncs.append(True))
+    headless = frame(2)[100:]
+    frames = feed_all(reassembler, [frame(1), headless, frame(3)])
+    assert frames == [frame(1), frame(3)]
+    assert len(resyncs) == 1
+    assert reassembler.bytes_discarded == len(headless)
+
+
+def test_lost_eoi_drops_the_frame_that_runs_into_the_next_soi():
+    reassembler = MjpegReassembler()
+    truncated = frame(2)[:-50]
+    frames = feed_all(reassembler, [frame(1), truncated, frame(3)[:120], frame(3)[120:]])
+    assert frames == [frame(1), frame(3)]
+    assert reassembler.resyncs == 1
+    assert reassembler.bytes_discarded == len(truncated)
+
+
+def test_split_marker_across_datagrams():
+    reassembler = MjpegReassembler()
+    data = b'junk' + frame(1)
+    # SOI split after its FF, EOI split the same way
+    chunks = [data[:5], data[5:-1], data[-1:]]
+    assert feed_all(reassembler, chunks) == [frame(1)]
+
+
+def test_runaway_frame_is_dropped_at_max_frame_bytes():
+    reassembler = MjpegReassembler(max_frame_bytes=1000)
+    assert feed_all(reassembler, [frame(1)]) == [frame(1)]
+    # EOI lost and no next SOI for a while: the buffer is capped instead of growing
+    runaway = frame(2, size=2000)[:-2]
+    assert feed_all(reassembler, [runaway[:600], runaway[600:]]) == []
+    assert reassembler.get_stats()['buffered_bytes'] == 0
+    assert reassembler.resyncs == 1
+    assert feed_all(reassembler, [frame(3)]) == [frame(3)]
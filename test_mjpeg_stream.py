@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+MJPEG per-client tier hysteresis
+Delivered-frame ratios are fed on a fake clock: python3 -m pytest test_mjpeg_stream.py
+"""
+
+import pytest
+
+import mjpeg_stream
+from mjpeg_stream import TierController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(mjpeg_stream.time, 'time', clock)
+    return clock
+
+
+def run(controller, clock, ratios):
+    """One evaluation per simulated second, returns the tier after each"""
+    tiers = []
+    for ratio in ratios:
+        clock.now += 1.0
+        tiers.append(controller.evaluate(ratio))
+    return tiers
+
+
+def make_controller(**kwargs):
+    settings = dict(tier_count=3, down_ratio=0.7, up_ratio=0.95, down_after=2, up_after=3,
+                    cooldown_s=0.0, probe_window_s=10.0, max_up_after=12)
+    settings.update(kwargs)
+    return TierController(**settings)
+
+
+def test_steps_down_only_after_consecutive_bad_seconds(clock):
+    controller = make_controller()
+    assert run(controller, clock, [0.5, 1.0, 0.5, 0.5]) == [0, 0, 0, 1]
+    assert run(controller, clock, [0.5, 0.5, 0.5, 0.5]) == [1, 2, 2, 2]   # Stops at the lowest tier
+    assert controller.switches == 2
+
+
+def test_middle_band_resets_both_counters(clock):
+    controller = make_controller()
+    assert run(controller, clock, [0.5, 0.8, 0.5, 0.8]) == [0, 0, 0, 0]
+    controller.tier = 1
+    assert run(controller, clock, [1.0, 1.0, 0.8, 1.0, 1.0]) == [1] * 5
+
+
+def test_steps_up_after_up_after_good_seconds(clock):
+    controller = make_controller()
+    controller.tier = 2
+    assert run(controller, clock, [1.0, 1.0, 1.0]) == [2, 2, 1]
+    assert run(controller, clock, [1.0, 1.0, 1.0]) == [1, 1, 0]
+    assert run(controller, clock, [1.0] * 5) == [0] * 5   # Already at full quality
+
+
+def test_cooldown_holds_the_tier(clock):
+    controller = make_controller(cooldown_s=5.0)
+    assert run(controller, clock, [0.5, 0.5]) == [0, 1]
+    # Bad seconds keep counting, but the next switch waits out the cooldown
+    assert run(controller, clock, [0.5, 0.5, 0.5, 0.5, 0.5]) == [1, 1, 1, 1, 2]
+
+
+def test_failed_probe_doubles_the_wait_up_to_the_cap(clock):
+    controller = make_controller()
+    controller.tier = 1
+    waits = []
+    for _ in range(4):
+        run(controller, clock, [1.0] * controller.up_wait)
+        assert controller.tier == 0
+        run(controller, clock, [0.5, 0.5])    # Step up fails within the probe window
+        assert controller.tier == 1
+        waits.append(controller.up_wait)
+    assert waits == [6, 12, 12, 12]
+    assert controller.failed_probes == 4
+
+
+def test_probe_that_holds_resets_the_wait(clock):
+    controller = make_controller()
+    controller.tier = 1
+    run(controller, clock, [1.0] * 3 + [0.5, 0.5])
+    assert controller.up_wait == 6
+
+    run(controller, clock, [1.0] * 6)
+    assert controller.tier == 0
+    run(controller, clock, [1.0] * 10)    # Held for probe_window_s
+    assert controller.up_wait == 3
+
+    # A step down after the window is not a failed probe
+    run(controller, clock, [0.5, 0.5])
+    assert controller.failed_probes == 1
+    assert controller.up_wait == 3
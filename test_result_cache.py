@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Result cache LRU eviction
+Synthetic keys and payloads: python3 -m pytest test_result_cache.py
+"""
+
+import json
+
+from result_cache import ResultCache, ENTRY_OVERHEAD_BYTES
+
+
+def entry_size(value):
+    return len(json.dumps(value, separators=(',', ':'))) + ENTRY_OVERHEAD_BYTES
+
+
+def test_keys_depend_on_content_model_and_thresholds():
+    cache = ResultCache()
+    key = cache.make_key(b'jpeg', 'yolov8s', (0.5, 0.45))
+    assert key == cache.make_key(b'jpeg', 'yolov8s', [0.5, 0.45])
+    assert key != cache.make_key(b'jpeg!', 'yolov8s', (0.5, 0.45))
+    assert key != cache.make_key(b'jpeg', 'yolov8n', (0.5, 0.45))
+    assert key != cache.make_key(b'jpeg', 'yolov8s', (0.25, 0.45))
+
+
+def test_evicts_least_recently_used_by_entries():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]  # 'b' is now least recently used
+    cache.put('c', [3])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+    stats = cache.get_stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_evicts_by_bytes_and_tracks_size():
+    value = {'detections': ['x' * 100]}
+    size = entry_size(value)
+    cache = ResultCache(max_entries=100, max_bytes=size * 3)
+    for key in 'abcd':
+        assert cache.put(key, value)
+
+    assert list(cache.entries) == ['b', 'c', 'd']
+    assert cache.current_bytes == size * 3
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_replacing_a_key_does_not_double_count():
+    cache = ResultCache()
+    cache.put('a', [1, 2, 3])
+    cache.put('a', [1])
+    assert len(cache.entries) == 1
+    assert cache.current_bytes == entry_size([1])
+
+
+def test_oversized_value_is_rejected_without_evicting():
+    cache = ResultCache(max_bytes=ENTRY_OVERHEAD_BYTES + 20)
+    assert cache.put('small', [1])
+    assert not cache.put('big', ['x' * 100])
+    assert cache.get('small') == [1]
+    assert cache.get('big') is None
+
+
+def test_clear_resets_bytes():
+    cache = ResultCache()
+    cache.put('a', [1])
+    cache.clear()
+    assert cache.get_stats()['entries'] == 0 and cache.current_bytes == 0
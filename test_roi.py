@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ROI containment and detection filtering
+Synthetic polygons and boxes, no camera or model needed: python3 -m pytest test_roi.py
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from roi import RegionOfInterest, load_roi_config
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+def detection(x1, y1, x2, y2, class_name='person'):
+    return {'bbox': [x1, y1, x2, y2], 'confidence': 0.9, 'class_id': 0, 'class_name': class_name}
+
+
+def test_rect_contains_edges_and_excludes_outside():
+    roi = RegionOfInterest([{'rect': [100, 100, 200, 200]}])
+    roi.polygons(FRAME_SHAPE)
+    inside = roi.contains([[100, 100], [150, 150], [200, 200], [99, 150], [150, 201]])
+    assert inside.tolist() == [True, True, True, False, False]
+
+
+def test_concave_polygon_excludes_its_notch():
+    # U shape: the notch between the arms is outside the polygon but inside its bounding box
+    roi = RegionOfInterest([{'polygon': [[0, 0], [300, 0], [300, 300], [200, 300], [200, 100],
+                                         [100, 100], [100, 300], [0, 300]]}])
+    roi.polygons(FRAME_SHAPE)
+    inside = roi.contains([[50, 200], [250, 200], [150, 50], [150, 200]])
+    assert inside.tolist() == [True, True, True, False]
+    assert roi.bbox(FRAME_SHAPE) == (0, 0, 300, 300)
+
+
+def test_normalized_regions_scale_and_clip_to_frame():
+    roi = RegionOfInterest([{'rect': [0.5, 0.5, 1.5, 1.0], 'normalized': True}])
+    assert roi.bbox(FRAME_SHAPE) == (320, 240, 640, 480)
+    assert roi.contains([[639, 479], [319, 479]]).tolist() == [True, False]
+
+
+def test_several_regions_are_combined():
+    roi = RegionOfInterest([{'rect': [0, 0, 10, 10]}, {'rect': [100, 100, 110, 110]}])
+    roi.polygons(FRAME_SHAPE)
+    assert roi.contains([[5, 5], [105, 105], [50, 50]]).tolist() == [True, True, False]
+    assert roi.bbox(FRAME_SHAPE) == (0, 0, 110, 110)
+
+
+def test_crop_is_a_view_with_its_offset():
+    roi = RegionOfInterest([{'rect': [100, 50, 300, 250]}])
+    frame = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    crop, offset = roi.crop(frame)
+    assert crop.shape == (200, 200, 3)
+    assert offset == (100, 50)
+    assert np.shares_memory(crop, frame)
+
+
+def test_filter_detections_shifts_to_frame_space_and_drops_outside_centers():
+    roi = RegionOfInterest([{'rect': [100, 100, 300, 300]}])
+    detections = [
+        detection(0, 0, 100, 100, 'inside'),        # Center (150, 150) after the offset
+        detection(150, 150, 250, 250, 'outside'),   # Center (300, 300) is on the edge: kept
+        detection(200, 200, 300, 300, 'far'),       # Center (350, 350)
+    ]
+    kept = roi.filter_detections(detections, (100, 100), FRAME_SHAPE)
+    assert [det['class_name'] for det in kept] == ['inside', 'outside']
+    assert kept[0]['bbox'] == [100, 100, 200, 200]
+
+
+def test_filter_detections_empty():
+    roi = RegionOfInterest([{'rect': [0, 0, 10, 10]}])
+    assert roi.filter_detections([], (0, 0), FRAME_SHAPE) == []
+
+
+@pytest.mark.parametrize('regions', [[], [{'circle': [1, 2, 3]}], [{'polygon': [[0, 0], [1, 1]]}]])
+def test_invalid_regions_are_rejected(regions):
+    with pytest.raises(ValueError):
+        RegionOfInterest(regions)
+
+
+def test_load_roi_config_picks_the_stream_or_default(monkeypatch):
+    config = {'5000': [{'rect': [0, 0, 10, 10]}], 'default': [{'rect': [0, 0, 20, 20]}]}
+    monkeypatch.delenv('ROI_CONFIG', raising=False)
+    monkeypatch.setenv('ROI', json.dumps(config))
+    assert load_roi_config(5000).bbox(FRAME_SHAPE) == (0, 0, 10, 10)
+    assert load_roi_config(5001).bbox(FRAME_SHAPE) == (0, 0, 20, 20)
+
+    monkeypatch.setenv('ROI', 'not json')
+    assert load_roi_config(5000) is None
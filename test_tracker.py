@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tracker association and ID persistence
+Synthetic moving boxes, no camera or model needed: python3 -m pytest test_tracker.py
+"""
+
+import numpy as np
+
+from tracker import MultiObjectTracker, iou_matrix, greedy_match, count_gt_id_switches
+
+
+def detection(x, y, size=40, confidence=0.9, class_id=0):
+    return {'bbox': [x, y, x + size, y + size], 'confidence': confidence, 'class_id': class_id}
+
+
+def test_iou_matrix_and_greedy_match():
+    iou = iou_matrix([[0, 0, 10, 10], [100, 100, 110, 110]], [[100, 100, 110, 110], [5, 0, 15, 10]])
+    assert np.allclose(iou, [[0.0, 1 / 3], [1.0, 0.0]])
+    assert greedy_match(iou, 0.3) == [(1, 0), (0, 1)]
+    assert greedy_match(iou, 0.5) == [(1, 0)]
+    assert iou_matrix([], [[0, 0, 1, 1]]).shape == (0, 1)
+
+
+def test_ids_persist_for_moving_objects():
+    tracker = MultiObjectTracker()
+    ids = None
+    for step in range(10):
+        tracked = tracker.update([detection(10 + step * 5, 10), detection(300 - step * 5, 200)])
+        step_ids = [det['track_id'] for det in tracked]
+        assert len(step_ids) == 2
+        ids = ids or step_ids
+        assert step_ids == ids
+    assert tracker.get_stats()['tracks_created'] == 2
+    assert tracker.id_switches == 0
+
+
+def test_prediction_keeps_id_through_skipped_frames():
+    tracker = MultiObjectTracker()
+    for step in range(5):
+        track_id = tracker.update([detection(10 + step * 10, 10)])[0]['track_id']
+
+    predicted = [tracker.predict() for _ in range(3)]
+    assert all(frame[0]['predicted'] and frame[0]['track_id'] == track_id for frame in predicted)
+    # Constant velocity carries the box forward while inference is skipped
+    assert predicted[-1][0]['bbox'][0] > 50
+
+    tracked = tracker.update([detection(90, 10)])
+    assert tracked[0]['track_id'] == track_id
+    assert not tracked[0]['predicted']
+
+
+def test_classes_are_not_associated():
+    tracker = MultiObjectTracker()
+    first = tracker.update([detection(10, 10, class_id=0)])[0]['track_id']
+    second = tracker.update([detection(10, 10, class_id=1)])[0]['track_id']
+    assert first != second
+
+
+def test_low_score_detection_extends_but_never_starts_tracks():
+    tracker = MultiObjectTracker()
+    assert tracker.update([detection(10, 10, confidence=0.2)]) == []
+    assert tracker.tracks_created == 0
+
+    track_id = tracker.update([detection(10, 10)])[0]['track_id']
+    tracked = tracker.update([detection(12, 10, confidence=0.2)])
+    assert [det['track_id'] for det in tracked] == [track_id]
+
+
+def test_tracks_expire_after_max_age_and_reappearance_counts_as_switch():
+    tracker = MultiObjectTracker(max_age=2)
+    tracker.update([detection(10, 10)])
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.get_stats()['active_tracks'] == 0
+
+    tracker.update([detection(10, 10)])
+    assert tracker.tracks_created == 2
+    assert tracker.id_switches == 1
+
+
+def test_min_hits_hides_tentative_tracks():
+    tracker = MultiObjectTracker(min_hits=2)
+    assert tracker.update([detection(10, 10)]) == []
+    assert len(tracker.update([detection(11, 10)])) == 1
+
+
+def test_count_gt_id_switches():
+    box = [0, 0, 10, 10]
+    frames = [
+        ([{'bbox': box, 'gt_id': 1}], [{'bbox': box, 'track_id': 7}]),
+        ([{'bbox': box, 'gt_id': 1}], [{'bbox': box, 'track_id': 7}]),
+        ([{'bbox': box, 'gt_id': 1}], [{'bbox': box, 'track_id': 8}]),
+    ]
+    assert count_gt_id_switches(frames) == 1
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Multi-object tracker (SORT/ByteTrack style) for YOLO detections
+Keeps a constant-velocity Kalman filter per track so boxes can be predicted
+on frames where inference is skipped, and assigns stable track IDs
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+
+# Kalman model from SORT: state [cx, cy, area, aspect, vx, vy, v_area], measurement [cx, cy, area, aspect]
+_F = np.eye(7, dtype=np.float64)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7, dtype=np.float64)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+_I7 = np.eye(7, dtype=np.float64)
+
+
+def boxes_to_measurements(boxes):
+    """Convert (N, 4) [x1, y1, x2, y2] boxes to (N, 4) [cx, cy, area, aspect]"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    w = np.maximum(boxes[:, 2] - boxes[:, 0], 1.0)
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / h], axis=1)
+
+
+def states_to_boxes(states):
+    """Convert (N, >=4) Kalman states to (N, 4) [x1, y1, x2, y2] boxes"""
+    area = np.maximum(states[:, 2], 1.0)
+    aspect = np.maximum(states[:, 3], 1e-3)
+    w = np.sqrt(area * aspect)
+    h = area / w
+    return np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2,
+                     states[:, 0] + w / 2, states[:, 1] + h / 2], axis=1)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Vectorized IoU between (N, 4) and (M, 4) boxes, returns (N, M)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)))
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+def greedy_match(iou, threshold):
+    """Match rows to columns by descending IoU, returns list of (row, col)"""
+    if iou.size == 0:
+        return []
+
+    pairs = np.argwhere(iou >= threshold)
+    order = np.argsort(-iou[pairs[:, 0], pairs[:, 1]], kind='stable')
+
+    matches = []
+    used_rows = set()
+    used_cols = set()
+    for row, col in pairs[order]:
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((int(row), int(col)))
+    return matches
+
+
+def detection_class(detection):
+    """Class key of a detection in either processor format"""
+    return detection.get('class_id', detection.get('class'))
+
+
+class MultiObjectTracker:
+    def __init__(self, iou_threshold=0.3, high_threshold=0.5, low_threshold=0.1,
+                 max_age=30, min_hits=1):
+        self.iou_threshold = iou_threshold    # Minimum IoU for a track/detection match
+        self.high_threshold = high_threshold  # Detections above this are matched first (ByteTrack)
+        self.low_threshold = low_threshold    # Low-score detections only extend existing tracks
+        self.max_age = max_age                # Frames a track survives without a match
+        self.min_hits = min_hits              # Matches before a track is reported
+
+        # Track state is kept in arrays so predict/update are batched
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        self.tracks = []  # Per-track metadata, parallel to the arrays
+        self.next_track_id = 1
+
+        # Recently lost tracks, used to count ID switches (track fragmentation)
+        self.lost_tracks = []
+
+        # Statistics
+        self.frame_index = 0
+        self.update_count = 0
+        self.predict_count = 0
+        self.update_time_total = 0.0
+        self.predict_time_total = 0.0
+        self.id_switches = 0
+        self.tracks_created = 0
+
+    def _step(self):
+        """Advance all tracks one frame with the constant-velocity model"""
+        self.frame_index += 1
+        if not self.tracks:
+            return
+
+        # Keep area non-negative
+        shrinking = (self.states[:, 2] + self.states[:, 6]) <= 0
+        self.states[shrinking, 6] = 0.0
+
+        self.states = self.states @ _F.T
+        self.covariances = _F @ self.covariances @ _F.T + _Q
+        for track in self.tracks:
+            track['time_since_update'] += 1
+            track['age'] += 1
+
+    def _correct(self, track_indices, measurements):
+        """Batched Kalman update of matched tracks"""
+        if len(track_indices) == 0:
+            return
+
+        idx = np.asarray(track_indices)
+        states = self.states[idx]
+        covariances = self.covariances[idx]
+
+        residuals = measurements - states[:, :4]
+        innovation = covariances[:, :4, :4] + _R
+        gain = covariances[:, :, :4] @ np.linalg.inv(innovation)
+        self.states[idx] = states + (gain @ residuals[:, :, None])[:, :, 0]
+        self.covariances[idx] = (_I7 - gain @ _H) @ covariances
+
+    def _remove_dead(self):
+        """Drop tracks that have not been matched for max_age frames"""
+        alive = np.array([track['time_since_update'] <= self.max_age for track in self.tracks], dtype=bool)
+        if alive.all():
+            return
+
+        boxes = states_to_boxes(self.states)
+        for i in np.flatnonzero(~alive):
+            self.lost_tracks.append({'box': boxes[i], 'class': self.tracks[i]['class'],
+                                     'frame': self.frame_index})
+        self.states = self.states[alive]
+        self.covariances = self.covariances[alive]
+        self.tracks = [track for track, keep in zip(self.tracks, alive) if keep]
+        self.lost_tracks = [lost for lost in self.lost_tracks
+                            if self.frame_index - lost['frame'] <= self.max_age]
+
+    def _match(self, track_indices, boxes, classes, det_indices):
+        """IoU-match a subset of tracks to a subset of detections of the same class"""
+        if not track_indices or not det_indices:
+            return [], track_indices, det_indices
+
+        track_boxes = states_to_boxes(self.states[track_indices])
+        iou = iou_matrix(track_boxes, boxes[det_indices])
+        track_classes = np.array([self.tracks[i]['class'] for i in track_indices], dtype=object)
+        det_classes = np.array([classes[j] for j in det_indices], dtype=object)
+        iou[track_classes[:, None] != det_classes[None, :]] = 0.0
+
+        pairs = greedy_match(iou, self.iou_threshold)
+        matches = [(track_indices[r], det_indices[c]) for r, c in pairs]
+        matched_tracks = {r for r, _ in pairs}
+        matched_dets = {c for _, c in pairs}
+        unmatched_tracks = [t for r, t in enumerate(track_indices) if r not in matched_tracks]
+        unmatched_dets = [d for c, d in enumerate(det_indices) if c not in matched_dets]
+        return matches, unmatched_tracks, unmatched_dets
+
+    def _output(self, predicted):
+        """Build detection dicts for reportable tracks"""
+        if not self.tracks:
+            return []
+
+        boxes = states_to_boxes(self.states)
+        results = []
+        for track, box in zip(self.tracks, boxes):
+            if track['hits'] < self.min_hits:
+                continue
+            if not predicted and track['time_since_update'] > 0:
+                continue
+
+            detection = dict(track['detection'])
+            detection['bbox'] = [int(round(v)) for v in box]
+            detection['track_id'] = track['track_id']
+            detection['predicted'] = predicted or track['time_since_update'] > 0
+            results.append(detection)
+        return results
+
+    def update(self, detections):
+        """Advance tracks one frame and correct them with fresh detections"""
+        start_time = time.perf_counter()
+        try:
+            self._step()
+
+            boxes = np.array([det['bbox'] for det in detections], dtype=np.float64).reshape(-1, 4)
+            scores = np.array([det.get('confidence', 1.0) for det in detections], dtype=np.float64)
+            classes = [detection_class(det) for det in detections]
+
+            high = [i for i in range(len(detections)) if scores[i] >= self.high_threshold]
+            low = [i for i in range(len(detections)) if self.low_threshold <= scores[i] < self.high_threshold]
+
+            # First pass: confident detections against all tracks
+            all_tracks = list(range(len(self.tracks)))
+            matches, remaining_tracks, unmatched_high = self._match(all_tracks, boxes, classes, high)
+
+            # Second pass: low-score detections only rescue existing tracks
+            low_matches, remaining_tracks, _ = self._match(remaining_tracks, boxes, classes, low)
+            matches += low_matches
+
+            if matches:
+                track_idx = [t for t, _ in matches]
+                self._correct(track_idx, boxes_to_measurements(boxes[[d for _, d in matches]]))
+                for t, d in matches:
+                    track = self.tracks[t]
+                    track['time_since_update'] = 0
+                    track['hits'] += 1
+                    track['detection'] = detections[d]
+
+            # Unmatched confident detections start new tracks
+            if unmatched_high:
+                self._start_tracks(unmatched_high, boxes, classes, detections, remaining_tracks)
+
+            self._remove_dead()
+            return self._output(predicted=False)
+
+        finally:
+            self.update_count += 1
+            self.update_time_total += time.perf_counter() - start_time
+
+    def _start_tracks(self, det_indices, boxes, classes, detections, unmatched_tracks):
+        """Create tracks for unmatched detections and count ID switches"""
+        # A new track on top of an unmatched or recently lost track of the same class is an ID switch
+        candidates = [(states_to_boxes(self.states[[t]])[0], self.tracks[t]['class']) for t in unmatched_tracks]
+        candidates += [(lost['box'], lost['class']) for lost in self.lost_tracks]
+        if candidates:
+            candidate_boxes = np.array([box for box, _ in candidates])
+            candidate_classes = np.array([cls for _, cls in candidates], dtype=object)
+            iou = iou_matrix(boxes[det_indices], candidate_boxes)
+            same_class = np.array([classes[d] for d in det_indices], dtype=object)[:, None] == candidate_classes[None, :]
+            self.id_switches += int(np.count_nonzero(((iou >= self.iou_threshold) & same_class).any(axis=1)))
+
+        measurements = boxes_to_measurements(boxes[det_indices])
+        new_states = np.zeros((len(det_indices), 7))
+        new_states[:, :4] = measurements
+        self.states = np.concatenate([self.states, new_states])
+        self.covariances = np.concatenate([self.covariances, np.repeat(_P0[None], len(det_indices), axis=0)])
+
+        for d in det_indices:
+            self.tracks.append({
+                'track_id': self.next_track_id,
+                'class': classes[d],
+                'detection': detections[d],
+                'hits': 1,
+                'age': 0,
+                'time_since_update': 0
+            })
+            self.next_track_id += 1
+            self.tracks_created += 1
+
+    def predict(self):
+        """Advance tracks one frame without detections (inference skipped)"""
+        start_time = time.perf_counter()
+        try:
+            self._step()
+            self._remove_dead()
+            return self._output(predicted=True)
+        finally:
+            self.predict_count += 1
+            self.predict_time_total += time.perf_counter() - start_time
+
+    def get_stats(self):
+        """Get tracker statistics"""
+        return {
+            "active_tracks": len(self.tracks),
+            "tracks_created": self.tracks_created,
+            "id_switches": self.id_switches,
+            "id_switch_rate": self.id_switches / max(1, self.tracks_created),
+            "avg_update_ms": self.update_time_total * 1000 / max(1, self.update_count),
+            "avg_predict_ms": self.predict_time_total * 1000 / max(1, self.predict_count)
+        }
+
+
+def create_tracker():
+    """Create tracker from TRACKER_* environment settings, None if disabled"""
+    if os.environ.get('TRACKER', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    tracker = MultiObjectTracker(
+        iou_threshold=float(os.environ.get('TRACKER_IOU', 0.3)),
+        max_age=int(os.environ.get('TRACKER_MAX_AGE', 30)),
+        min_hits=int(os.environ.get('TRACKER_MIN_HITS', 1))
+    )
+    print(f"🧭 Tracker enabled: iou={tracker.iou_threshold}, max_age={tracker.max_age}, min_hits={tracker.min_hits}")
+    return tracker
+
+
+def count_gt_id_switches(frames):
+    """Count MOT-style ID switches: a ground-truth object changes its assigned track ID"""
+    last_track_for_gt = {}
+    switches = 0
+    for gt_objects, tracked in frames:
+        if not gt_objects or not tracked:
+            continue
+        gt_boxes = [obj['bbox'] for obj in gt_objects]
+        track_boxes = [det['bbox'] for det in tracked]
+        for gt_i, tr_i in greedy_match(iou_matrix(gt_boxes, track_boxes), 0.5):
+            gt_id = gt_objects[gt_i]['gt_id']
+            track_id = tracked[tr_i]['track_id']
+            if gt_id in last_track_for_gt and last_track_for_gt[gt_id] != track_id:
+                switches += 1
+            last_track_for_gt[gt_id] = track_id
+    return switches
+
+
+def evaluate_sequence(path, inference_interval=1):
+    """Replay a recorded JSONL detection sequence through the tracker"""
+    tracker = MultiObjectTracker()
+    frames = []
+
+    with open(path) as f:
+        for frame_number, line in enumerate(f):
+            record = json.loads(line)
+            detections = record.get('detections', [])
+            if frame_number % inference_interval == 0:
+                tracked = tracker.update([dict(det) for det in detections])
+            else:
+                tracked = tracker.predict()
+            gt_objects = [det for det in detections if 'gt_id' in det]
+            frames.append((gt_objects, tracked))
+
+    stats = tracker.get_stats()
+    stats['frames'] = len(frames)
+    stats['inference_interval'] = inference_interval
+    stats['gt_id_switches'] = count_gt_id_switches(frames)
+    return stats
+
+
+if __name__ == "__main__":
+    # Usage: python3 tracker.py sequence.jsonl [inference_interval]
+    # Each line: {"detections": [{"bbox": [x1, y1, x2, y2], "confidence": 0.9, "class_id": 0, "gt_id": 3}, ...]}
+    if len(sys.argv) < 2:
+        print("Usage: python3 tracker.py <sequence.jsonl> [inference_interval]")
+        sys.exit(1)
+
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    print(json.dumps(evaluate_sequence(sys.argv[1], interval), indent=2))
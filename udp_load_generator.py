@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Synthetic MJPEG-over-UDP camera for benchmarking without hardware
+Replays test_image.jpg, a directory of images or a video file the way
+`libcamera-vid --codec mjpeg -o udp://host:port` sends it: JPEG frames back to back, cut into
+datagrams with no framing of their own. Frames are resized and encoded once up front; a still
+image is turned into a short cycle of frames with a moving bar and a counter, so the frames
+change like a live camera's and the motion gate does not treat the scene as static.
+
+Each datagram can be lost (in bursts with --loss-burst), held back behind later ones or sent
+twice; frames can be sent in bursts, and a frame's datagrams can be spread over the frame
+interval instead of leaving at line rate. Several consecutive ports are driven at once, one
+sender thread per port, each with its own impairments and statistics.
+
+Usage: python3 udp_load_generator.py [source, default test_image.jpg] [--port 5000] [--streams 1]
+       [--fps 30] [--size 640x480] [--fragment 1400] [--loss 0.01] [--reorder 0.01] [--duplicate 0.01]
+       [--burst 1] [--duration 10]; --help lists every option
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def parse_size(text):
+    """'640x480' -> (640, 480)"""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def encode_frame(image, size, quality):
+    if size is not None and (image.shape[1], image.shape[0]) != size:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError('JPEG encoding failed')
+    return encoded.tobytes()
+
+
+def animate(image, count):
+    """Frames that differ from each other: a bar sweeping across the image and a frame counter"""
+    frames = []
+    height, width = image.shape[:2]
+    bar = max(8, width // 16)
+    for index in range(count):
+        frame = image.copy()
+        x = index * (width - bar) // max(1, count - 1)
+        cv2.rectangle(frame, (x, 0), (x + bar, height - 1), (0, 255, 0), -1)
+        cv2.putText(frame, str(index), (10, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        frames.append(frame)
+    return frames
+
+
+def load_frames(source, size=None, quality=80, cycle=30, max_frames=300):
+    """Encoded JPEG frames from an image, a directory of images or a video file
+
+    JPEG files that need no resizing are sent as they are; everything else is encoded once here.
+    """
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source)
+                       if name.lower().endswith(IMAGE_EXTENSIONS))[:max_frames]
+        frames = []
+        for path in paths:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"⚠️ Skipping unreadable image {path}")
+                continue
+            if path.lower().endswith(('.jpg', '.jpeg')) and (size is None or (image.shape[1], image.shape[0]) == size):
+                with open(path, 'rb') as f:
+                    frames.append(f.read())
+            else:
+                frames.append(encode_frame(image, size, quality))
+        if len(frames) == 1:
+            # A single image would look like a static scene to the motion gate
+            return load_frames(paths[0], size, quality, cycle, max_frames)
+        return frames
+
+    if source.lower().endswith(IMAGE_EXTENSIONS):
+        image = cv2.imread(source)
+        if image is None:
+            raise ValueError(f"Cannot read image {source}")
+        if size is not None:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return [encode_frame(frame, None, quality) for frame in animate(image, cycle)]
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open {source}")
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ok, image = capture.read()
+            if not ok:
+                break
+            frames.append(encode_frame(image, size, quality))
+    finally:
+        capture.release()
+    return frames
+
+
+class Impairment:
+    """Per-datagram loss, reordering and duplication with a seeded random generator
+
+    Loss follows a two-state (Gilbert) model: the average rate is `loss` and losses come in runs
+    of loss_burst datagrams on average (1 = independent losses). A reordered datagram is held
+    back and sent after 1..reorder_depth later datagrams.
+    """
+
+    def __init__(self, loss=0.0, loss_burst=1.0, reorder=0.0, reorder_depth=3, duplicate=0.0, seed=None):
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_depth = max(1, reorder_depth)
+        self.duplicate = duplicate
+        self.rng = random.Random(seed)
+        self.leave_loss = 1.0 / max(1.0, loss_burst)
+        self.enter_loss = min(1.0, loss * self.leave_loss / (1.0 - loss)) if loss < 1.0 else 1.0
+        self.losing = False
+        self.held = []      # [datagrams still to pass, datagram]
+
+        # Statistics
+        self.dropped = 0
+        self.reordered = 0
+        self.duplicated = 0
+
+    @property
+    def active(self):
+        return bool(self.loss or self.reorder or self.duplicate)
+
+    def process(self, datagram):
+        """Datagrams to send now in place of this one"""
+        output = []
+        if self.held:
+            for entry in self.held:
+                entry[0] -= 1
+            output.extend(entry[1] for entry in self.held if entry[0] <= 0)
+            self.held = [entry for entry in self.held if entry[0] > 0]
+
+        rng = self.rng
+        if self.leave_loss >= 1.0:
+            self.losing = rng.random() < self.loss
+        else:
+            self.losing = rng.random() >= self.leave_loss if self.losing else rng.random() < self.enter_loss
+        if self.losing:
+            self.dropped += 1
+            return output
+        if self.reorder and rng.random() < self.reorder:
+            self.held.append([rng.randint(1, self.reorder_depth), datagram])
+            self.reordered += 1
+        else:
+            output.insert(0, datagram)
+        if self.duplicate and rng.random() < self.duplicate:
+            output.append(datagram)
+            self.duplicated += 1
+        return output
+
+    def flush(self):
+        """Datagrams still held back"""
+        held, self.held = [entry[1] for entry in self.held], []
+        return held
+
+
+class StreamSender:
+    """Sends the frame cycle to one port at a fixed rate on its own thread"""
+
+    def __init__(self, host, port, frames, fps=30.0, fragment_size=1400, burst=1, spread=0.0,
+                 impairment=None, frame_limit=None):
+        self.address = (host, port)
+        self.frames = frames
+        self.fps = fps
+        self.fragment_size = fragment_size
+        self.burst = max(1, burst)      # Frames sent back to back per burst, bursts every burst / fps
+        self.spread = spread            # Share of the frame interval a frame's datagrams are spread over
+        self.impairment = impairment or Impairment()
+        self.frame_limit = frame_limit
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.frames_sent = 0
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+        self.late_bursts = 0
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"udp-{self.address[1]}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def send(self, sock, datagrams):
+        for datagram in datagrams:
+            try:
+                sock.sendto(datagram, self.address)
+                self.datagrams_sent += 1
+                self.bytes_sent += len(datagram)
+            except OSError:
+                # ENOBUFS and the like: the datagram is lost, as it would be on a real link
+                self.send_errors += 1
+
+    def send_frame(self, sock, jpeg, interval):
+        view = memoryview(jpeg)
+        fragments = [view[offset:offset + self.fragment_size] for offset in range(0, len(view), self.fragment_size)]
+        pause = self.spread * interval / len(fragments) if self.spread else 0.0
+        impairment = self.impairment
+        for fragment in fragments:
+            self.send(sock, impairment.process(fragment) if impairment.active else (fragment,))
+            if pause:
+                time.sleep(pause)
+        self.frames_sent += 1
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        interval = 1.0 / self.fps
+        self.start_time = time.perf_counter()
+        next_time = self.start_time
+        index = 0
+        try:
+            while not self.stop_event.is_set():
+                for _ in range(self.burst):
+                    if self.frame_limit is not None and self.frames_sent >= self.frame_limit:
+                        return
+                    self.send_frame(sock, self.frames[index % len(self.frames)], interval)
+                    index += 1
+                next_time += interval * self.burst
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+                elif delay < -1.0:
+                    # More than a second behind: start over instead of sending a catch-up flood
+                    self.late_bursts += 1
+                    next_time = time.perf_counter()
+        finally:
+            self.send(sock, self.impairment.flush())
+            self.end_time = time.perf_counter()
+            sock.close()
+
+    def get_stats(self):
+        elapsed = max(1e-6, (self.end_time or time.perf_counter()) - (self.start_time or time.perf_counter()))
+        impairment = self.impairment
+        return {
+            'port': self.address[1],
+            'frames_sent': self.frames_sent,
+            'fps': round(self.frames_sent / elapsed, 2),
+            'datagrams_sent': self.datagrams_sent,
+            'mbps': round(self.bytes_sent * 8 / elapsed / 1e6, 2),
+            'dropped': impairment.dropped,
+            'reordered': impairment.reordered,
+            'duplicated': impairment.duplicated,
+            'send_errors': self.send_errors,
+            'late_bursts': self.late_bursts,
+            'elapsed': round(elapsed, 2)
+        }
+
+
+def run(args):
+    frames = load_frames(args.source, args.size, args.quality, args.cycle, args.max_frames)
+    if not frames:
+        raise ValueError(f"No frames in {args.source}")
+    sizes = [len(frame) for frame in frames]
+    print(f"🎞️ {len(frames)} frames from {args.source}, {np.mean(sizes) / 1024:.1f} KB average, "
+          f"~{np.mean(sizes) * args.fps * 8 / 1e6:.1f} Mbit/s per stream at {args.fps:g} fps")
+
+    senders = []
+    for index in range(args.streams):
+        impairment = Impairment(args.loss, args.loss_burst, args.reorder, args.reorder_depth, args.duplicate,
+                                None if args.seed is None else args.seed + index)
+        senders.append(StreamSender(args.host, args.port + index, frames, args.fps, args.fragment, args.burst,
+                                    args.spread, impairment, args.frames).start())
+    print(f"📡 Sending to {args.host}:{args.port}" + (f"-{args.port + args.streams - 1}" if args.streams > 1 else "")
+          + f", {args.fragment}-byte datagrams, loss {args.loss:.1%}, reorder {args.reorder:.1%}, "
+          f"duplicate {args.duplicate:.1%}, burst {args.burst}")
+
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    try:
+        while any(sender.thread.is_alive() for sender in senders):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            time.sleep(1.0)
+            if not args.quiet:
+                for sender in senders:
+                    stats = sender.get_stats()
+                    print(f"  :{stats['port']} {stats['frames_sent']:>7} frames {stats['fps']:>6.1f} fps "
+                          f"{stats['mbps']:>6.1f} Mbit/s  dropped {stats['dropped']} reordered {stats['reordered']} "
+                          f"duplicated {stats['duplicated']} errors {stats['send_errors']}")
+    except KeyboardInterrupt:
+        pass
+    for sender in senders:
+        sender.stop()
+    for sender in senders:
+        sender.join(timeout=5)
+
+    summary = [sender.get_stats() for sender in senders]
+    total_frames = sum(stats['frames_sent'] for stats in summary)
+    print(f"✅ {total_frames} frames sent on {len(senders)} stream(s), "
+          f"{sum(stats['mbps'] for stats in summary):.1f} Mbit/s total")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'source': args.source, 'frames_in_cycle': len(frames), 'streams': summary}, f, indent=2)
+    return summary
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Replay images or video as MJPEG over UDP with network impairments')
+    parser.add_argument('source', nargs='?', default='test_image.jpg', help='image, directory of images or video file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('UDP_PORT', 5000)), help='first port')
+    parser.add_argument('--streams', type=int, default=1, help='consecutive ports to drive at once')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--size', type=parse_size, default=None, help='WIDTHxHEIGHT (default: source size)')
+    parser.add_argument('--quality', type=int, default=80, help='JPEG quality for re-encoded frames')
+    parser.add_argument('--cycle', type=int, default=30, help='animated frames made from a still image')
+    parser.add_argument('--max-frames', type=int, default=300, help='frames loaded from a directory or video')
+    parser.add_argument('--fragment', type=int, default=1400, help='datagram payload size in bytes')
+    parser.add_argument('--loss', type=float, default=0.0, help='datagram loss probability')
+    parser.add_argument('--loss-burst', type=float, default=1.0, help='average length of a loss run')
+    parser.add_argument('--reorder', type=float, default=0.0, help='probability a datagram is held back')
+    parser.add_argument('--reorder-depth', type=int, default=3, help='held datagrams pass up to this many others')
+    parser.add_argument('--duplicate', type=float, default=0.0, help='probability a datagram is sent twice')
+    parser.add_argument('--burst', type=int, default=1, help='frames sent back to back per burst')
+    parser.add_argument('--spread', type=float, default=0.0,
+                        help="share of the frame interval a frame's datagrams are paced over (0 = line rate)")
+    parser.add_argument('--duration', type=float, default=None, help='seconds to run (default: until Ctrl+C)')
+    parser.add_argument('--frames', type=int, default=None, help='frames to send per stream')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for reproducible impairments')
+    parser.add_argument('--json', default=None, help='write the final per-stream statistics to this file')
+    parser.add_argument('--quiet', action='store_true', help='no per-second progress lines')
+    args = parser.parse_args(argv)
+    if args.fragment < 1 or args.fragment > 65507:
+        parser.error('--fragment must be between 1 and 65507')
+    for name in ('loss', 'reorder', 'duplicate'):
+        if not 0.0 <= getattr(args, name) <= 1.0:
+            parser.error(f'--{name} must be between 0 and 1')
+    if args.loss >= 1.0 and args.loss_burst > 1.0:
+        parser.error('--loss-burst needs --loss below 1')
+    return args
+
+
+if __name__ == "__main__":
+    try:
+        run(parse_args(sys.argv[1:]))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Offline detection jobs for uploaded video clips
+Uploads are copied to a spool file in fixed-size chunks as they arrive, never held in memory.
+A single job worker then decodes the clip chunk by chunk (skipped frames are only grabbed, not
+converted) and keeps a bounded window of frames in flight on the shared inference engine, so
+frames are batched at full size while decoding of the next chunk overlaps inference of the
+current one. Frames are submitted in the engine's batch class, so live and interactive requests
+overtake them at every batch boundary; jobs run one at a time and at most max_pending are admitted.
+
+Progress and per-frame results are kept in memory for the most recent jobs; spool files are
+removed when a job finishes. A frame whose result does not arrive within frame_timeout of its
+submission is marked failed, so a stuck backend cannot hold the worker forever. The spool
+directory and the worker thread are created with the first job.
+"""
+
+import os
+import time
+import uuid
+import queue
+import shutil
+import tempfile
+import threading
+from collections import deque, Counter
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from inference_engine import EngineBusy
+from metrics import counter, gauge
+from startup_profile import lazy_import
+
+cv2 = lazy_import('cv2', globals())
+
+JOB_STATES = ('uploading', 'queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+FRAMES_PROCESSED = counter('yolo_video_frames_total', 'Video job frames by outcome', ('outcome',))
+FRAMES_INFERRED = FRAMES_PROCESSED.labels('inferred')
+FRAMES_SKIPPED = FRAMES_PROCESSED.labels('skipped')
+FRAMES_FAILED = FRAMES_PROCESSED.labels('failed')
+JOBS_ACTIVE = gauge('yolo_video_jobs', 'Video jobs by state', ('state',))
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class TooManyJobs(Exception):
+    """Raised when max_pending jobs are already waiting or running; retry_after in seconds"""
+
+    def __init__(self, message, retry_after=30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class VideoJob:
+    def __init__(self, filename, spool_path, stride=1, confidence=0.5, iou_threshold=0.4):
+        self.id = uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.spool_path = spool_path
+        self.stride = max(1, int(stride))
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self.status = 'uploading'
+        self.error = None
+        self.cancelled = False
+
+        self.bytes_received = 0
+        self.frames_total = None
+        self.source_fps = None
+        self.frames_decoded = 0
+        self.frames_inferred = 0
+        self.frames_failed = 0
+        self.results = []       # {'frame', 'time', 'detections'} per inferred frame, in frame order
+        self.class_counts = Counter()
+
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def progress(self):
+        if self.status == 'done':
+            return 1.0
+        if not self.frames_total:
+            return 0.0
+        return min(1.0, self.frames_inferred * self.stride / self.frames_total)
+
+    def get_status(self):
+        """Job progress and summary (without the per-frame results)"""
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'error': self.error,
+            'bytes': self.bytes_received,
+            'stride': self.stride,
+            'confidence': self.confidence,
+            'nms': self.iou_threshold,
+            'frames_total': self.frames_total,
+            'source_fps': self.source_fps,
+            'frames_decoded': self.frames_decoded,
+            'frames_inferred': self.frames_inferred,
+            'frames_failed': self.frames_failed,
+            'progress': round(self.progress(), 3),
+            'throughput_fps': round(self.frames_inferred / elapsed, 1) if elapsed > 0 else 0.0,
+            'elapsed': round(elapsed, 2),
+            'created': self.created,
+            'finished': self.finished,
+            'objects': dict(self.class_counts)
+        }
+
+
+class VideoJobManager:
+    def __init__(self, get_engine, spool_dir, max_upload_bytes=512 * 1024 * 1024, chunk_frames=16,
+                 inflight=None, keep_jobs=20, max_pending=4, frame_timeout=30.0):
+        self.get_engine = get_engine
+        self.spool_dir = spool_dir
+        self.max_upload_bytes = max_upload_bytes
+        self.chunk_frames = chunk_frames
+        self.inflight = inflight            # None = two engine batches
+        self.keep_jobs = keep_jobs
+        self.max_pending = max_pending      # Unfinished jobs admitted at once
+        self.frame_timeout = frame_timeout  # Seconds from submission until a frame counts as failed
+
+        self.jobs = {}                      # Insertion ordered, oldest first
+        self.jobs_lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.busy_retries = 0
+        for state in JOB_STATES:
+            JOBS_ACTIVE.labels(state).set_function(lambda state=state: self.count(state))
+
+        self.worker = None                  # Started with the first job
+
+    def ensure_started(self):
+        """Create the spool directory and start the worker on first use"""
+        with self.jobs_lock:
+            if self.worker is not None:
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.worker = threading.Thread(target=self.worker_loop, name='video-jobs', daemon=True)
+            self.worker.start()
+
+    def count(self, state):
+        with self.jobs_lock:
+            return sum(1 for job in self.jobs.values() if job.status == state)
+
+    def create_job(self, filename, stride=1, confidence=0.5, iou_threshold=0.4):
+        """Register a job whose upload is about to be spooled; raises TooManyJobs past max_pending"""
+        self.ensure_started()
+        extension = os.path.splitext(filename or '')[1][:8] or '.bin'
+        job = VideoJob(filename, None, stride, confidence, iou_threshold)
+        job.spool_path = os.path.join(self.spool_dir, f"{job.id}{extension}")
+        with self.jobs_lock:
+            unfinished = [other for other in self.jobs.values() if other.status not in FINISHED_STATES]
+            if len(unfinished) >= self.max_pending:
+                raise TooManyJobs(f"{len(unfinished)} video jobs already pending", self.retry_estimate(unfinished))
+            self.jobs[job.id] = job
+            self.prune()
+        return job
+
+    def retry_estimate(self, jobs):
+        """Seconds until the running job is likely done, from its progress so far"""
+        for job in jobs:
+            progress = job.progress()
+            if job.status == 'running' and progress > 0:
+                elapsed = time.time() - job.started
+                return max(1, int(elapsed / progress - elapsed) + 1)
+        return 30
+
+    def prune(self):
+        """Forget the oldest finished jobs beyond keep_jobs (jobs_lock held)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.keep_jobs)]:
+            del self.jobs[job_id]
+
+    def spool_chunk(self, job, spool_file, chunk):
+        """Append one received chunk; raises UploadTooLarge past the size limit"""
+        job.bytes_received += len(chunk)
+        if job.bytes_received > self.max_upload_bytes:
+            raise UploadTooLarge(f"video larger than {self.max_upload_bytes} bytes")
+        spool_file.write(chunk)
+
+    def spool(self, job, stream):
+        """Copy a file-like upload stream to the job's spool file chunk by chunk"""
+        with open(job.spool_path, 'wb') as spool_file:
+            while True:
+                chunk = stream.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                self.spool_chunk(job, spool_file, chunk)
+
+    def start(self, job):
+        """Queue a fully spooled job for processing"""
+        if job.cancelled:
+            self.remove_spool(job)
+            return
+        if job.bytes_received == 0:
+            self.fail(job, 'Empty upload')
+            return
+        job.status = 'queued'
+        self.pending.put(job)
+
+    def fail(self, job, error):
+        job.status = 'failed'
+        job.error = error
+        job.finished = time.time()
+        self.remove_spool(job)
+
+    def remove_spool(self, job):
+        try:
+            os.remove(job.spool_path)
+        except OSError:
+            pass
+
+    def get(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Stop a job (at the next frame) and forget it; False if unknown"""
+        with self.jobs_lock:
+            job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.cancelled = True
+        if job.status in ('uploading', 'queued'):
+            job.status = 'cancelled'
+            job.finished = time.time()
+            self.remove_spool(job)
+        return True
+
+    def results(self, job_id, offset=0, limit=500):
+        """Slice of a job's per-frame results, None if the job is unknown"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return {
+            'id': job.id,
+            'status': job.status,
+            'offset': offset,
+            'total': len(job.results),
+            'results': job.results[offset:offset + limit]
+        }
+
+    def list_jobs(self):
+        with self.jobs_lock:
+            jobs = list(self.jobs.values())
+        return [job.get_status() for job in reversed(jobs)]
+
+    def worker_loop(self):
+        while True:
+            job = self.pending.get()
+            if job.cancelled:
+                continue
+            try:
+                self.process(job)
+            except Exception as e:
+                print(f"❌ Video job {job.id} failed: {e}")
+                self.fail(job, str(e))
+            finally:
+                self.remove_spool(job)
+
+    def submit_frame(self, engine, job, image):
+        """Submit one frame in the batch class, backing off while the engine does not admit it
+
+        Raises TimeoutError when the engine admits nothing for frame_timeout (stalled engine).
+        """
+        deadline = time.time() + self.frame_timeout
+        while True:
+            try:
+                return engine.submit(image, job.confidence, job.iou_threshold, priority='batch')
+            except EngineBusy:
+                if time.time() > deadline:
+                    raise TimeoutError(f"inference engine admitted no frame for {self.frame_timeout:.0f} s")
+                self.busy_retries += 1
+                time.sleep(0.005)
+
+    def collect(self, job, window, limit):
+        """Store results of the oldest in-flight frames until at most limit remain"""
+        while len(window) > limit:
+            frame_index, future, deadline = window.popleft()
+            result = {
+                'frame': frame_index,
+                'time': round(frame_index / job.source_fps, 3) if job.source_fps else None,
+            }
+            try:
+                detections = future.result(max(0.0, deadline - time.time()))
+            except FutureTimeoutError:
+                future.cancel()
+                detections, error = None, 'inference timed out'
+            except Exception as e:
+                detections, error = None, str(e)
+            if detections is None:
+                job.results.append(dict(result, detections=[], error=error))
+                job.frames_failed += 1
+                FRAMES_FAILED.inc()
+                continue
+            job.results.append(dict(result, detections=detections))
+            job.class_counts.update(detection['class_name'] for detection in detections)
+            job.frames_inferred += 1
+            FRAMES_INFERRED.inc()
+
+    def process(self, job):
+        capture = cv2.VideoCapture(job.spool_path)
+        if not capture.isOpened():
+            raise ValueError('Unsupported or corrupt video')
+        try:
+            engine = self.get_engine()
+            inflight = self.inflight or engine.max_batch * 2
+            # Containers without a frame count report 0 or a negative value
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            job.frames_total = frame_count if frame_count > 0 else None
+            job.source_fps = capture.get(cv2.CAP_PROP_FPS) or None
+            job.status = 'running'
+            job.started = time.time()
+            print(f"🎞️ Video job {job.id}: {job.filename}, {job.frames_total or '?'} frames, stride {job.stride}")
+
+            window = deque()    # (frame index, future, result deadline), oldest first
+            frame_index = 0
+            while not job.cancelled:
+                # Decode a chunk: frames skipped by the stride are grabbed but never converted
+                chunk = []
+                while len(chunk) < self.chunk_frames:
+                    if frame_index % job.stride == 0:
+                        ok, image = capture.read()
+                        if not ok:
+                            break
+                        chunk.append((frame_index, image))
+                    else:
+                        if not capture.grab():
+                            break
+                        FRAMES_SKIPPED.inc()
+                    frame_index += 1
+                job.frames_decoded += len(chunk)
+                if not chunk:
+                    break
+
+                for index, image in chunk:
+                    future = self.submit_frame(engine, job, image)
+                    window.append((index, future, time.time() + self.frame_timeout))
+                    self.collect(job, window, inflight)
+            self.collect(job, window, 0)
+        finally:
+            capture.release()
+
+        job.finished = time.time()
+        if job.cancelled:
+            job.status = 'cancelled'
+            return
+        job.frames_total = frame_index
+        job.status = 'done'
+        status = job.get_status()
+        print(f"✅ Video job {job.id}: {job.frames_inferred} frames in {status['elapsed']:.1f} s "
+              f"({status['throughput_fps']} fps), top objects {job.class_counts.most_common(5)}")
+
+    def get_stats(self):
+        with self.jobs_lock:
+            jobs = list(self.jobs.values())
+        return {
+            'jobs': {state: sum(1 for job in jobs if job.status == state) for state in JOB_STATES},
+            'queued': self.pending.qsize(),
+            'busy_retries': self.busy_retries,
+            'spool_free_bytes': shutil.disk_usage(self.spool_dir).free if os.path.isdir(self.spool_dir) else None
+        }
+
+
+def create_video_job_manager(get_engine):
+    """Video job manager from VIDEO_* environment settings; get_engine returns the shared engine"""
+    return VideoJobManager(
+        get_engine,
+        spool_dir=os.environ.get('VIDEO_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'yolo_video_spool')),
+        max_upload_bytes=int(os.environ.get('VIDEO_MAX_BYTES', 512 * 1024 * 1024)),
+        chunk_frames=int(os.environ.get('VIDEO_CHUNK_FRAMES', 16)),
+        inflight=int(os.environ['VIDEO_INFLIGHT']) if os.environ.get('VIDEO_INFLIGHT') else None,
+        keep_jobs=int(os.environ.get('VIDEO_KEEP_JOBS', 20)),
+        max_pending=int(os.environ.get('VIDEO_MAX_PENDING', 4)),
+        frame_timeout=float(os.environ.get('VIDEO_FRAME_TIMEOUT', 30.0))
+    )
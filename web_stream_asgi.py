@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) serving mode for the web service
+The Flask app of web_stream_service_simple is served unchanged through a WSGI-to-ASGI adapter
+(a2wsgi) on a bounded thread pool, so every API route has one implementation. Only the
+long-lived endpoints are async-native: MJPEG and SSE viewers are async generators woken by the
+broadcasters' pollers, and snapshot long-polls await the next frame, so an idle viewer costs a
+socket and a suspended task instead of a thread.
+
+Concurrency is bounded: at most STREAM_MAX_CLIENTS viewers (MJPEG + SSE) and API_CONCURRENCY
+uploads in progress; beyond that requests get 503 with Retry-After.
+
+Run with python3 web_stream_asgi.py (uvicorn). Both modes can be compared with serve_benchmark.py.
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import web_stream_service_simple as service
+from web_stream_service_simple import (HTTP_REQUESTS, HTTP_SECONDS, mjpeg_broadcaster, event_broadcaster,
+                                       update_stats, poll_detections, warm_up, snapshot_store, snapshot_params)
+from mjpeg_stream import BOUNDARY
+from startup_profile import STARTUP
+
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 200))
+API_CONCURRENCY = int(os.environ.get('API_CONCURRENCY', 8))
+
+# Uploads hold a pool thread while they wait for inference; the other half serves the rest of the API
+flask_app = WSGIMiddleware(service.app, workers=API_CONCURRENCY * 2)
+uploads_in_progress = 0
+
+
+async def send_response(send, body, content_type, status=200, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200, headers=()):
+    await send_response(send, json.dumps(data).encode(), 'application/json', status, headers)
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_stream(receive, send, chunks, content_type, headers):
+    """Stream an async generator until it ends or the client goes away"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', content_type.encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers]
+    })
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        async for chunk in chunks:
+            if disconnected.done():
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await chunks.aclose()
+
+
+def query_params(scope):
+    return {name: values[0] for name, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+
+
+def remote_addr(scope):
+    client = scope.get('client')
+    return client[0] if client else None
+
+
+def stream_slots_full():
+    return len(mjpeg_broadcaster.clients) + len(event_broadcaster.clients) >= STREAM_MAX_CLIENTS
+
+
+async def stream_mjpg(scope, receive, send):
+    """Live processed frames as multipart MJPEG; ?tier=full|half|quarter pins the quality tier"""
+    if stream_slots_full():
+        await send_json(send, {'success': False, 'message': 'Too many viewers'}, 503, [('Retry-After', '5')])
+        return
+    client = mjpeg_broadcaster.subscribe(remote_addr(scope), query_params(scope).get('tier'))
+    await send_stream(receive, send, mjpeg_broadcaster.async_stream(client),
+                      f'multipart/x-mixed-replace; boundary={BOUNDARY}',
+                      [('Cache-Control', 'no-cache, no-store'), ('X-Accel-Buffering', 'no')])
+
+
+async def stream_events(scope, receive, send):
+    """Server-Sent Events: 'stats' and 'detections' pushed as they are produced"""
+    if stream_slots_full():
+        await send_json(send, {'success': False, 'message': 'Too many viewers'}, 503, [('Retry-After', '5')])
+        return
+    client = event_broadcaster.subscribe(remote_addr(scope))
+    await send_stream(receive, send, event_broadcaster.async_stream(client), 'text/event-stream',
+                      [('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')])
+
+
+async def get_snapshot(scope, receive, send):
+    """Latest processed frame as JPEG; ?after=N long-polls on the loop instead of holding a pool thread"""
+    try:
+        after, timeout, width = snapshot_params(query_params(scope))
+    except ValueError as e:
+        await send_json(send, {'success': False, 'message': f'Invalid parameter: {e}'}, 400)
+        return
+    snapshot = (snapshot_store.latest() if after is None
+                else await snapshot_store.async_wait_for_frame(after, timeout))
+    if snapshot is None:
+        status, message, headers = snapshot_store.empty_response(after is not None)
+        if message:
+            await send_json(send, {'success': False, 'message': message}, status, list(headers.items()))
+        else:
+            await send_response(send, b'', 'image/jpeg', status, list(headers.items()))
+        return
+    if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+    if width is not None and width not in snapshot.thumbnails:
+        # First request for this width on this frame encodes it off the loop
+        status, body, headers = await asyncio.get_running_loop().run_in_executor(
+            None, snapshot_store.response, snapshot, width, if_none_match)
+    else:
+        status, body, headers = snapshot_store.response(snapshot, width, if_none_match)
+    await send_response(send, body, 'image/jpeg', status, list(headers.items()))
+
+
+# Served on the event loop; every other route goes to the Flask app
+ASYNC_ROUTES = {
+    '/stream.mjpg': stream_mjpg,
+    '/api/events': stream_events,
+    '/api/snapshot': get_snapshot,
+}
+
+
+async def process_image(scope, receive, send):
+    """Admission for uploads before they take a pool thread"""
+    global uploads_in_progress
+    if uploads_in_progress >= API_CONCURRENCY:
+        await send_json(send, {'success': False, 'message': 'Too many uploads in progress'}, 503,
+                        [('Retry-After', '1')])
+        return
+    uploads_in_progress += 1
+    try:
+        await flask_app(scope, receive, send)
+    finally:
+        uploads_in_progress -= 1
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                # The model warms up in the background so the server starts accepting right away
+                threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+                threading.Thread(target=update_stats, daemon=True).start()
+                threading.Thread(target=poll_detections, daemon=True).start()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if service.inference_engine is not None:
+                service.inference_engine.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = ASYNC_ROUTES.get(scope['path']) if scope['method'] == 'GET' else None
+    if handler is None:
+        # Flask records its own request metrics
+        if scope['path'] == '/api/process_image' and scope['method'] == 'POST':
+            await process_image(scope, receive, send)
+        else:
+            await flask_app(scope, receive, send)
+        return
+
+    start_time = time.perf_counter()
+    STARTUP.mark('first request')
+    route = scope['path']
+
+    async def send_recorded(message):
+        if message['type'] == 'http.response.start':
+            HTTP_REQUESTS.labels(route, message['status']).inc()
+            HTTP_SECONDS.labels(route).observe(time.perf_counter() - start_time)
+        await send(message)
+
+    await handler(scope, receive, send_recorded)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('WEB_PORT', 8080))
+    print("🚀 Starting Hailo YOLO Web Service (async)...")
+    print(f"🌐 Web interface will be available at: http://0.0.0.0:{port}")
+    print(f"👥 Up to {STREAM_MAX_CLIENTS} viewers, {API_CONCURRENCY} concurrent uploads")
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning',
+                limit_concurrency=STREAM_MAX_CLIENTS + API_CONCURRENCY * 4)
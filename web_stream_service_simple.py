@@ -1,24 +1,32 @@
 #!/usr/bin/env python3
 """
 Simple web stream service for Hailo YOLO processing
+OpenCV, NumPy and the inference backend are loaded on first use and the model warms up in the
+background, so the page and /health are served right after start; /api/startup shows where
+cold-start time went.
 """
 
-from flask import Flask, Response, render_template_string, request, jsonify
+from startup_profile import STARTUP, lazy_import
+from flask import Flask, Response, render_template_string, request, jsonify, g
+import os
 import time
 import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import json
 import base64
 from io import BytesIO
-import cv2
-import numpy as np
-# Hailo imports - try to import from hailo_wrapper
-try:
-    from hailo_wrapper import HailoYOLOProcessor
-    HAILO_AVAILABLE = True
-    print("✅ Hailo wrapper imported successfully")
-except ImportError as e:
-    HAILO_AVAILABLE = False
-    print(f"❌ Hailo wrapper not available: {e}")
+from result_cache import create_result_cache
+from frame_ring import open_frame_ring
+from device_state import open_device_state, device_status
+from mjpeg_stream import create_mjpeg_broadcaster, BOUNDARY
+from event_stream import create_event_broadcaster, compact_detections
+from snapshot import create_snapshot_store, jpeg_size
+from inference_engine import create_inference_engine, EngineBusy, QueueFull
+from video_jobs import create_video_job_manager, UploadTooLarge, TooManyJobs
+from metrics import REGISTRY, CONTENT_TYPE, counter, gauge, histogram
+
+cv2 = lazy_import('cv2', globals())
+np = lazy_import('numpy', globals(), 'np')
 
 app = Flask(__name__)
 
@@ -30,9 +38,19 @@ processing_stats = {
     "objects_detected": 0,
     "last_update": time.time(),
     "hailo_status": "Unknown",
-    "camera_status": "Unknown"
+    "camera_status": "Unknown",
+    "processor_status": "Unknown"
 }
-hailo_processor = None
+# Written by the stats thread and request threads
+processing_stats_lock = threading.Lock()
+inference_engine = None
+inference_engine_lock = threading.Lock()
+result_cache = create_result_cache()
+frame_ring = None
+# Request threads and the pollers attach and re-attach the ring concurrently
+frame_ring_lock = threading.Lock()
+device_state = None
+event_broadcaster = create_event_broadcaster()
 
 # HTML template for the web interface
 HTML_TEMPLATE = """
@@ -48,6 +66,10 @@ HTML_TEMPLATE = """
         .status.connected { background-color: #d4edda; color: #155724; border: 1px solid #c3e6cb; }
         .status.disconnected { background-color: #f8d7da; color: #721c24; border: 1px solid #f5c6cb; }
         .status.unknown { background-color: #fff3cd; color: #856404; border: 1px solid #ffeaa7; }
+        .video { position: relative; }
+        .video img { width: 100%; display: block; border-radius: 5px; background: #000; }
+        .video canvas { position: absolute; left: 0; top: 0; width: 100%; height: 100%; pointer-events: none; }
+        .detections { min-height: 20px; color: #495057; font-family: monospace; }
         .upload-form { margin: 20px 0; padding: 20px; background-color: #f8f9fa; border-radius: 5px; }
         .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin: 20px 0; }
         .stat-card { background: #f8f9fa; padding: 15px; border-radius: 5px; text-align: center; }
@@ -76,6 +98,13 @@ HTML_TEMPLATE = """
             </div>
         </div>
         
+        <div class="detections" id="detections"></div>
+        
+        <div class="video">
+            <img id="stream" src="/stream.mjpg" alt="Live stream">
+            <canvas id="overlay"></canvas>
+        </div>
+        
         <div class="status" id="hailo-status">
             <strong>Hailo Status:</strong> <span id="hailo-text">Unknown</span>
         </div>
@@ -87,12 +116,22 @@ HTML_TEMPLATE = """
         <div class="upload-form">
             <h3>📸 Upload Image for Hailo Processing</h3>
             <form id="uploadForm">
-                <input type="file" id="imageFile" accept="image/*" required>
+                <input type="file" id="imageFile" accept="image/*" multiple required>
                 <button type="submit">Process with Hailo</button>
             </form>
             <div id="result"></div>
         </div>
         
+        <div class="upload-form">
+            <h3>🎞️ Process Video Clip</h3>
+            <form id="videoForm">
+                <input type="file" id="videoFile" accept="video/*" required>
+                <label>Every <input type="number" id="videoStride" value="1" min="1" style="width: 50px;"> frame(s)</label>
+                <button type="submit">Start Job</button>
+            </form>
+            <div id="videoResult"></div>
+        </div>
+        
         <div style="margin-top: 30px; text-align: center; color: #6c757d;">
             <p>🌐 Access this interface from any device on your network</p>
             <p>📱 Works on mobile and desktop browsers</p>
@@ -100,10 +139,7 @@ HTML_TEMPLATE = """
     </div>
 
     <script>
-        function updateStats() {
-            fetch('/api/stats')
-                .then(response => response.json())
-                .then(data => {
+        function showStats(data) {
                     document.getElementById('fps').textContent = data.fps.toFixed(1);
                     document.getElementById('objects').textContent = data.objects_detected;
                     
@@ -130,7 +166,35 @@ HTML_TEMPLATE = """
                     } else {
                         cameraStatus.className = 'status unknown';
                     }
-                })
+        }
+
+        function showDetections(data) {
+            // Each detection: [class, confidence, x1, y1, x2, y2, track id]
+            const labels = data.detections.map(d => d[0] + (d[6] !== null ? ' #' + d[6] : '') + ' ' + d[1].toFixed(2));
+            document.getElementById('detections').textContent = labels.join(', ');
+
+            // Clean frames: draw the overlay here instead of on the server. Boxes are in source-frame
+            // pixels, so the canvas gets the source size and CSS stretches it over the (maybe downscaled) image
+            const img = document.getElementById('stream');
+            const canvas = document.getElementById('overlay');
+            canvas.width = data.frame_size ? data.frame_size[0] : img.naturalWidth;
+            canvas.height = data.frame_size ? data.frame_size[1] : img.naturalHeight;
+            const ctx = canvas.getContext('2d');
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+            if (data.overlay) return;
+            ctx.strokeStyle = ctx.fillStyle = '#00ff00';
+            ctx.lineWidth = 2;
+            ctx.font = '16px Arial';
+            data.detections.forEach((d, i) => {
+                ctx.strokeRect(d[2], d[3], d[4] - d[2], d[5] - d[3]);
+                ctx.fillText(labels[i], d[2], Math.max(16, d[3] - 5));
+            });
+        }
+
+        function updateStats() {
+            fetch('/api/stats')
+                .then(response => response.json())
+                .then(showStats)
                 .catch(error => console.error('Error updating stats:', error));
         }
 
@@ -138,15 +202,16 @@ HTML_TEMPLATE = """
             e.preventDefault();
             
             const fileInput = document.getElementById('imageFile');
-            const file = fileInput.files[0];
-            
-            if (!file) {
+            if (!fileInput.files.length) {
                 alert('Please select an image file');
                 return;
             }
             
+            // Several files are sent in one request and inferred as a batch
             const formData = new FormData();
-            formData.append('image', file);
+            for (const file of fileInput.files) {
+                formData.append('image', file);
+            }
             
             fetch('/api/process_image', {
                 method: 'POST',
@@ -170,9 +235,49 @@ HTML_TEMPLATE = """
             });
         });
 
-        // Update stats every second
-        setInterval(updateStats, 1000);
+        function showVideoJob(job) {
+            const resultDiv = document.getElementById('videoResult');
+            resultDiv.className = job.status === 'failed' ? 'result error' : 'result success';
+            const objects = Object.entries(job.objects || {}).map(([name, count]) => name + ' ' + count).join(', ');
+            resultDiv.textContent = job.status === 'failed' ? 'Job failed: ' + job.error :
+                job.status + ' ' + Math.round(job.progress * 100) + '%, ' + job.frames_inferred + ' frames, ' +
+                job.throughput_fps + ' fps' + (objects ? ' — ' + objects : '');
+            if (!['done', 'failed', 'cancelled'].includes(job.status)) {
+                setTimeout(() => fetch('/api/video_jobs/' + job.id).then(r => r.json()).then(showVideoJob), 1000);
+            }
+        }
+
+        document.getElementById('videoForm').addEventListener('submit', function(e) {
+            e.preventDefault();
+            const file = document.getElementById('videoFile').files[0];
+            if (!file) return;
+            const stride = document.getElementById('videoStride').value || 1;
+            // Raw body: the browser streams the file and the server spools it to disk
+            fetch('/api/video_jobs?filename=' + encodeURIComponent(file.name) + '&stride=' + stride, {
+                method: 'POST',
+                body: file
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    showVideoJob(data);
+                } else {
+                    const resultDiv = document.getElementById('videoResult');
+                    resultDiv.className = 'result error';
+                    resultDiv.textContent = data.message;
+                }
+            });
+        });
+
+        // Stats and detections are pushed by the server; poll only without EventSource
         updateStats();
+        if (window.EventSource) {
+            const events = new EventSource('/api/events');
+            events.addEventListener('stats', e => showStats(JSON.parse(e.data)));
+            events.addEventListener('detections', e => showDetections(JSON.parse(e.data)));
+        } else {
+            setInterval(updateStats, 1000);
+        }
     </script>
 </body>
 </html>
@@ -182,91 +287,435 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(HTML_TEMPLATE)
 
+def get_frame_ring():
+    """Processor's shared-memory frame ring, re-attaching when the processor (re)starts"""
+    global frame_ring
+    with frame_ring_lock:
+        if frame_ring is not None and frame_ring.is_stale():
+            # Replaced or removed segment: drop the old mapping instead of closing it, since other
+            # threads may still hold zero-copy views into it; it is unmapped with the last reference
+            print("🔄 Frame ring replaced or removed by the processor, re-attaching")
+            frame_ring = None
+        if frame_ring is None:
+            frame_ring = open_frame_ring()
+        return frame_ring
+
+def read_latest_frame():
+    """Newest complete processed frame from shared memory, None if unavailable"""
+    ring = get_frame_ring()
+    if ring is None:
+        return None
+    return ring.read_latest()
+
+mjpeg_broadcaster = create_mjpeg_broadcaster(get_frame_ring)
+snapshot_store = create_snapshot_store(get_frame_ring)
+SNAPSHOT_MAX_WAIT = float(os.environ.get('SNAPSHOT_MAX_WAIT', 30.0))
+
+HTTP_REQUESTS = counter('yolo_http_requests_total', 'HTTP requests by route and status', ('route', 'status'))
+HTTP_SECONDS = histogram('yolo_http_request_seconds', 'Time to produce the response (streams: until headers)', ('route',))
+HTTP_CLIENTS = gauge('yolo_http_clients', 'Connected streaming clients', ('stream',))
+HTTP_CLIENTS.labels('mjpeg').set_function(lambda: len(mjpeg_broadcaster.clients))
+HTTP_CLIENTS.labels('events').set_function(lambda: len(event_broadcaster.clients))
+OBJECTS_DETECTED = counter('yolo_upload_objects_detected_total', 'Objects detected in uploaded images')
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    STARTUP.mark('first request')
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_REQUESTS.labels(route, response.status_code).inc()
+    HTTP_SECONDS.labels(route).observe(time.perf_counter() - g.request_start)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of the service's metrics"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/stream.mjpg')
+def stream_mjpg():
+    """Live processed frames as multipart MJPEG; ?tier=full|half|quarter pins the quality tier"""
+    client = mjpeg_broadcaster.subscribe(request.remote_addr, request.args.get('tier'))
+    return Response(mjpeg_broadcaster.stream(client),
+                    mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}',
+                    headers={'Cache-Control': 'no-cache, no-store', 'X-Accel-Buffering': 'no'})
+
+def snapshot_params(params):
+    """(after, timeout, width) from snapshot query parameters; raises ValueError"""
+    after = int(params['after']) if params.get('after') else None
+    timeout = min(max(0.0, float(params.get('timeout', 10.0))), SNAPSHOT_MAX_WAIT)
+    width = int(params['width']) if params.get('width') else None
+    if width is not None and width not in snapshot_store.sizes:
+        raise ValueError(f"width must be one of {', '.join(map(str, snapshot_store.sizes))}")
+    return after, timeout, width
+
+@app.route('/api/snapshot')
+def get_snapshot():
+    """Latest processed frame as JPEG from memory
+
+    ETag / If-None-Match give 304 for an unchanged frame; ?after=N waits (up to ?timeout=s) for
+    the first frame with a different sequence, 204 if none came; ?width= picks a cached thumbnail.
+    """
+    try:
+        after, timeout, width = snapshot_params(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {e}'}), 400
+    snapshot = snapshot_store.latest() if after is None else snapshot_store.wait_for_frame(after, timeout)
+    if snapshot is None:
+        status, message, headers = snapshot_store.empty_response(after is not None)
+        body = jsonify({'success': False, 'message': message}) if message else ''
+        return body, status, headers
+    status, body, headers = snapshot_store.response(snapshot, width, request.headers.get('If-None-Match'))
+    return Response(body, status=status, headers=headers, mimetype='image/jpeg')
+
+@app.route('/api/stream_clients')
+def get_stream_clients():
+    return jsonify(mjpeg_broadcaster.get_stats())
+
+@app.route('/api/events')
+def stream_events():
+    """Server-Sent Events: 'stats' and 'detections' pushed as they are produced"""
+    client = event_broadcaster.subscribe(request.remote_addr)
+    return Response(event_broadcaster.stream(client), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/events/clients')
+def get_event_clients():
+    return jsonify(event_broadcaster.get_stats())
+
+def collect_stats():
+    """Current service statistics, shared by /api/stats and the event stream"""
+    with processing_stats_lock:
+        stats = dict(processing_stats)
+    stats['result_cache'] = result_cache.get_stats()
+    stats['stream_clients'] = len(mjpeg_broadcaster.clients)
+    stats['event_clients'] = len(event_broadcaster.clients)
+    if inference_engine is not None:
+        stats['inference'] = inference_engine.get_stats()
+    stats['video_jobs'] = video_jobs.get_stats()
+    stats['snapshot'] = snapshot_store.get_stats()
+    ring = get_frame_ring()
+    if ring is not None:
+        stats['frame_sequence'] = ring.latest_sequence()
+    return stats
+
 @app.route('/api/stats')
 def get_stats():
-    global processing_stats
-    return jsonify(processing_stats)
+    return jsonify(collect_stats())
+
+def health_status():
+    """Liveness summary for health checks; never waits for the model or the camera"""
+    ring = get_frame_ring()
+    with processing_stats_lock:
+        fps = processing_stats['fps']
+        processor_status = processing_stats['processor_status']
+    return {
+        'status': 'healthy',
+        'timestamp': time.time(),
+        'frame_available': ring is not None and ring.latest_sequence() > 0,
+        'fps': fps,
+        'stream_active': processor_status == 'Running',
+        'inference_ready': inference_engine is not None,
+        'inference_backend': inference_engine.backend.name if inference_engine is not None else None,
+        'inference_simulated': inference_engine.backend.simulated if inference_engine is not None else None,
+        'uptime': STARTUP.elapsed_ms() / 1000
+    }
+
+@app.route('/health')
+def health():
+    return jsonify(health_status())
+
+@app.route('/api/startup')
+def get_startup():
+    """Cold-start breakdown: interpreter, imports, warm-up, first request"""
+    return jsonify(STARTUP.report())
+
+def live_pipeline_active():
+    """Whether the processor is running live inference (upload and batch work yields to it)"""
+    with processing_stats_lock:
+        return processing_stats['processor_status'] == 'Running' and processing_stats.get('inference_fps', 0) > 0
+
+def get_inference_engine():
+    """Shared, pre-warmed inference engine (created on first use when not started by __main__)"""
+    global inference_engine
+    with inference_engine_lock:
+        if inference_engine is None:
+            with STARTUP.phase('inference engine'):
+                inference_engine = create_inference_engine(live_active=live_pipeline_active)
+            with processing_stats_lock:
+                processing_stats['hailo_status'] = ('Connected' if inference_engine.backend.name == 'hailo'
+                                                    else 'Not Available')
+    return inference_engine
+
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 10.0))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 32 * 1024 * 1024))
+
+def busy_response(error):
+    """(body, status, headers) for work the engine or job queue did not admit
+
+    429 when the caller's class is at its queue limit, 503 when the service is overloaded;
+    Retry-After carries the estimated wait.
+    """
+    status = 429 if isinstance(error, (QueueFull, TooManyJobs)) else 503
+    body = {'success': False, 'message': f'Inference busy: {error}', 'retry_after': error.retry_after}
+    return body, status, {'Retry-After': str(error.retry_after)}
+
+def submit_uploads(uploads, thresholds):
+    """Answer (filename, bytes) uploads from the cache or queue them for inference
+
+    Returns (results, pending): results has a slot per upload, pending lists
+    (index, filename, cache key, image shape, future) for the ones still being inferred.
+    Raises EngineBusy (after cancelling this request's queued images) when the engine does not admit them.
+    """
+    engine = get_inference_engine()
+    results = [None] * len(uploads)
+    pending = []
+
+    # Submit every image before waiting so concurrent uploads share batches
+    for index, (filename, image_data) in enumerate(uploads):
+        # Repeated uploads of identical bytes are answered without decoding
+        cache_key = result_cache.make_key(image_data, engine.model_id, thresholds)
+        result = result_cache.get(cache_key)
+        if result is not None:
+            results[index] = dict(result, filename=filename, cached=True)
+            continue
+
+        image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            results[index] = {'filename': filename, 'error': 'Invalid image format'}
+            continue
+
+        try:
+            future = engine.submit(image, *thresholds)
+        except EngineBusy:
+            for _, _, _, _, queued in pending:
+                queued.cancel()
+            raise
+        pending.append((index, filename, cache_key, image.shape, future))
+    return results, pending
+
+def complete_upload(results, item, detections):
+    """Store one finished inference in the results and the cache"""
+    index, filename, cache_key, shape, _ = item
+    result = {
+        'detections': detections,
+        'image_size': [shape[1], shape[0]],
+        'model': get_inference_engine().model_id
+    }
+    result_cache.put(cache_key, result)
+    results[index] = dict(result, filename=filename, cached=False)
+
+def upload_response(results):
+    """Response body for finished uploads; also counts detected objects"""
+    detected = sum(len(result.get('detections', [])) for result in results)
+    OBJECTS_DETECTED.inc(detected)
+    with processing_stats_lock:
+        processing_stats['objects_detected'] += detected
+        processing_stats['last_update'] = time.time()
+
+    # Say so when no real model produced the detections
+    backend = inference_engine.backend
+    model = {'model': backend.model_id, 'simulated': backend.simulated}
+    note = ' (simulated inference, no model loaded)' if backend.simulated else ''
+
+    if len(results) == 1:
+        result = results[0]
+        if 'error' in result:
+            return dict(model, success=False, message=result['error'])
+        return dict(result, success=True, **model,
+                    message=f'Image processed successfully! Objects detected: {detected}{note}')
+
+    return dict(model, success=True, results=results,
+                message=f'{len(results)} images processed, objects detected: {detected}{note}')
 
 @app.route('/api/process_image', methods=['POST'])
 def process_image():
+    """Detect objects in uploaded images; repeat the 'image' field to send several in one request"""
+    if request.content_length is not None and request.content_length > UPLOAD_MAX_BYTES:
+        return jsonify({'success': False, 'message': 'Upload too large'}), 413
     try:
-        if 'image' not in request.files:
+        uploads = [(file.filename, file.read()) for file in request.files.getlist('image') if file.filename]
+        if not uploads:
             return jsonify({'success': False, 'message': 'No image file provided'})
 
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'success': False, 'message': 'No image file selected'})
-
-        image_data = file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if image is None:
-            return jsonify({'success': False, 'message': 'Invalid image format'})
+        try:
+            thresholds = (float(request.form.get('confidence', 0.5)), float(request.form.get('nms', 0.4)))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid threshold value'})
 
         try:
-            global hailo_processor, processing_stats
-            
-            if hailo_processor is None and HAILO_AVAILABLE:
-                try:
-                    hailo_processor = HailoYOLOProcessor()
-                    processing_stats['hailo_status'] = 'Connected'
-                except Exception as e:
-                    print(f"Failed to initialize Hailo processor: {e}")
-                    hailo_processor = None
-                    processing_stats['hailo_status'] = 'Error'
-            
-            if hailo_processor is not None:
-                # Use Hailo processor if available
-                processing_stats['hailo_status'] = 'Connected'
-            else:
-                processing_stats['hailo_status'] = 'Not Available'
-
-            # Simple image processing simulation
-            processed_image = cv2.resize(image, (640, 640))
-            processing_stats['objects_detected'] += 1
-            processing_stats['last_update'] = time.time()
-
-            return jsonify({
-                'success': True,
-                'message': f'Image processed successfully! Objects detected: {processing_stats["objects_detected"]}'
-            })
+            results, pending = submit_uploads(uploads, thresholds)
+        except EngineBusy as e:
+            body, status, headers = busy_response(e)
+            return jsonify(body), status, headers
 
-        except Exception as e:
-            processing_stats['hailo_status'] = 'Error'
-            return jsonify({'success': False, 'message': f'Hailo processing error: {str(e)}'})
+        for item in pending:
+            try:
+                detections = item[-1].result(INFERENCE_TIMEOUT)
+            except FutureTimeoutError:
+                return jsonify({'success': False, 'message': 'Inference timed out'}), 504
+            complete_upload(results, item, detections)
+
+        return jsonify(upload_response(results))
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error processing image: {str(e)}'})
 
+video_jobs = create_video_job_manager(get_inference_engine)
+
+def video_job_params(params):
+    """(filename, stride, confidence, nms) for a new video job; raises ValueError"""
+    stride = int(params.get('stride', 1))
+    if stride < 1:
+        raise ValueError('stride must be at least 1')
+    return (params.get('filename') or 'upload.mp4', stride,
+            float(params.get('confidence', 0.5)), float(params.get('nms', 0.4)))
+
+@app.route('/api/video_jobs', methods=['POST'])
+def create_video_job():
+    """Upload a video clip and start a detection job
+
+    The clip is the raw request body (or the multipart field 'video'); query parameters
+    filename, stride (process every Nth frame), confidence and nms. Returns 202 with the job.
+    """
+    multipart = request.mimetype == 'multipart/form-data'
+    try:
+        filename, stride, confidence, nms = video_job_params(request.values if multipart else request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {e}'}), 400
+
+    if multipart:
+        upload = request.files.get('video')
+        if upload is None or not upload.filename:
+            return jsonify({'success': False, 'message': 'No video file provided'}), 400
+        filename, stream = upload.filename, upload.stream
+    else:
+        stream = request.stream
+
+    try:
+        job = video_jobs.create_job(filename, stride, confidence, nms)
+    except TooManyJobs as e:
+        body, status, headers = busy_response(e)
+        return jsonify(body), status, headers
+    try:
+        video_jobs.spool(job, stream)
+    except UploadTooLarge as e:
+        video_jobs.fail(job, str(e))
+        return jsonify({'success': False, 'message': str(e)}), 413
+    except OSError as e:
+        video_jobs.fail(job, f'Spooling failed: {e}')
+        return jsonify({'success': False, 'message': f'Spooling failed: {e}'}), 500
+    video_jobs.start(job)
+    return jsonify(dict(job.get_status(), success=job.status != 'failed')), 202
+
+@app.route('/api/video_jobs')
+def list_video_jobs():
+    return jsonify({'jobs': video_jobs.list_jobs()})
+
+@app.route('/api/video_jobs/<job_id>')
+def get_video_job(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify(dict(job.get_status(), success=True))
+
+@app.route('/api/video_jobs/<job_id>/results')
+def get_video_job_results(job_id):
+    """Per-frame detections of a job, paged with offset and limit"""
+    try:
+        results = video_jobs.results(job_id, int(request.args.get('offset', 0)), int(request.args.get('limit', 500)))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid offset or limit'}), 400
+    if results is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify(results)
+
+@app.route('/api/video_jobs/<job_id>', methods=['DELETE'])
+def cancel_video_job(job_id):
+    if not video_jobs.cancel(job_id):
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify({'success': True})
+
+def read_device_state():
+    """Processor state snapshot, re-attaching when the processor (re)starts; never touches the camera"""
+    global device_state
+    state = device_state.read() if device_state is not None else None
+    if state is None or time.time() - state['update_time'] > 3.0:
+        # Missing or stale: a restarted processor creates a new segment
+        if device_state is not None:
+            device_state.close()
+        device_state = open_device_state()
+        state = device_state.read() if device_state is not None else None
+    return state
+
 def update_stats():
-    """Update processing statistics"""
+    """Refresh camera/accelerator status and fps from the processor's state feed"""
     while True:
         try:
-            global processing_stats
-            current_time = time.time()
-            if current_time - processing_stats['last_update'] > 0:
-                processing_stats['fps'] = 1.0 / (current_time - processing_stats['last_update'])
-            processing_stats['last_update'] = current_time
+            status = device_status(read_device_state())
+            if status['processor_status'] == 'Offline' and inference_engine is not None:
+                # Processor not running: report the upload engine's accelerator instead
+                status['hailo_status'] = 'Connected' if inference_engine.backend.name == 'hailo' else 'Not Available'
+            with processing_stats_lock:
+                processing_stats.update(status)
+                processing_stats['fps'] = status['ingest_fps']
+                processing_stats['last_update'] = time.time()
+            if inference_engine is not None and status.get('inference_fps'):
+                inference_engine.observe_live_latency(status['inference_ms'])
 
-            try:
-                cap = cv2.VideoCapture(0)
-                if cap.isOpened():
-                    processing_stats['camera_status'] = 'Connected'
-                    cap.release()
-                else:
-                    processing_stats['camera_status'] = 'Disconnected'
-            except:
-                processing_stats['camera_status'] = 'Error'
+            event_broadcaster.publish('stats', collect_stats())
+        except Exception as e:
+            print(f"⚠️ Stats update error: {e}")
+        time.sleep(1)
 
+def poll_detections():
+    """Push per-frame detections from the frame ring metadata to event subscribers"""
+    last_sequence = None
+    while True:
+        try:
+            ring = get_frame_ring() if event_broadcaster.clients else None
+            if ring is None or ring.latest_sequence() == last_sequence:
+                time.sleep(0.01)
+                continue
+
+            # Metadata only: the JPEG stays in shared memory
+            frame = ring.read_latest(copy=False)
+            if frame is None:
+                # No frame written yet, or the writer kept the slot busy: retry on the next tick
+                time.sleep(0.01)
+                continue
+            # Boxes are in the ring frame's pixels, whatever tier a viewer's stream is in
+            frame_size = jpeg_size(frame['jpeg'])
+            frame['jpeg'].release()
+            last_sequence = frame['sequence']
+            if frame['metadata']:
+                event_broadcaster.publish('detections', compact_detections(frame['metadata'], frame_size))
+        except Exception as e:
+            print(f"⚠️ Detection feed error: {e}")
             time.sleep(1)
-        except:
-            time.sleep(1)
+
+def warm_up():
+    """Load and warm up the model off the serving path; uploads arriving earlier wait for it"""
+    try:
+        get_inference_engine()
+    except Exception as e:
+        print(f"❌ Inference engine warm-up failed: {e}")
+    STARTUP.mark('inference ready')
+    STARTUP.print_report()
+
+STARTUP.mark('module imported')
 
 if __name__ == '__main__':
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
     stats_thread = threading.Thread(target=update_stats, daemon=True)
     stats_thread.start()
+    detections_thread = threading.Thread(target=poll_detections, daemon=True)
+    detections_thread.start()
     print("🚀 Starting Hailo YOLO Web Service...")
-    print("🌐 Web interface will be available at: http://0.0.0.0:8080")
+    port = int(os.environ.get('WEB_PORT', 8080))
+    print(f"🌐 Web interface will be available at: http://0.0.0.0:{port}")
     print("📱 Access from any device on the network")
-    app.run(host='0.0.0.0', port=8080, debug=False, threaded=True) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True) 
\ No newline at end of file